@@ -0,0 +1,13 @@
+###################################################################################################
+# Copyright (C) 2024 Maxim Integrated Products, Inc. All Rights Reserved.
+#
+# Maxim Integrated Products, Inc. Default Copyright Notice:
+# https://www.maximintegrated.com/en/aboutus/legal/copyrights.html
+###################################################################################################
+"""
+Network loader, simulator and code generator for the MAX7800X CNN accelerators
+"""
+import time
+
+# Start of the package import, for `--profile-startup`
+IMPORT_START = time.perf_counter()
@@ -1,5 +1,5 @@
 ###################################################################################################
-# Copyright (C) 2019-2023 Maxim Integrated Products, Inc. All Rights Reserved.
+# Copyright (C) 2019-2024 Maxim Integrated Products, Inc. All Rights Reserved.
 #
 # Maxim Integrated Products, Inc. Default Copyright Notice:
 # https://www.maximintegrated.com/en/aboutus/legal/copyrights.html
@@ -7,12 +7,13 @@
 """
 Routines to read and write the APB peripherals.
 """
+import functools
 import os
 from typing import Optional, TextIO
 
 import numpy as np
 
-from . import datamem, state, toplevel
+from . import datamem, kcompress, state, toplevel
 from . import tornadocnn as tc
 from . import unload
 from .eprint import wprint
@@ -94,18 +95,20 @@ class APB():
         self.layer = 0
         self.rollover = 0
 
-        self.data_mem = self.kernel_mem = self.output_data_mem = None
+        self.data_mem = self.kernel_mem = self.kernel_valid = self.output_data_mem = None
 
         if state.rtl_preload_weights or state.new_kernel_loader:
             if not state.compact_weights:
-                self.kernel_mem = np.empty(
-                    (tc.dev.P_NUMGROUPS, tc.dev.P_NUMPRO, tc.dev.MASK_INSTANCES),
-                    dtype=list,
+                # Image of the kernel memories (9 bytes per kernel), and a bitmap of the
+                # kernels that were written
+                depth = max(tc.dev.MASK_WIDTH_SMALL // tc.dev.MASK_INSTANCES_EACH,
+                            (tc.dev.MASK_WIDTH_LARGE - tc.dev.MASK_WIDTH_SMALL)
+                            // tc.dev.MASK_INSTANCES_EACH)
+                self.kernel_mem = np.zeros(
+                    (tc.dev.P_NUMGROUPS, tc.dev.P_NUMPRO, tc.dev.MASK_INSTANCES, depth, 9),
+                    dtype=np.uint8,
                 )
-                for i in range(tc.dev.P_NUMGROUPS):
-                    for j in range(tc.dev.P_NUMPRO):
-                        for k in range(tc.dev.MASK_INSTANCES):
-                            self.kernel_mem[i][j][k] = []
+                self.kernel_valid = np.zeros(self.kernel_mem.shape[:-1], dtype=bool)
 
         if embedded_arm or embedded_code:
             return
@@ -144,92 +147,42 @@ class APB():
                                 mode='w',
                                 encoding='utf-8',
                             ) as f:
-                                for (addr, val) in self.data_mem[group][proc][mem]:
-                                    f.write(f'@{addr:04x} {val}\n')
-
-        def sort_addr(val):
-            return val[0]
+                                f.writelines([f'@{addr:04x} {val}\n' for (addr, val)
+                                              in self.data_mem[group][proc][mem]])
 
         if self.kernel_mem is not None and not state.rtl_preload_weights:
-            # Build a list of sequential kernel "chunks" so the loader code can use compact
-            # memcpy instructions of streaming copy
-            input_list = []
-            val = []
-            addr = -1
-            offs = -1
-            for group in range(tc.dev.P_NUMGROUPS):
-                for proc in range(tc.dev.P_NUMPRO):
-                    for mem in range(tc.dev.mask_count(proc)):
-                        if self.kernel_mem[group][proc][mem]:
-                            self.kernel_mem[group][proc][mem].sort(key=sort_addr)
-                            for (naddr, nval) in self.kernel_mem[group][proc][mem]:
-                                if mem >= tc.dev.MASK_INSTANCES_EACH:
-                                    phys_addr = state.apb_base + tc.dev.C_GROUP_OFFS * group \
-                                        + tc.dev.C_MRAM_BASE + proc * tc.dev.MASK_OFFS * 16 \
-                                        + tc.dev.MASK_WIDTH_SMALL * 16 \
-                                        + (mem - tc.dev.MASK_INSTANCES_EACH) * 16 \
-                                        * (tc.dev.MASK_WIDTH_LARGE - tc.dev.MASK_WIDTH_SMALL) \
-                                        // tc.dev.MASK_INSTANCES_EACH \
-                                        + naddr * 16
-                                else:
-                                    phys_addr = state.apb_base + tc.dev.C_GROUP_OFFS * group \
-                                        + tc.dev.C_MRAM_BASE + proc * tc.dev.MASK_OFFS * 16 \
-                                        + mem * 16 \
-                                        * tc.dev.MASK_WIDTH_SMALL // tc.dev.MASK_INSTANCES_EACH \
-                                        + naddr * 16
-                                # Flush what we have, if anything
-                                if offs > 0 and phys_addr != addr + offs * 16:
-                                    input_list.append((addr, val))
-                                    addr = -1
-                                # Set new starting point
-                                if addr == -1:
-                                    addr = phys_addr
-                                    offs = 0
-                                    val = []
-                                # Append current value
-                                val.append(nval)
-                                offs += 1
-            # Flush remainder
-            if addr != -1:
-                assert len(val) == offs
-                input_list.append((addr, val))
-
-            # Create a header file of "chunks" (address, length, data)
-            if input_list is not None:
-                kl = []
-                for (addr, val) in input_list:
-                    assert len(val) > 0
-                    # Address (u32), word length
-                    if not state.mexpress:
-                        kl.append(addr)
-                    else:
-                        kl.append(addr & ~(tc.dev.MASK_OFFS * 16 - 1) & 0xffffffff
-                                  | ((addr & (tc.dev.MASK_OFFS * 16 - 1)) >> 2))
-                    kl.append(len(val) * 4 if not state.mexpress else (len(val) * 9 + 3) // 4)
-                    u = 0
-                    count = 0
-                    if not state.mexpress:
-                        for k in val:
-                            kl.append(k[0] & 0xff)
-                            kl.append(((k[1] & 0xff) << 24 | (k[2] & 0xff) << 16 |
-                                       (k[3] & 0xff) << 8 | k[4] & 0xff) & 0xffffffff)
-                            kl.append(((k[5] & 0xff) << 24 | (k[6] & 0xff) << 16 |
-                                       (k[7] & 0xff) << 8 | k[8] & 0xff) & 0xffffffff)
-                            kl.append(0x00000000)
-                    else:
-                        for k in val:
-                            for i in range(9):
-                                u = (u << 8) & 0xffffffff
-                                u |= k[i] & 0xff
-                                count += 1
-                                if count == 4:
-                                    kl.append(u)
-                                    u = 0
-                                    count = 0
-                        if count > 0:
-                            kl.append(u << (4 - count) * 8)
-                kl.append(0)  # EOF
+            # Create a header file of sequential kernel "chunks" (address, length, data) so the
+            # loader code can use compact memcpy instructions of streaming copy
+            kl = []
+            addresses, chunks = self.kernel_chunks()
+            if state.mexpress:
+                addresses = [addr & ~(tc.dev.MASK_OFFS * 16 - 1) & 0xffffffff
+                             | ((addr & (tc.dev.MASK_OFFS * 16 - 1)) >> 2) for addr in addresses]
+            for addr, val in zip(addresses, chunks):
+                # Address (u32), word length
+                if not state.mexpress:
+                    kl.append(np.array([addr, len(val) * 4], dtype=np.int64))
+                    # One kernel per 4 words: byte 0, bytes 1-4, bytes 5-8, zero (execute write)
+                    words = np.zeros((len(val), 16), dtype=np.uint8)
+                    words[:, 3] = val[:, 0]
+                    words[:, 4:12] = val[:, 1:]
+                else:
+                    kl.append(np.array([addr, (len(val) * 9 + 3) // 4], dtype=np.int64))
+                    # Kernel bytes packed back to back, zero padded to a full word
+                    words = np.zeros((len(val) * 9 + 3) // 4 * 4, dtype=np.uint8)
+                    words[:len(val) * 9] = val.ravel()
+                kl.append(words.view('>u4').ravel().astype(np.int64))
+            kl.append(np.zeros(1, dtype=np.int64))  # EOF
+            kl = np.concatenate(kl)
+            if not state.compress_kernels:
                 self.output_define(kl, 'KERNELS', '0x%08x', 8)
+            else:
+                stream, dictionary, stats = kcompress.compress(addresses, chunks)
+                kcompress.report(stats, len(kl), len(kl) - 2 * len(chunks) - 1)
+                self.output_define(stream, 'KERNELS', '0x%02x', 16)
+                if len(dictionary) == 0:  # C does not allow empty arrays
+                    dictionary = np.zeros(1, dtype=np.uint8)
+                self.output_define(dictionary, 'KERNELS_DICT', '0x%02x', 18)
 
         if self.kernel_mem is not None and state.rtl_preload_weights:
             try:
@@ -237,19 +190,15 @@ class APB():
                 os.makedirs(target_dir, exist_ok=False)
             except OSError:
                 wprint(target_dir, 'exists')
-            for group in range(tc.dev.P_NUMGROUPS):
-                for proc in range(tc.dev.P_NUMPRO):
-                    for mem in range(tc.dev.MASK_INSTANCES):
-                        if self.kernel_mem[group][proc][mem]:
-                            self.kernel_mem[group][proc][mem].sort(key=sort_addr)
-                            with open(
-                                os.path.join(target_dir,
-                                             f'MRAM_x16_{group}_proc_{proc}_ram_{mem}.dat'),
-                                mode='w',
-                                encoding='utf-8',
-                            ) as f:
-                                for (addr, val) in self.kernel_mem[group][proc][mem]:
-                                    f.write(f'@{addr:04x} {val}\n')
+            for group, proc, mem in zip(*np.nonzero(self.kernel_valid.any(axis=-1))):
+                with open(
+                    os.path.join(target_dir, f'MRAM_x16_{group}_proc_{proc}_ram_{mem}.dat'),
+                    mode='w',
+                    encoding='utf-8',
+                ) as f:
+                    for addr in np.flatnonzero(self.kernel_valid[group][proc][mem]):
+                        k = self.kernel_mem[group][proc][mem][addr].tobytes().hex()
+                        f.write(f'@{addr:04x} {k[:2]}_{k[2:10]}_{k[10:]}\n')
 
         if self.output_data_mem is not None:
             target_dir = os.path.join(base_directory, test_name, 'data-output')
@@ -270,8 +219,34 @@ class APB():
                                 mode='w',
                                 encoding='utf-8',
                             ) as f:
-                                for (addr, val) in self.output_data_mem[group][proc][mem]:
-                                    f.write(f'@{addr:04x} {val}\n')
+                                f.writelines([f'@{addr:04x} {val}\n' for (addr, val)
+                                              in self.output_data_mem[group][proc][mem]])
+
+    def kernel_chunks(
+            self,
+    ):
+        """
+        Return the physical start addresses and the data (9 bytes per kernel) of the runs of
+        consecutive written kernels in the kernel memory image, in address order.
+        """
+        valid = self.kernel_valid.copy()
+        for proc in range(tc.dev.P_NUMPRO):
+            valid[:, proc, tc.dev.mask_count(proc):] = False
+        group, proc, mem, offs = np.nonzero(valid)
+        if len(offs) == 0:
+            return [], []
+
+        phys_addr = state.apb_base + tc.dev.C_GROUP_OFFS * group \
+            + tc.dev.C_MRAM_BASE + proc * tc.dev.MASK_OFFS * 16 + offs * 16 \
+            + np.where(mem >= tc.dev.MASK_INSTANCES_EACH,
+                       tc.dev.MASK_WIDTH_SMALL * 16
+                       + (mem - tc.dev.MASK_INSTANCES_EACH) * 16
+                       * (tc.dev.MASK_WIDTH_LARGE - tc.dev.MASK_WIDTH_SMALL)
+                       // tc.dev.MASK_INSTANCES_EACH,
+                       mem * 16 * tc.dev.MASK_WIDTH_SMALL // tc.dev.MASK_INSTANCES_EACH)
+        # A new chunk starts wherever the next kernel is not at the next address
+        breaks = np.flatnonzero(np.diff(phys_addr) != 16) + 1
+        return phys_addr[np.r_[0, breaks]].tolist(), np.split(self.kernel_mem[valid], breaks)
 
     def get_time(
             self,
@@ -366,6 +341,25 @@ class APB():
         """
         raise NotImplementedError
 
+    def verify_many(
+            self,
+            addrs,
+            vals,
+            masks,
+            comments=None,
+            rv=False,
+            api=False,
+            data=False,
+            use_list=False,
+    ):  # pylint: disable=unused-argument
+        """
+        Verify that memory at the addresses in array `addrs` contains the data in array `vals`,
+        comparing the bits in array `masks` (0xffffffff compares the whole word). `comments`
+        is an optional list with a comment for each address. The other arguments are the same
+        as for `verify()`.
+        """
+        raise NotImplementedError
+
     def verify_list(
             self,
             addr,
@@ -581,6 +575,8 @@ class APB():
         """
         assert p < tc.dev.MAX_PROC
         assert idx < tc.dev.mask_width(p)
+        # Bit operations on Python integers are much faster than on NumPy scalars
+        k = np.asarray(k).tolist()
 
         if calc_x4:
             start = kern_offs[ll]
@@ -611,23 +607,13 @@ class APB():
                                        (tc.dev.MASK_WIDTH_LARGE - tc.dev.MASK_WIDTH_SMALL)
                                        // tc.dev.MASK_INSTANCES_EACH)
                     mem += tc.dev.MASK_INSTANCES_EACH
-                if state.rtl_preload_weights:
-                    if size != 1:
-                        val = f'{k[0] & 0xff:02x}_{k[1] & 0xff:02x}{k[2] & 0xff:02x}' \
-                            f'{k[3] & 0xff:02x}{k[4] & 0xff:02x}_{k[5] & 0xff:02x}' \
-                            f'{k[6] & 0xff:02x}{k[7] & 0xff:02x}{k[8] & 0xff:02x}'
-                    else:
-                        val = f'{k[0] & 0xff:02x}_00000000_00000000'
+                group, proc = divmod(p, tc.dev.P_NUMPRO)
+                if size != 1:
+                    self.kernel_mem[group][proc][mem][offs] = [e & 0xff for e in k[:9]]
                 else:
-                    if size != 1:
-                        val = np.empty(9, dtype=np.ubyte)
-                        for i in range(9):
-                            val[i] = k[i] & 0xff
-                    else:
-                        val = np.zeros(9, dtype=np.ubyte)
-                        val[0] = k[0] & 0xff
-                self.kernel_mem[p // tc.dev.P_NUMPRO][p % tc.dev.P_NUMPRO][mem]. \
-                    append((offs, val))
+                    self.kernel_mem[group][proc][mem][offs] = 0
+                    self.kernel_mem[group][proc][mem][offs][0] = k[0] & 0xff
+                self.kernel_valid[group][proc][mem][offs] = True
             else:
                 self.write(addr, k[0] & 0xff, no_verify=True,
                            comment=f' // Layer {ll}: processor {p} kernel #{idx}')
@@ -828,6 +814,10 @@ class APB():
 
         unload.verify(
             self.verify_list,
+            functools.partial(
+                self.verify_many,
+                use_list=self.embedded_code or state.result_filename is not None,
+            ),
             ll,
             in_map,
             out_map,
@@ -853,62 +843,56 @@ class APB():
         Finalize the verification function.
         """
         if len(self.verify_listdata) > 0:
-            # Sort by mask, then address
-            data = sorted(self.verify_listdata)
-
-            rv = data[0][5]
+            masks, addrs, vals, val_bytes, comments, rvs = zip(*self.verify_listdata)
+            masks = np.concatenate(masks)
+            addrs = np.concatenate(addrs)
+            vals = np.concatenate(vals)
+            val_bytes = np.concatenate(val_bytes)
+            comments = [e for chunk in comments for e in chunk]
+
+            rv = rvs[0]
+            assert all(rv == e for e in rvs)
             action = 'rv = CNN_FAIL;' if rv else 'return CNN_FAIL;'
 
+            # Sort by mask, then address (and for repeated checks, by data and comment)
+            order = np.lexsort((vals, addrs, masks))
+            if np.any((np.diff(masks[order]) == 0) & (np.diff(addrs[order]) == 0)
+                      & (np.diff(vals[order]) == 0)):
+                order = np.lexsort((np.array(comments), val_bytes, vals, addrs, masks))
+            masks = masks[order]
+            addrs = addrs[order]
+            vals = vals[order]
+            val_bytes = val_bytes[order]
+
             if self.sampleoutput_header is None:
-                for (_, addr, mask_str, val, val_bytes, rv_item, comment) in data:
-                    assert rv == rv_item
-                    self.memfile.write(f'  if ((*((volatile uint32_t *) 0x{addr:08x}){mask_str})'
-                                       f' != 0x{val:0{2*val_bytes}x}) {action}{comment}\n')
-                    self.reads += 1
+                self.memfile.writelines([
+                    f'  if ((*((volatile uint32_t *) 0x{addr:08x})'
+                    f'{f" & 0x{mask:0{2*n}x}" if mask != 0xffffffff else ""})'
+                    f' != 0x{val:0{2*n}x}) {action}{comments[i]}\n'
+                    for i, addr, mask, val, n in zip(order.tolist(), addrs.tolist(),
+                                                     masks.tolist(), vals.tolist(),
+                                                     val_bytes.tolist())
+                ])
+                self.reads += len(addrs)
             else:
-                # Output is sorted by mask. Group like masks together.
-                max_count = state.max_count
-
-                output_array = []
-                val_array = []
-                output_mask = 0
-                output_addr = 0
-                next_addr = 0
-                cumulative_length = 0
-
-                for (mask_item, addr, _, val, _, rv_item, _) in data:
-                    assert rv == rv_item
-
-                    # New mask? Output collected data and start over
-                    if mask_item != output_mask or addr != next_addr:
-                        if len(val_array) > 0:
-                            output_array += [
-                                output_addr,
-                                output_mask,
-                                len(val_array),
-                            ]
-                            output_array += val_array
-
-                        # Start new block
-                        val_array = []
-                        output_mask = mask_item
-                        output_addr = next_addr = addr
-
-                    # Collect the next value
-                    val_array.append(val)
-                    next_addr += 4
-                    cumulative_length += 1
-                    if max_count is not None and cumulative_length > max_count:
-                        break
-
-                if len(val_array) > 0:
-                    output_array += [
-                        output_addr,
-                        output_mask if output_mask is not None else 0xffffffff,
-                        len(val_array),
-                    ]
-                    output_array += val_array
-                    output_array.append(0)  # Terminator
+                # Output is sorted by mask. Group runs of consecutive addresses with like masks
+                # together: address, mask, length, followed by the data.
+                if state.max_count is not None:
+                    masks = masks[:state.max_count + 1]
+                    addrs = addrs[:state.max_count + 1]
+                    vals = vals[:state.max_count + 1]
+
+                starts = np.flatnonzero(np.r_[True, (np.diff(masks) != 0)
+                                              | (np.diff(addrs) != 4)])
+                lengths = np.diff(np.r_[starts, len(addrs)])
+                header = starts + 3 * np.arange(len(starts))
+                output_array = np.zeros(len(addrs) + 3 * len(starts) + 1, dtype=np.int64)
+                output_array[header] = addrs[starts]
+                output_array[header + 1] = masks[starts]
+                output_array[header + 2] = lengths
+                blocks = np.repeat(np.arange(1, len(starts) + 1), lengths)
+                output_array[np.arange(len(addrs)) + 3 * blocks] = vals
+                # The last entry is the terminator (0)
 
                 # Write to the header file
                 toplevel.c_define(self.sampleoutput_header, output_array, 'SAMPLE_OUTPUT',
@@ -935,8 +919,7 @@ class APB():
             self.verify_listdata = []  # Consume
 
         if len(self.verify_text) > 0:
-            for e in self.verify_text:
-                self.memfile.write(e)
+            self.memfile.writelines(self.verify_text)
             self.verify_text = []  # Consume
 
     def output_define(
@@ -1044,6 +1027,33 @@ class APBBlockLevel(APB):
         self.memfile.write(f'@{self.foffs+1:04x} {val:08x}\n')
         self.foffs += 2
 
+    def verify_many(
+            self,
+            addrs,
+            vals,
+            masks,
+            comments=None,
+            rv=False,
+            api=False,
+            data=False,
+            use_list=False,
+    ):  # pylint: disable=unused-argument
+        """
+        Verify that memory at the addresses in array `addrs` contains the data in array `vals`.
+        For block level tests, this function writes the addresses and expected data in .mem file
+        format, like `verify()`.
+        """
+        addrs = np.asarray(addrs, dtype=np.int64)
+        vals = np.asarray(vals, dtype=np.int64)
+        assert np.all(vals >= 0)
+        assert np.all(addrs >= 0)
+
+        self.memfile.writelines([
+            f'@{self.foffs + 2*i:04x} {addr:08x}\n@{self.foffs + 2*i + 1:04x} {val:08x}\n'
+            for i, (addr, val) in enumerate(zip((addrs + state.apb_base).tolist(), vals.tolist()))
+        ])
+        self.foffs += 2 * len(addrs)
+
     def wait(
             self,
             addr,
@@ -1129,6 +1139,53 @@ class APBDebug(APBBlockLevel):
                                 f'{state.write_count}\n')
         self.foffs += 1
 
+    def verify_many(
+            self,
+            addrs,
+            vals,
+            masks,
+            comments=None,
+            rv=False,
+            api=False,
+            data=False,
+            use_list=False,
+    ):  # pylint: disable=unused-argument
+        """
+        Verify that memory at the addresses in array `addrs` contains the data in array `vals`.
+        This function writes the expected data to a file, like `verify()`.
+        """
+        addrs = np.asarray(addrs, dtype=np.int64)
+        vals = np.asarray(vals, dtype=np.int64)
+        if comments is None:
+            comments = [''] * len(addrs)
+        assert np.all(vals >= 0)
+        addrs = addrs - tc.dev.C_SRAM_BASE
+        assert np.all(addrs >= 0)
+        group, addrs = np.divmod(addrs, tc.dev.C_GROUP_OFFS)
+        proc, offs = np.divmod(addrs, tc.dev.INSTANCE_SIZE*16)
+
+        if self.rollover is not None:
+            offs = (offs - self.out_offset) % (self.rollover * 4) + self.out_offset
+        else:
+            offs = addrs
+        offs = (offs | (proc | group * 4) * (tc.dev.INSTANCE_SIZE*16)) // 4  # 32-bit words
+        assert np.all(offs >= 0)
+        offs = offs.tolist()
+        vals = vals.tolist()
+
+        # Comments are " // channel,row,col" where each of the values can be an int or a range
+        self.memfile.writelines([
+            f'w,{o:x},{val:x},{self.layer},{c[4:] if c.startswith(" // ") else c}\n'
+            for o, val, c in zip(offs, vals, comments)
+        ])
+        if self.passfile is not None:
+            self.passfile.writelines([
+                f'w,{o | 0x200000:x},{val:x},{self.layer},{state.write_count + i + 1}\n'
+                for i, (o, val) in enumerate(zip(offs, vals))
+            ])
+            state.write_count += len(offs)
+        self.foffs += len(offs)
+
 
 class APBTopLevel(APB):
     """
@@ -1312,9 +1369,73 @@ class APBTopLevel(APB):
             else:
                 self.verify_text.append(s)
         else:
-            self.verify_listdata.append((mask, addr, mask_str, val, val_bytes, rv, comment))
+            self.verify_listdata.append((np.array([mask]), np.array([addr]), np.array([val]),
+                                         np.array([val_bytes]), [comment], rv))
         self.reads += 1
 
+    def verify_many(
+            self,
+            addrs,
+            vals,
+            masks,
+            comments=None,
+            rv=False,
+            api=False,
+            data=False,
+            use_list=False,
+    ):
+        """
+        Verify that memory at the addresses in array `addrs` contains the data in array `vals`,
+        comparing the bits in array `masks` (0xffffffff compares the whole word), like
+        `verify()`. `comments` is an optional list with a comment for each address.
+        If `use_list` is set, the checks are collected as arrays for
+        `verify_unload_finalize()`.
+        """
+        addrs = np.asarray(addrs, dtype=np.int64)
+        vals = np.asarray(vals, dtype=np.int64)
+        masks = np.asarray(masks, dtype=np.int64)
+        if comments is None:
+            comments = [''] * len(addrs)
+        assert np.all(vals >= 0)
+        assert np.all(addrs >= 0)
+
+        if self.output_data_mem is not None and data:
+            for addr, val, mask in zip(addrs.tolist(), vals.tolist(), masks.tolist()):
+                val = f'{val:08x}'
+                if mask != 0xffffffff:
+                    val = ''.join('X' if e != 'f' else v for v, e in zip(val, f'{mask:08x}'))
+                group, proc, mem, offs = tc.dev.datainstance_from_addr(addr)
+                self.output_data_mem[group][proc][mem].append((offs, val))
+            return
+
+        addrs = addrs + state.apb_base
+
+        if self.memfile is None:
+            return
+
+        vals = vals & masks
+        # Number of bytes to print for the masked data
+        val_bytes = 1 + (masks > 0xff) + (masks > 0xffff) + (masks > 0xffffff)
+
+        if not use_list:
+            action = 'rv = CNN_FAIL;' if rv else 'return CNN_FAIL;'
+            lines = [
+                f'  if ((*((volatile uint32_t *) 0x{addr:08x})'
+                f'{f" & 0x{mask:0{2*n}x}" if mask != 0xffffffff else ""})'
+                f' != 0x{val:0{2*n}x}) {action}{comment}\n'
+                for addr, mask, val, n, comment in zip(addrs.tolist(), masks.tolist(),
+                                                       vals.tolist(), val_bytes.tolist(),
+                                                       comments)
+            ]
+            if api:
+                mfile = self.apifile or self.memfile
+                mfile.writelines(lines)
+            else:
+                self.verify_text += lines
+        else:
+            self.verify_listdata.append((masks, addrs, vals, val_bytes, list(comments), rv))
+        self.reads += len(addrs)
+
     def wait(
             self,
             addr,
@@ -7,6 +7,7 @@
 """
 Backend for MAX7800X embedded code generation and RTL simulations
 """
+import contextlib
 import copy
 import hashlib
 import os
@@ -15,13 +16,12 @@ from typing import List, Tuple
 
 import numpy as np
 
-from izer import (apbaccess, assets, compute, console, datamem, kbias, kdedup, kernels, latency,
-                  load, op, rtlsim, state, stats)
+from izer import (apbaccess, assets, batchsim, compute, console, datamem, emitter, kbias, kdedup,
+                  kernels, latency, load, op, rtlsim, simulate, state, stats)
 from izer import tornadocnn as tc
 from izer.eprint import eprint, nprint, wprint
 from izer.names import layer_pfx, layer_str
-from izer.simulate import (conv1d_layer, conv2d_layer, convtranspose2d_layer, eltwise_layer,
-                           passthrough_layer, pooling_layer, print_data, show_data)
+from izer.scheduler import Scheduler
 from izer.utils import ffs, fls, overlap, plural, popcount
 
 from . import backend
@@ -48,7 +48,6 @@ class Backend(backend.Backend):
         big_data = state.big_data
         block_mode = state.block_mode
         board_name = state.board_name
-        buffer_insert = state.buffer_insert
         buffer_shift = state.buffer_shift
         bypass = state.bypass
         c_filename = state.c_filename
@@ -89,7 +88,6 @@ class Backend(backend.Backend):
         kernel = state.weights
         kernel_size = state.kernel_size
         layers = state.layers
-        legacy_test = state.legacy_test
         link_layer = state.link_layer
         log = state.log
         log_filename = state.log_filename
@@ -133,7 +131,6 @@ class Backend(backend.Backend):
         quantization = state.quantization
         rd_ahead = state.read_ahead
         repeat_layers = state.repeat_layers
-        reshape_inputs = state.reshape_inputs
         riscv = state.riscv
         riscv_cache = state.riscv_cache
         riscv_flash = state.riscv_flash
@@ -809,6 +806,12 @@ class Backend(backend.Backend):
                 processor_map,
                 kind='bias',
             )
+            kdedup.analyze_kernels(
+                hw_kernel,
+                layers,
+                quantization,
+                kernel_size,
+            )
         else:
             kernel_ptrs = list(range(len(hw_kernel)))
             bias_ptrs = list(range(len(bias)))
@@ -868,32 +871,23 @@ class Backend(backend.Backend):
         else:
             filename = c_filename + ('_riscv' if riscv else '') + '.c'
         if not block_mode and (embedded_code or compact_data):
-            sampledata_header = \
-                open(
-                    os.path.join(base_directory, test_name, state.sample_filename),
-                    mode='w',
-                    encoding='utf-8',
-                )
+            sampledata_header = emitter.open_file(
+                os.path.join(base_directory, test_name, state.sample_filename),
+            )
             sampledata_header.write('// This file was @generated automatically\n\n')
             if state.generate_kat and state.result_filename is not None:
-                sampleoutput_header = \
-                    open(
-                        os.path.join(base_directory, test_name, state.result_filename),
-                        mode='w',
-                        encoding='utf-8',
-                    )
+                sampleoutput_header = emitter.open_file(
+                    os.path.join(base_directory, test_name, state.result_filename),
+                )
                 sampleoutput_header.write('// This file was @generated automatically\n\n')
             else:
                 sampleoutput_header = None
         else:
             sampledata_header = sampleoutput_header = None
         if not block_mode and not state.rtl_preload_weights:
-            weight_header = \
-                open(
-                    os.path.join(base_directory, test_name, weight_filename),
-                    mode='w',
-                    encoding='utf-8',
-                )
+            weight_header = emitter.open_file(
+                os.path.join(base_directory, test_name, weight_filename),
+            )
             weight_header.write('// This file was @generated automatically\n\n')
         else:
             weight_header = None
@@ -1015,10 +1009,8 @@ class Backend(backend.Backend):
 
         # Create ARM code wrapper if needed
         if riscv and not block_mode:
-            with open(
+            with emitter.open_file(
                 os.path.join(base_directory, test_name, c_filename + '.c'),
-                mode='w',
-                encoding='utf-8',
             ) as f:
                 apb = apbaccess.apbwriter(
                     f,
@@ -1044,10 +1036,8 @@ class Backend(backend.Backend):
             csv = None
 
         if embedded_code and api_filename.lower() != 'none':
-            apifile = open(
+            apifile = emitter.open_file(
                 os.path.join(base_directory, test_name, api_filename),
-                mode='w',
-                encoding='utf-8',
             )
         else:
             apifile = None
@@ -1076,8 +1066,7 @@ class Backend(backend.Backend):
             weightsfile = None
             biasfile = None
 
-        with open(os.path.join(base_directory, test_name, filename), mode='w',
-                  encoding='utf-8') as memfile:
+        with emitter.open_file(os.path.join(base_directory, test_name, filename)) as memfile:
             apb = apbaccess.apbwriter(
                 memfile,
                 verify_writes=verify_writes,
@@ -2840,33 +2829,26 @@ class Backend(backend.Backend):
         if verbose:
             print('')
 
-        def run_eltwise(
-                data,
+        def simulate_layer(
                 ll,
+                data_buf,
         ):
             """
-            In-flight element-wise operations
+            Compute the output of layer `ll` from the layer outputs in `data_buf`
             """
-            if operator[ll] == op.NONE:
-                # Let element-wise do 32-bit, else 8-bit only
-                o_width = output_width[ll]
-            else:
-                o_width = 8
-            d_shape = data.shape
-
-            data, out_size = eltwise_layer(
-                eltwise[ll],
+            return simulate.simulate_layer(
                 ll,
-                data[0].shape,
-                output_shift[ll],
-                data,
-                output_width=o_width,
-                operands=operands[ll],
+                data_buf,
+                kernel,
+                bias,
+                kernel_ptrs,
+                bias_ptrs,
+                data_buffer=data_buffer,
+                expand=in_expand[ll],
+                expand_thresh=in_expand_thresh[ll],
+                datafile=datafile,
+                debug_data=None if not log_pooling else os.path.join(base_directory, test_name),
             )
-            assert out_size[0] == d_shape[1] \
-                and out_size[1] == d_shape[2] and out_size[2] == d_shape[3]
-
-            return data
 
         # The data_buf list contains the output of each layer, with the exception of the
         # first element which is the input to layer 0 (so everything is shifted right by one):
@@ -2878,7 +2860,64 @@ class Backend(backend.Backend):
         ll = start_layer
         data_buf[ll] = data
 
-        with console.Progress(start=True) as progress:
+        def schedule_layers(
+                scheduler,
+        ):
+            """
+            Submit all layers to the `scheduler`, in the same order as the loop below. Each
+            layer depends on the layers whose outputs were the last to be stored in the
+            `data_buf` entries it reads, so independent branches can run concurrently.
+            """
+            writer = {start_layer: None}  # data_buf entry -> layer (None for input data)
+            ll = start_layer
+            while ll < layers:
+                if in_sequences[ll] is not None:
+                    sources = {i + 1: writer[i + 1] for i in in_sequences[ll]
+                               if i + 1 in writer}
+                else:
+                    sources = {ll: writer[ll]} if ll in writer else {}
+
+                def task(results, ll=ll, sources=sources, inputs=data):
+                    buf = [None] * (layers + 1)
+                    for i, source in sources.items():
+                        if source is None:
+                            buf[i] = inputs
+                        else:
+                            out_buf, out_size = results[source]
+                            buf[i] = out_buf.reshape(out_size)
+                    return simulate_layer(ll, buf)
+
+                scheduler.submit(ll, task, [e for e in sources.values() if e is not None])
+
+                prev = ll
+                if simulated_sequence[ll] is not None:
+                    if simulated_sequence[ll] == -1:
+                        break
+                    ll = simulated_sequence[ll]
+                else:
+                    if next_sequence[ll] == -1:
+                        break
+                    ll = next_sequence[ll]
+                writer[ll] = prev
+
+        # Simulating layers concurrently is only possible when they have no side effects
+        # that depend on the order of execution (log output, intermediate data files, or
+        # the shared data buffer)
+        scheduler = None
+        if state.sim_threads > 1:
+            if verbose or datafile is not None or log_pooling or state.debug_computation \
+               or data_buffer is not None:
+                nprint('Ignoring `--sim-threads` since the layer simulation has to run in '
+                       'order (--verbose, --log-intermediate, --log-pooling, '
+                       '--debug-computation, or data buffers).')
+            else:
+                scheduler = Scheduler(state.sim_threads)
+
+        with scheduler if scheduler is not None else contextlib.nullcontext(), \
+             console.Progress(start=True) as progress:
+            if scheduler is not None:
+                schedule_layers(scheduler)
+
             task = progress.add_task(description='Creating network... ', total=layers)
             # Compute layer-by-layer output and chain results into input
             while ll < layers:
@@ -2923,6 +2962,7 @@ class Backend(backend.Backend):
                         flatten=hw_flatten[ll],
                         streaming=streaming[ll],
                         kern_offs=kern_offs[ll],
+                        detail=state.debug_latency,
                     )
                     if streaming[ll]:
                         layer_lat *= -1
@@ -2930,275 +2970,12 @@ class Backend(backend.Backend):
 
                 compute.debug_open(ll, base_directory, test_name, log_filename)
 
-                # Concatenate input data if needed
-                if in_sequences[ll] is not None:
-                    if len(in_sequences[ll]) > 1:
-                        err_concat = None
-                        try:
-                            data = np.concatenate([data_buf[i + 1] for i in in_sequences[ll]],
-                                                  axis=0)
-                        except ValueError as err:
-                            err_concat = err
-                        if err_concat is not None:
-                            try:
-                                data = np.hstack(
-                                    [data_buf[i + 1].reshape(data_buf[i + 1].shape[0], -1)
-                                     for i in in_sequences[ll]]
-                                ).reshape(data_buf[in_sequences[ll][0] + 1].shape[0],
-                                          input_dim[ll][0], input_dim[ll][1])
-                            except ValueError as err:
-                                eprint(f'{layer_pfx(ll)}Input data concatenation unsuccessful: ',
-                                       err_concat, err)
-                    elif in_sequences[ll][0] == -2:
-                        data = data_buffer
-                    else:
-                        data = data_buf[in_sequences[ll][0]+1]
-                else:
-                    data = data_buf[ll]
-
-                # Split data into multiple inputs if needed
-                if operands[ll] > 1:
-                    if ll == start_layer and legacy_test:
-                        data = np.array(np.split(data, operands[ll], axis=0))
-                    elif legacy_test:
-                        d = np.empty((operands[ll],
-                                      data.shape[0], data.shape[1], data.shape[2] // operands[ll]),
-                                     dtype=np.int64)
-                        for i in range(operands[ll]):
-                            d[i, :, :, :] = data[:, :, i::operands[ll]]
-                        data = d
-                    else:
-                        data = np.array(np.split(data, operands[ll], axis=0))
-                else:
-                    data = np.expand_dims(data, 0)
-
-                in_chan = input_chan[ll]
-
-                # Drop input channels?
-                if reshape_inputs:
-                    if input_channel_skip[ll] > 0:
-                        data = np.delete(data, np.s_[:input_channel_skip[ll]], axis=1)
-                    data = np.delete(data, np.s_[in_chan:], axis=1)
-
-                if datafile is not None:
-                    # Log input to npy
-                    np.save(datafile, data, allow_pickle=False, fix_imports=False)
-
-                show_data(
-                    ll,
-                    data.shape,
-                    data,
-                    expand=in_expand[ll],
-                    expand_thresh=in_expand_thresh[ll],
-                    operation=operator[ll],
-                    operands=operands[ll],
-                )
-
-                # Run in-flight element-wise operations first?
-                if operands[ll] > 1 and not pool_first[ll]:
-                    data = np.expand_dims(run_eltwise(data, ll), 0)
-
-                # Allow 1D <-> 2D and 2D W/L conversions, and skipping/subsetting
-                if input_crop[ll][0] != 0 or input_crop[ll][1] != 0:  # line skip count
-                    data = data[:, :, input_crop[ll][0]:-input_crop[ll][1], :]
-                if operator[ll] == op.CONV1D:
-                    if in_sequences[ll] != [-2]:
-                        assert input_dim[ll][1] == 1
-                        data = data.reshape(data.shape[0], -1, input_dim[ll][0])
-                    else:
-                        data = data.transpose(0, 2, 3, 1)
-                        data = data.reshape(data.shape[0], -1, input_dim[ll][0])
-                elif buffer_shift[ll] is None:
-                    data = data.reshape(data.shape[0], -1, input_dim[ll][0], input_dim[ll][1])
-
-                # In-flight pooling
-                data, out_size = pooling_layer(
-                    ll,
-                    data[0].shape,
-                    pool[ll],
-                    pool_stride[ll],
-                    pool_average[ll],
-                    data,
-                    dilation=pool_dilation[ll],
-                    expand=in_expand[ll],
-                    expand_thresh=in_expand_thresh[ll],
-                    operation=operator[ll],
-                    operands=data.shape[0],
-                    rounding=avg_pool_rounding,
-                    debug_data=None if not log_pooling else os.path.join(base_directory,
-                                                                         test_name),
-                )
-
-                if datafile is not None:
-                    # Pooling output (pre-elementwise)
-                    if pool[ll][0] > 1 or pool[ll][1] > 1 \
-                       or pool_stride[ll][0] > 1 or pool_stride[ll][1] > 1 \
-                       or pool_dilation[ll][0] > 1 or pool_dilation[ll][1] > 1:
-                        np.save(datafile, data, allow_pickle=False, fix_imports=False)
-                    else:
-                        np.save(datafile, np.empty((0)), allow_pickle=False, fix_imports=False)
-
-                if operator[ll] == op.CONV1D:
-                    if out_size[0] != in_chan \
-                       or out_size[1] != pooled_dim[ll][0] or pooled_dim[ll][1] != 1:
-                        eprint(f'{layer_pfx(ll)}Input dimensions do not match. '
-                               f'Expected: {in_chan}x{pooled_dim[ll][0]}, '
-                               f'got {out_size[0]}x{out_size[1]}.')
-                elif buffer_shift[ll] is None:
-                    if out_size[0] != in_chan \
-                       or out_size[1] != pooled_dim[ll][0] or out_size[2] != pooled_dim[ll][1]:
-                        eprint(f'{layer_pfx(ll)}Input dimensions do not match. '
-                               f'Expected: {in_chan}x{pooled_dim[ll][0]}x{pooled_dim[ll][1]}, '
-                               f'got {out_size[0]}x{out_size[1]}x{out_size[2]}.')
-
-                if operands[ll] > 1 and pool_first[ll]:
-                    data = run_eltwise(data, ll)
+                if scheduler is not None:
+                    out_buf, out_size = scheduler.result(ll)
                 else:
-                    data = np.squeeze(data, axis=0)
-
-                if datafile is not None:
-                    # if operands[ll] > 1 and pool_first[ll]:
-                    np.save(datafile, data, allow_pickle=False, fix_imports=False)
-                    # else:
-                    #    np.save(datafile, np.empty((0)), allow_pickle=False, fix_imports=False)
-
-                # Convolution or passthrough
-                if operator[ll] in [op.CONV2D, op.LINEAR]:
-                    if flatten[ll]:
-                        in_chan *= pooled_dim[ll][0] * pooled_dim[ll][1]
-                        data = data.reshape(in_chan, 1, 1)
-                        if verbose:
-                            print_data(
-                                verbose,
-                                f'FLATTEN TO {in_chan}x1x1',
-                                data,
-                                data.shape,
-                                1,
-                                in_chan,
-                            )
+                    out_buf, out_size = simulate_layer(ll, data_buf)
 
-                    if not bypass[ll]:
-                        k = kernel[kernel_ptrs[ll]].reshape(
-                                output_chan[ll],
-                                in_chan // conv_groups[ll],
-                                kernel_size[ll][0],
-                                kernel_size[ll][1],
-                            )
-                    else:
-                        k = np.full(
-                                (output_chan[ll], in_chan, kernel_size[ll][0], kernel_size[ll][0]),
-                                1,
-                                dtype=np.int64,
-                            )
-
-                    out_buf, out_size = conv2d_layer(
-                        ll,
-                        data.shape,
-                        kernel_size[ll],
-                        output_shift[ll],
-                        output_chan[ll],
-                        padding[ll],
-                        dilation[ll],
-                        stride[ll],
-                        activation[ll],
-                        k,
-                        bias[bias_ptrs[ll]],
-                        data,
-                        output_width=output_width[ll],
-                        groups=conv_groups[ll],
-                        bypass=bypass[ll],
-                        datafile=datafile,
-                    )
-                elif operator[ll] == op.CONVTRANSPOSE2D:
-                    if not bypass[ll]:
-                        k = kernel[kernel_ptrs[ll]].reshape(
-                                output_chan[ll],
-                                in_chan // conv_groups[ll],
-                                kernel_size[ll][0],
-                                kernel_size[ll][1],
-                            )
-                    else:
-                        k = np.full(
-                                (output_chan[ll], in_chan, kernel_size[ll][0], kernel_size[ll][0]),
-                                1,
-                                dtype=np.int64,
-                            )
-
-                    out_buf, out_size = convtranspose2d_layer(
-                        ll,
-                        data.shape,
-                        kernel_size[ll],
-                        output_shift[ll],
-                        output_chan[ll],
-                        padding[ll],
-                        dilation[ll],
-                        stride[ll],
-                        output_padding[ll],
-                        activation[ll],
-                        k,
-                        bias[bias_ptrs[ll]],
-                        data,
-                        output_width=output_width[ll],
-                        groups=conv_groups[ll],
-                        bypass=bypass[ll],
-                        datafile=datafile,
-                    )
-                elif operator[ll] == op.CONV1D:
-                    if not bypass[ll]:
-                        k = kernel[kernel_ptrs[ll]].reshape(
-                                output_chan[ll],
-                                input_chan[ll] // conv_groups[ll],
-                                kernel_size[ll][0],
-                            )
-                    else:
-                        k = np.full(
-                                (output_chan[ll], input_chan[ll], kernel_size[ll][0],),
-                                1,
-                                dtype=np.int64,
-                            )
-
-                    out_buf, out_size = conv1d_layer(
-                        ll,
-                        data.shape,
-                        kernel_size[ll][0],
-                        output_shift[ll],
-                        output_chan[ll],
-                        padding[ll][0],
-                        dilation[ll][0],
-                        stride[ll][0],
-                        activation[ll],
-                        k,
-                        bias[bias_ptrs[ll]],
-                        data,
-                        output_width=output_width[ll],
-                        groups=conv_groups[ll],
-                        bypass=bypass[ll],
-                        datafile=datafile,
-                    )
-                elif operator[ll] == op.NONE:  # '0'D (pooling only or passthrough)
-                    out_buf, out_size = passthrough_layer(
-                        ll,
-                        data.shape,
-                        data,
-                        datafile=datafile,
-                    )
-                else:
-                    eprint(f'Unknown operator `{op.string(operator[ll])}`.')
-
-                if buffer_shift[ll] is not None:
-                    data_buffer = np.roll(data_buffer, -buffer_shift[ll], axis=0)
-                    data_buffer[-buffer_shift[ll]:, :, :] = 0
-                    out_buf = np.roll(out_buf, -buffer_shift[ll], axis=0)
-                    out_buf[-buffer_shift[ll]:, :, :] = 0
-                if buffer_insert[ll] is not None:
-                    try:
-                        buffer_dims = data_buffer.shape
-                        data_buffer[-buffer_insert[ll]:, :, :] = \
-                            out_buf.transpose(1, 2, 0).reshape(1, buffer_dims[1], -1)
-                    except IndexError:
-                        eprint(f'{layer_pfx(ll)}Buffer insertion unsuccessful. Check that the '
-                               f'output dimensions of the layer are consistent with the buffer '
-                               f'specification (dim and channels)')
+                out_buf, data_buffer = simulate.update_buffer(ll, out_buf, data_buffer)
                 if operator[ll] in [op.CONV2D, op.LINEAR, op.CONVTRANSPOSE2D, op.CONV1D]:
                     if weightsfile is not None:
                         np.save(
@@ -3259,8 +3036,10 @@ class Backend(backend.Backend):
 
                 try:
                     if filename:
-                        memfile = open(os.path.join(base_directory, test_name, filename),
-                                       mode=filemode, encoding='utf-8')
+                        memfile = emitter.open_file(
+                            os.path.join(base_directory, test_name, filename),
+                            mode=filemode,
+                        )
                     else:
                         memfile = None
                     apb.set_memfile(memfile)
@@ -3360,8 +3139,7 @@ class Backend(backend.Backend):
                         if all_outputs_map is None:
                             in_map = out_map
                         else:
-                            in_map = np.array(all_outputs_map, copy=True)
-                            datamem.combine(in_map, out_map)
+                            in_map = datamem.layered(all_outputs_map, out_map)
 
                 compute.debug_close()
 
@@ -3380,10 +3158,17 @@ class Backend(backend.Backend):
 
         data = data_buf[ll]
 
+        if state.sample_batch is not None:
+            batchsim.report(
+                batchsim.run(state.sample_batch, kernel, bias, kernel_ptrs, bias_ptrs),
+                out_buf.reshape(out_size),
+                test_name,
+            )
+
         try:
             if filename:
-                memfile = open(os.path.join(base_directory, test_name, filename),
-                               mode=filemode, encoding='utf-8')
+                memfile = emitter.open_file(os.path.join(base_directory, test_name, filename),
+                                            mode=filemode)
             else:
                 memfile = None
             apb.set_memfile(memfile)
@@ -3488,8 +3273,8 @@ class Backend(backend.Backend):
         # ----------------------------------------------------------------------------------------
 
         if not block_mode:
-            with open(os.path.join(base_directory, test_name, filename), mode=filemode,
-                      encoding='utf-8') as memfile:
+            with emitter.open_file(os.path.join(base_directory, test_name, filename),
+                                   mode=filemode) as memfile:
                 apb.set_memfile(memfile)
 
                 if state.softmax or embedded_code and state.unload:
@@ -0,0 +1,102 @@
+###################################################################################################
+# Copyright (C) 2024 Maxim Integrated Products, Inc. All Rights Reserved.
+#
+# Maxim Integrated Products, Inc. Default Copyright Notice:
+# https://www.maximintegrated.com/en/aboutus/legal/copyrights.html
+###################################################################################################
+"""
+Simulate a batch of sample inputs through the network (known-answer path only)
+"""
+import os
+
+import numpy as np
+
+from . import simulate, state
+from .eprint import nprint, wprint
+
+
+def run(
+        data,
+        kernel,
+        bias,
+        kernel_ptrs,
+        bias_ptrs,
+):
+    """
+    Simulate all samples in `data` (N, C, H, W) through the network, using the weights
+    `kernel` and `bias` indexed via `kernel_ptrs` and `bias_ptrs`. Each layer is computed for
+    all samples at once by `simulate.simulate_layer()`, the same function that computes the
+    known-answer output. Returns the final output for all samples as an array of shape
+    (N, C, H, W).
+    """
+    samples = data.shape[0]
+    data_buffer = None
+    if state.data_buffer is not None:
+        # The rolling data buffer starts out empty for every sample
+        data_buffer = np.zeros((samples, ) + state.data_buffer.shape, dtype=np.int64)
+
+    # data_buf[ll + 1] is the output of layer ll, see create_net()
+    data_buf = [None] * (state.layers + 1)
+    ll = state.start_layer
+    data_buf[ll] = data
+
+    while ll < state.layers:
+        out_buf, out_size = simulate.simulate_layer(ll, data_buf, kernel, bias, kernel_ptrs,
+                                                    bias_ptrs, data_buffer=data_buffer,
+                                                    batch=True)
+        out_buf, data_buffer = simulate.update_buffer(ll, out_buf, data_buffer)
+
+        if state.simulated_sequence[ll] is not None:
+            if state.simulated_sequence[ll] == -1:
+                break
+            ll = state.simulated_sequence[ll]
+        else:
+            if state.next_sequence[ll] == -1:
+                break
+            ll = state.next_sequence[ll]
+
+        data_buf[ll] = out_buf.reshape((samples, ) + tuple(out_size))
+
+    return out_buf.reshape((samples, ) + tuple(out_size))
+
+
+def report(
+        result,
+        known_answer,
+        test_name,
+):
+    """
+    Save the batched simulation `result` and print a report comparing each sample's output
+    to the known-answer output `known_answer` that was generated for the sample input.
+    """
+    samples = result.shape[0]
+    known_answer = known_answer.reshape(result.shape[1:])
+
+    if state.batch_numpy is not None:
+        np.save(os.path.join(state.base_directory, test_name, state.batch_numpy), result,
+                allow_pickle=False, fix_imports=False)
+
+    flat = result.reshape(samples, -1)
+    mismatches = np.count_nonzero(flat != known_answer.reshape(1, -1), axis=1)
+    classes = np.argmax(flat, axis=1)
+    same_class = classes == np.argmax(known_answer)
+
+    print(f'\nBATCH SIMULATION: {samples} sample{"s" if samples != 1 else ""}, output '
+          f'{"x".join(str(d) for d in result.shape[1:])}')
+    if state.verbose:
+        for i in range(samples):
+            print(f'Sample {i:5}: {mismatches[i]:6} mismatched values, top-1 {classes[i]:5}'
+                  f'{" (same as known-answer)" if same_class[i] else ""}')
+    if np.array_equal(np.asarray(state.sample_batch)[0], state.data):
+        print('Batch sample 0 is identical to the sample input and its output '
+              f'{"matches" if mismatches[0] == 0 else "does NOT match"} the known-answer test')
+        if mismatches[0] != 0:
+            wprint('The batch simulation result for the sample input does not match the '
+                   'known-answer test.')
+    print(f'Samples matching the known-answer output: {np.count_nonzero(mismatches == 0)} '
+          f'of {samples}')
+    print(f'Samples with the same top-1 output: {np.count_nonzero(same_class)} of {samples}')
+
+    nprint(f'Batch simulation: {np.count_nonzero(mismatches == 0)} of {samples} samples match '
+           f'the known-answer output, {np.count_nonzero(same_class)} of {samples} have the '
+           'same top-1 output.')
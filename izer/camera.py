@@ -1,5 +1,5 @@
 ###################################################################################################
-# Copyright (C) 2020-2021 Maxim Integrated Products, Inc. All Rights Reserved.
+# Copyright (C) 2020-2024 Maxim Integrated Products, Inc. All Rights Reserved.
 #
 # Maxim Integrated Products, Inc. Default Copyright Notice:
 # https://www.maximintegrated.com/en/aboutus/legal/copyrights.html
@@ -9,12 +9,18 @@ Simulated camera data
 """
 from typing import TextIO
 
+import numpy as np
+
 VSYNC_LEADIN = 10
 VSYNC_HIGH = 50  # 5000
 VSYNC_LOW = 20  # 2000
 RETRACE = 5  # 318
 FINAL = 10
 
+# One row of the camera stream
+STREAM_DTYPE = np.dtype([('vsync', np.uint8), ('href', np.uint8), ('pclk', np.uint8),
+                         ('d', np.uint8)])
+
 
 def write(
         f: TextIO,
@@ -89,3 +95,68 @@ def pixel(
     Write pixel data `val` (HREF high) to CSV file `f`.
     """
     write(f, 0, 1, val, stretch=1)
+
+
+def cycles(
+        vsync: int,
+        href: int,
+        d: np.ndarray,
+        stretch: int = 0,
+) -> np.ndarray:
+    """
+    Return the stream rows that `write()` creates for each of the values in array `d`.
+    """
+    d = np.asarray(d, dtype=np.uint8)
+    pclk = np.array([0, 1, 1] + [0, 0, 0] * stretch, dtype=np.uint8)
+    rv = np.empty(d.shape + pclk.shape, dtype=STREAM_DTYPE)
+    rv['vsync'] = vsync
+    rv['href'] = href
+    rv['pclk'] = pclk
+    rv['d'] = d[..., np.newaxis]
+    return rv.reshape(d.shape[:-1] + (d.shape[-1] * len(pclk),))
+
+
+def image(
+        pixels: np.ndarray,
+        retrace: int = RETRACE,
+        leader: int = VSYNC_LEADIN,
+        high: int = VSYNC_HIGH,
+        low: int = VSYNC_LOW,
+        final: int = FINAL,
+) -> np.ndarray:
+    """
+    Return the complete camera stream for an image, with one row of pixel data bytes for each
+    row in the 2D array `pixels`. This is the same stream that `header()`, `pixel()`,
+    `finish_row()` and `finish_image()` write.
+    """
+    rows = np.concatenate((cycles(0, 1, pixels, stretch=1),
+                           cycles(0, 0, np.zeros((len(pixels), retrace)))), axis=1)
+    return np.concatenate((
+        cycles(0, 0, np.zeros(leader)),
+        cycles(1, 0, np.zeros(high)),
+        cycles(0, 0, np.zeros(low)),
+        rows.reshape(-1),
+        cycles(0, 0, np.zeros(final)),
+    ))
+
+
+def save(
+        filename: str,
+        stream: np.ndarray,
+        binary: bool = False,
+) -> None:
+    """
+    Save the camera `stream` to file `filename`, either as CSV or, when `binary` is `True`,
+    as big endian 16-bit words {5'b0, vsync, href, pclk, d[7:0]} without a header.
+    """
+    words = stream['vsync'].astype(np.uint16) << 10 | stream['href'].astype(np.uint16) << 9 \
+        | stream['pclk'].astype(np.uint16) << 8 | stream['d']
+    if binary:
+        words.astype('>u2').tofile(filename)
+        return
+
+    lines = np.array([f'{w >> 10},{w >> 9 & 1},{w >> 8 & 1},{w & 0xff:02x}\n'
+                      for w in range(1 << 11)])
+    with open(filename, mode='w', encoding='utf-8') as f:
+        f.write('vsync,href,pclk,d\n')
+        f.write(''.join(lines[words].tolist()))
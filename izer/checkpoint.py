@@ -7,15 +7,23 @@
 """
 Checkpoint File Routines
 """
+import json
+import os
+import shutil
 import sys
+import tempfile
 
 import numpy as np
-import torch
+
+import xxhash
 
 from . import op, state
 from . import tornadocnn as tc
 from .eprint import eprint, wprint
 from .names import layer_str
+from .utils import timed_import
+
+CACHE_VERSION = 1
 
 
 def load(
@@ -42,8 +50,172 @@ def load(
     In addition to returning weights and biases, this function configures the network output
     channels and the number of layers.
     When `verbose` is set, display the shapes of the weights.
+
+    When `state.checkpoint_cache` is set, the results are cached in that folder, keyed by the
+    contents of the checkpoint file and all parameters, so that subsequent runs do not need to
+    load PyTorch.
     """
     no_bias = no_bias or []
+
+    key = None
+    cached = None
+    if state.checkpoint_cache is not None:
+        key = cache_key(checkpoint_file, arch, quantization, bias_quantization, output_shift,
+                        kernel_size, operator, no_bias, conv_groups, bypass, weight_source,
+                        skip_layers, tc.dev.SUPPORT_BINARY_WEIGHTS, state.ignore_bn)
+        cached = cache_get(key)
+
+    if cached is None:
+        info, weights, bias = _read(checkpoint_file, arch, quantization, bias_quantization,
+                                    output_shift, kernel_size, operator, no_bias, conv_groups,
+                                    bypass, weight_source, skip_layers)
+        if key is not None and not info['error_exit']:
+            cache_put(key, info, weights, bias)
+    else:
+        info, weights, bias = cached
+        print(f'Reading {checkpoint_file} to configure network weights...')
+        for message in info['warnings']:
+            wprint(message)
+        quantization[:] = info['quantization']
+        output_shift[:] = info['output_shift']
+
+    layers = info['layers']
+    if verbose:
+        weight_key_len = max(41, max(len(info['weight_keys'][ll]) for ll in range(layers)))
+        print(f'Checkpoint for epoch {info["epoch"]}, model {info["arch"]} - '
+              'weight and bias data:')
+        print(' InCh OutCh  Weights         Quant Shift  Min  Max    Size '
+              f'Key{" ":<{weight_key_len - 3}} Bias       Quant  Min  Max Size Key')
+        for ll in range(layers):
+            if ll < len(weights) and weights[ll] is not None:
+                weight_shape = str(weights[ll].shape)
+                if bias[ll] is not None:
+                    bias_shape = str(bias[ll].shape)
+                else:
+                    bias_shape = 'N/A'
+                if output_shift[ll] is not None:
+                    output_shift_shape = output_shift[ll]
+                else:
+                    output_shift_shape = 'N/A'
+                print(f'{info["input_channels"][ll]:5} {info["output_channels"][ll]:5}  '
+                      f'{weight_shape:15} '
+                      f'{info["quant"][ll]:5} {output_shift_shape:5} '
+                      f'{info["weight_min"][ll]:4} {info["weight_max"][ll]:4} '
+                      f'{info["weight_size"][ll]:7} '
+                      f'{info["weight_keys"][ll]:<{weight_key_len}} '
+                      f'{bias_shape:10} '
+                      f'{info["bias_quant"][ll]:5} {info["bias_min"][ll]:4} '
+                      f'{info["bias_max"][ll]:4} {info["bias_size"][ll]:4} '
+                      f'{info["bias_keys"][ll]:25}')
+        print(f'TOTAL: {layers} parameter layers, {info["param_count"]:,} parameters, '
+              f'{info["param_size"]:,} bytes')
+
+    if info['error_exit']:
+        sys.exit(1)
+
+    return layers, weights, bias, output_shift, \
+        info['input_channels'], info['output_channels'], \
+        dict(info['final_scale'])
+
+
+def cache_key(
+        checkpoint_file,
+        *params,
+) -> str:
+    """
+    Return a hash of the contents of `checkpoint_file` and the parameters `params`.
+    """
+    h = xxhash.xxh3_128()
+    with open(checkpoint_file, mode='rb') as f:
+        while True:
+            chunk = f.read(1 << 20)
+            if not chunk:
+                break
+            h.update(chunk)
+    h.update(repr((CACHE_VERSION, params)).encode())
+    return h.hexdigest()
+
+
+def cache_get(
+        key,
+):
+    """
+    Return the cached (info, weights, bias) for `key`, or None if not cached. The weights and
+    biases are memory-mapped (copy-on-write).
+    """
+    folder = os.path.join(state.checkpoint_cache, key)
+    try:
+        with open(os.path.join(folder, 'info.json'), mode='r', encoding='utf-8') as f:
+            info = json.load(f)
+        if info.get('version') != CACHE_VERSION:
+            return None
+        weights = [np.asarray(np.load(os.path.join(folder, f'weight-{ll}.npy'), mmap_mode='c'))
+                   for ll in range(info['layers'])]
+        bias = [np.asarray(np.load(os.path.join(folder, f'bias-{ll}.npy'), mmap_mode='c'))
+                if info['bias_keys'][ll] != 'N/A' else None for ll in range(info['layers'])]
+    except (OSError, ValueError, KeyError):
+        return None
+
+    return info, weights, bias
+
+
+def cache_put(
+        key,
+        info,
+        weights,
+        bias,
+) -> None:
+    """
+    Store `info`, `weights`, and `bias` in the cache under `key`. The entry is written to a
+    temporary folder first, so concurrent runs never see partial entries.
+    """
+    assert state.checkpoint_cache is not None
+    try:
+        os.makedirs(state.checkpoint_cache, exist_ok=True)
+        tmp = tempfile.mkdtemp(prefix='.tmp-', dir=state.checkpoint_cache)
+    except OSError as exc:
+        wprint(f'Cannot create checkpoint cache in `{state.checkpoint_cache}`: {exc}')
+        return
+
+    try:
+        for ll, w in enumerate(weights):
+            np.save(os.path.join(tmp, f'weight-{ll}.npy'), w, allow_pickle=False)
+            if bias[ll] is not None:
+                np.save(os.path.join(tmp, f'bias-{ll}.npy'), bias[ll], allow_pickle=False)
+        with open(os.path.join(tmp, 'info.json'), mode='w', encoding='utf-8') as f:
+            json.dump(dict(info, version=CACHE_VERSION), f)
+        os.rename(tmp, os.path.join(state.checkpoint_cache, key))
+    except OSError:
+        # Already cached by a concurrent run, or the cache is not writable
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def _read(
+        checkpoint_file,
+        arch,
+        quantization,
+        bias_quantization,
+        output_shift,
+        kernel_size,
+        operator,
+        no_bias,
+        conv_groups,
+        bypass,
+        weight_source,
+        skip_layers,
+):
+    """
+    Read `checkpoint_file` for `load()`. Return a dictionary with all results and information
+    needed for the verbose output (JSON serializable), and the weights and biases.
+    """
+    torch = timed_import('torch')  # PyTorch is slow to load
+
+    warnings = []
+
+    def warn(message):
+        wprint(message)
+        warnings.append(message)
+
     weights = []
     bias = []
     weight_keys = []
@@ -64,7 +236,7 @@ def load(
     if 'state_dict' not in checkpoint:
         eprint("No `state_dict` in checkpoint file.")
     if 'arch' not in checkpoint:
-        wprint("No `arch` in checkpoint file.")
+        warn("No `arch` in checkpoint file.")
         checkpoint_arch = ''
     else:
         checkpoint_arch = checkpoint['arch']
@@ -109,14 +281,16 @@ def load(
             w_min, w_max, w_abs = w.min(), w.max(), np.abs(w)
 
             if np.all(w == 0):
-                wprint(f'All weights for `{k}` are zero.')
+                warn(f'All weights for `{k}` are zero.')
 
             if w.ndim == 1:
                 if this_op == 'bn':
-                    eprint('The checkpoint file contains 1-dimensional weights for '
-                           f'`{layer}.{this_op}.{parameter}` with dimensions {w.shape}. '
-                           'Ensure the BatchNorm layers have been folded.',
-                           error=not state.ignore_bn)
+                    message = 'The checkpoint file contains 1-dimensional weights for ' \
+                              f'`{layer}.{this_op}.{parameter}` with dimensions {w.shape}. ' \
+                              'Ensure the BatchNorm layers have been folded.'
+                    if not state.ignore_bn:
+                        eprint(message)
+                    warn(message)
                     continue
                 eprint('The checkpoint file contains 1-dimensional weights for '
                        f'`{layer}.{this_op}.{parameter}` with dimensions {w.shape}.')
@@ -210,7 +384,7 @@ def load(
                     astype(np.int64)
 
                 if np.all(w == 0):
-                    wprint(f'All bias values for `{bias_name}` are zero.')
+                    warn(f'All bias values for `{bias_name}` are zero.')
 
                 w_min, w_max = w.min(), w.max()
                 assert w_min >= -(2**(bias_quantization[seq]-1))
@@ -245,7 +419,7 @@ def load(
                     w = checkpoint_state[output_shift_name].numpy().astype(np.int64)
 
                     assert len(w) == 1
-                    output_shift[seq] = w[0]
+                    output_shift[seq] = int(w[0])
                 else:
                     output_shift[seq] = 0
 
@@ -261,36 +435,29 @@ def load(
             layers += 1
             seq += 1
 
-    if verbose:
-        weight_key_len = max(41, max(len(weight_keys[ll]) for ll in range(layers)))
-        print(f'Checkpoint for epoch {checkpoint["epoch"]}, model {checkpoint_arch} - '
-              'weight and bias data:')
-        print(' InCh OutCh  Weights         Quant Shift  Min  Max    Size '
-              f'Key{" ":<{weight_key_len - 3}} Bias       Quant  Min  Max Size Key')
-        for ll in range(layers):
-            if ll < len(weights) and weights[ll] is not None:
-                weight_shape = str(weights[ll].shape)
-                if bias[ll] is not None:
-                    bias_shape = str(bias[ll].shape)
-                else:
-                    bias_shape = 'N/A'
-                if output_shift[ll] is not None:
-                    output_shift_shape = output_shift[ll]
-                else:
-                    output_shift_shape = 'N/A'
-                print(f'{input_channels[ll]:5} {output_channels[ll]:5}  '
-                      f'{weight_shape:15} '
-                      f'{quant[ll]:5} {output_shift_shape:5} '
-                      f'{weight_min[ll]:4} {weight_max[ll]:4} {weight_size[ll]:7} '
-                      f'{weight_keys[ll]:<{weight_key_len}} '
-                      f'{bias_shape:10} '
-                      f'{bias_quant[ll]:5} {bias_min[ll]:4} {bias_max[ll]:4} {bias_size[ll]:4} '
-                      f'{bias_keys[ll]:25}')
-        print(f'TOTAL: {layers} parameter layers, {param_count:,} parameters, '
-              f'{param_size:,} bytes')
-
-    if error_exit:
-        sys.exit(1)
-
-    return layers, weights, bias, output_shift, \
-        input_channels, output_channels, final_scale
+    info = {
+        'layers': layers,
+        'quantization': quantization,
+        'output_shift': output_shift,
+        'input_channels': input_channels,
+        'output_channels': output_channels,
+        'final_scale': list(final_scale.items()),
+        'epoch': f'{checkpoint["epoch"]}',
+        'arch': checkpoint_arch,
+        'weight_keys': weight_keys,
+        'quant': quant,
+        'weight_min': [int(e) for e in weight_min],
+        'weight_max': [int(e) for e in weight_max],
+        'weight_size': [int(e) for e in weight_size],
+        'bias_keys': bias_keys,
+        'bias_quant': bias_quant,
+        'bias_min': [int(e) for e in bias_min],
+        'bias_max': [int(e) for e in bias_max],
+        'bias_size': [int(e) for e in bias_size],
+        'param_count': int(param_count),
+        'param_size': int(param_size),
+        'warnings': warnings,
+        'error_exit': error_exit,
+    }
+
+    return info, weights, bias
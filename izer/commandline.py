@@ -8,6 +8,8 @@
 Command line parser for Tornado CNN
 """
 import argparse
+import os
+from typing import List, Optional, Tuple
 
 from . import camera, state
 from .devices import device
@@ -15,9 +17,9 @@ from .eprint import wprint
 from .tornadocnn import MAX_MAX_LAYERS
 
 
-def get_parser() -> argparse.Namespace:
+def get_parser(argv: Optional[List[str]] = None) -> argparse.Namespace:
     """
-    Return an argparse parser.
+    Return an argparse parser. Parse `argv` if given, else the command line.
     """
 
     parser = argparse.ArgumentParser(description="MAX7800X CNN Generator")
@@ -70,6 +72,12 @@ def get_parser() -> argparse.Namespace:
                        help="YAML configuration file containing layer configuration")
     group.add_argument('--checkpoint-file', metavar='S',
                        help="checkpoint file containing quantized weights")
+    group.add_argument('--checkpoint-cache', metavar='S', nargs='?',
+                       const=os.path.join(os.environ.get('XDG_CACHE_HOME')
+                                          or os.path.join('~', '.cache'),
+                                          'ai8x-synthesis', 'checkpoints'),
+                       help="cache checkpoint data in folder S, or no argument for "
+                            "~/.cache/ai8x-synthesis/checkpoints (default: None)")
     group.add_argument('--board-name', metavar='S', default='EvKit_V1',
                        help="set board name (default: EvKit_V1)")
     group.add_argument('--display-checkpoint', action='store_true', default=False,
@@ -120,6 +128,13 @@ def get_parser() -> argparse.Namespace:
                         help="use express kernel loading (default: true)")
     mgroup.add_argument('--no-mexpress', action='store_false', dest='mexpress',
                         help="disable express kernel loading")
+    group.add_argument('--compress-kernels', action='store_true', default=False,
+                       help="compress the weights for the kernel loader (default: false)")
+    group.add_argument('--global-kernel-placement', action='store_true', default=False,
+                       help="when layers do not fit in network order, plan the kernel memory "
+                            "placement for all layers together (default: layer by layer)")
+    group.add_argument('--kernel-placement-time', type=float, metavar='SECONDS', default=10.0,
+                       help="time limit for --global-kernel-placement (default: 10)")
     group.add_argument('--mlator', action='store_true', default=False,
                        help="use hardware to swap output bytes (default: false)")
     group.add_argument('--unroll-mlator', type=int, metavar='N', default=8,
@@ -183,6 +198,13 @@ def get_parser() -> argparse.Namespace:
                             "'None' to inline code)")
     group.add_argument('--sample-numpy-filename', dest='result_numpy', metavar='S',
                        help="save sample result as NumPy file (default: disabled)")
+    group.add_argument('--sample-batch', metavar='S', default=None,
+                       help="simulate a batch of N sample inputs from a NxCxHxW NumPy file and "
+                            "compare to the known-answer test (default: disabled)")
+    group.add_argument('--sample-batch-numpy-filename', dest='batch_numpy', metavar='S',
+                       default='sampleoutput_batch.npy',
+                       help="save batch results as NumPy file "
+                            "(default: 'sampleoutput_batch.npy', use 'None' to disable)")
 
     # Streaming and FIFOs
     group = parser.add_argument_group('Streaming and FIFOs')
@@ -323,6 +345,9 @@ def get_parser() -> argparse.Namespace:
     group.add_argument('--input-csv-format', type=int, metavar='N', default=888,
                        choices=[555, 565, 888],
                        help="format for .csv input data (555, 565, 888, default: 888)")
+    group.add_argument('--input-csv-binary', action='store_true', default=False,
+                       help="write the camera sim input data in binary format to a .bin file "
+                            "instead of the .csv file")
     group.add_argument('--input-csv-retrace', type=int, metavar='N', default=camera.RETRACE,
                        help="delay for camera retrace when using .csv input data "
                             f"(default: {camera.RETRACE})")
@@ -460,14 +485,32 @@ def get_parser() -> argparse.Namespace:
                        help='do not check GitHub for newer versions of the repository')
     group.add_argument('--version-check-interval', type=int, metavar='HOURS', default=24,
                        help='version check update interval (hours), default = 24')
+    group.add_argument('--profile-startup', action='store_true', default=False,
+                       help='report the time spent importing modules (default: false)')
+    group.add_argument('--latency-only', action='store_true', default=False,
+                       help='estimate the network latency from the configuration and exit '
+                            'without simulation or code generation (default: false)')
     group.add_argument('--upstream', metavar='REPO', default="MaximIntegratedAI/ai8x-synthesis",
                        help='GitHub repository name for update checking')
     group.add_argument('--yamllint', metavar='S', default='yamllint',
                        help='name of linter for YAML files (default: yamllint)')
     group.add_argument('--no-scale-output', action='store_true', default=False,
                        help="scale output with final layer scale factor (default: false)")
-
-    args = parser.parse_args()
+    group.add_argument('--sim-engine', default='reference', choices=['reference', 'gemm'],
+                       help="convolution engine for the known-answer simulation "
+                            "(default: reference)")
+    group.add_argument('--sim-threads', type=int, default=1, metavar='N',
+                       help="simulate independent layers (branches) of the network on N "
+                            "threads (default: 1)")
+    # --batch and --batch-workers are handled by get_batch_parser() before this parser runs
+    group.add_argument('--batch', metavar='S', default=None,
+                       help="run all network generation jobs listed in YAML file S, adding all "
+                            "other arguments to every job (default: disabled)")
+    group.add_argument('--batch-workers', type=int, metavar='N', default=None,
+                       help="number of worker processes for `--batch` "
+                            "(default: number of CPUs)")
+
+    args = parser.parse_args(argv)
 
     if args.rtl_preload:
         args.embedded_code = False
@@ -548,11 +591,30 @@ def get_parser() -> argparse.Namespace:
     if args.allow_streaming:
         wprint('`--allow-streaming` is unsupported.')
 
+    if args.compress_kernels and (not args.new_kernel_loader or args.rtl_preload_weights
+                                  or args.verify_kernels or args.verify_writes):
+        wprint('`--compress-kernels` requires the new kernel loader and is ignored when using '
+               '`--rtl-preload-weights`, `--verify-kernels`, or `--verify-writes`.')
+        args.compress_kernels = False
+
+    if args.input_csv_binary:
+        if args.input_csv is None:
+            wprint('`--input-csv-binary` requires `--input-csv` and is ignored.')
+            args.input_csv_binary = False
+        else:
+            args.input_csv = os.path.splitext(args.input_csv)[0] + '.bin'
+
     if args.result_filename is None:
         args.result_filename = 'sampleoutput.h' if args.embedded_code else None
     elif args.result_filename.lower() == 'none':
         args.result_filename = None
 
+    if args.batch_numpy.lower() == 'none':
+        args.batch_numpy = None
+
+    if args.checkpoint_cache is not None:
+        args.checkpoint_cache = os.path.expanduser(args.checkpoint_cache)
+
     if args.define != '':
         args.define = "-D" + " -D".join(args.define.split(' '))
 
@@ -576,6 +638,22 @@ def get_parser() -> argparse.Namespace:
     return args
 
 
+def get_batch_parser(
+        argv: Optional[List[str]] = None,
+) -> Tuple[argparse.Namespace, List[str]]:
+    """
+    Return the parsed batch mode arguments, and all other arguments (which are added to
+    every job).
+    """
+    parser = argparse.ArgumentParser(description="MAX7800X CNN Generator (batch mode)")
+    parser.add_argument('--batch', required=True, metavar='S',
+                        help="run all network generation jobs listed in YAML file S")
+    parser.add_argument('--batch-workers', type=int, metavar='N', default=None,
+                        help="number of worker processes (default: number of CPUs)")
+
+    return parser.parse_known_args(argv)
+
+
 def set_state(args: argparse.Namespace) -> None:
     """
     Set configuration state based on command line arguments.
@@ -590,16 +668,19 @@ def set_state(args: argparse.Namespace) -> None:
     state.avg_pool_rounding = args.avg_pool_rounding
     state.balance_power = args.balance_speed
     state.base_directory = args.test_dir
+    state.batch_numpy = args.batch_numpy
     state.block_mode = not args.top_level
     state.board_name = args.board_name
     state.boost = args.boost
     state.c_filename = args.c_filename
+    state.checkpoint_cache = args.checkpoint_cache
     state.calcx4 = args.calcx4
     state.clock_divider = args.clock_divider
     state.clock_trim = args.clock_trim
     state.compact_data = args.compact_data and \
         (not args.rtl_preload or args.fifo or args.fast_fifo or args.fast_fifo_quad)
     state.compact_weights = args.compact_weights
+    state.compress_kernels = args.compress_kernels
     state.debug = args.debug
     state.debug_computation = args.debug_computation
     state.debug_latency = args.debug_latency
@@ -625,6 +706,7 @@ def set_state(args: argparse.Namespace) -> None:
     state.fixed_input = args.fixed_input
     state.forever = args.forever and args.embedded_code
     state.generate_kat = args.generate_kat
+    state.global_kernel_placement = args.global_kernel_placement
     # state.greedy_kernel_allocator = args.greedy_kernel_allocator
     state.ignore_activation = args.ignore_activation
     state.ignore_bias_groups = args.ignore_bias_groups
@@ -635,6 +717,7 @@ def set_state(args: argparse.Namespace) -> None:
     state.increase_start = args.increase_start
     state.init_tram = args.init_tram
     state.input_csv = args.input_csv
+    state.input_csv_binary = args.input_csv_binary
     state.input_csv_format = args.input_csv_format
     state.input_csv_period = args.input_csv_period
     state.input_csv_retrace = args.input_csv_retrace
@@ -643,6 +726,7 @@ def set_state(args: argparse.Namespace) -> None:
     state.input_pix_clk = args.input_pix_clk
     state.input_sync = args.input_sync
     state.kernel_format = args.kernel_format
+    state.kernel_placement_time = args.kernel_placement_time
     state.legacy_kernels = args.legacy_kernels
     state.legacy_test = args.legacy_test
     state.link_layer = args.link_layer
@@ -694,6 +778,8 @@ def set_state(args: argparse.Namespace) -> None:
     state.runtest_filename = args.runtest_filename
     state.sample_filename = args.sample_filename
     state.scale_output = not args.no_scale_output
+    state.sim_engine = args.sim_engine
+    state.sim_threads = args.sim_threads
     state.simple1b = args.simple1b
     state.sleep = args.deepsleep
     state.slow_load = args.slow_load
@@ -59,6 +59,69 @@ def debug_close() -> None:
     state.debug_log = None
 
 
+def convolve_reference(
+        view,
+        weight,
+        groups,
+) -> np.ndarray:
+    """
+    Reference convolution engine. `view` is a strided (N, <output dims>, C, <kernel dims>)
+    view of the padded input data, `weight` is ordered (O, C // groups, <kernel dims>).
+    The int64 result is ordered (N, O, <output dims>).
+    """
+    spatial = view.ndim - weight.ndim  # Number of output dimensions (1 or 2)
+
+    if groups > 1:
+        # Grouped (e.g., depth-wise) convolution: Each group of output channels only sees its
+        # own group of input channels, so convolve all groups at once without expanding the
+        # weights to all input channels
+        view = view.reshape(view.shape[:spatial + 1] + (groups, -1) + view.shape[spatial + 2:])
+        weight = weight.reshape((groups, -1) + weight.shape[1:])
+        dims, kernel = 'hw'[:spatial], 'ij'[:spatial]
+        output = np.einsum(f'n{dims}gc{kernel},goc{kernel}->ngo{dims}', view, weight)
+        return output.reshape((output.shape[0], -1) + output.shape[3:])
+
+    output = np.tensordot(view, weight, axes=(tuple(range(spatial + 1, view.ndim)),
+                                              tuple(range(1, weight.ndim))))
+    return np.moveaxis(output, -1, 1)
+
+
+def convolve_gemm(
+        view,
+        weight,
+        groups,
+) -> np.ndarray:
+    """
+    im2col/GEMM convolution engine, bit-exact with `convolve_reference()`. The unrolled
+    input is multiplied with the weights in float64 using BLAS. This is exact as long as the
+    largest possible sum of products is below 2**53, which always holds for 8-bit operands.
+    Otherwise, and for depth-wise convolutions (which have no matrix product to speak of), fall
+    back to the reference engine.
+    """
+    if weight.shape[0] == groups > 1:
+        return convolve_reference(view, weight, groups)
+
+    spatial = view.ndim - weight.ndim  # Number of output dimensions (1 or 2)
+    out_dims = view.shape[1:spatial + 1]
+
+    # im2col: One row of C * <kernel dims> elements per output pixel, split by group
+    cols = view.astype(np.float64).reshape(-1, groups, weight[0].size)
+    weights = weight.astype(np.float64).reshape(groups, -1, weight[0].size)
+    if cols.size == 0 or weights.size == 0 \
+       or np.abs(cols).max() * np.abs(weights).max() * weight[0].size >= 2**53:
+        return convolve_reference(view, weight, groups)
+
+    output = np.matmul(cols.transpose(1, 0, 2), weights.transpose(0, 2, 1))  # (G, N*H*W, O/G)
+    output = output.transpose(1, 0, 2).reshape((view.shape[0], ) + out_dims + (-1, ))
+    return np.moveaxis(output.astype(np.int64), -1, 1)
+
+
+ENGINES = {
+    'reference': convolve_reference,
+    'gemm': convolve_gemm,
+}
+
+
 def conv2d(
         data,
         weight,
@@ -76,24 +139,26 @@ def conv2d(
     """
     Compute a 2D convolution.
 
-    Note that all PyTorch numbers are ordered (C, H, W)
+    Note that all PyTorch numbers are ordered (C, H, W). `data` may have additional leading
+    (batch) dimensions, in which case all samples are convolved in a single operation.
     """
-    assert data.shape == tuple(input_size)
-    in_channels = input_size[0]
-    out_channels = output_size[0]
+    assert data.shape[-3:] == tuple(input_size)
+    batch_shape = data.shape[:-3]
+    data = data.reshape((-1, ) + tuple(input_size))
 
     # Stretch data for fractionally-strided convolution
     if fractional_stride[0] > 1 or fractional_stride[1] > 1:
         ndata = np.zeros((data.shape[0],
-                          data.shape[1] * fractional_stride[0] - 1,
-                          data.shape[2] * fractional_stride[1] - 1),
+                          data.shape[1],
+                          data.shape[2] * fractional_stride[0] - 1,
+                          data.shape[3] * fractional_stride[1] - 1),
                          dtype=data.dtype)
-        ndata[:, 0::fractional_stride[0], 0::fractional_stride[1]] = data
+        ndata[:, :, 0::fractional_stride[0], 0::fractional_stride[1]] = data
         data = ndata
 
     # Create zero padding around data
     if pad[0] or pad[1] or output_pad[0] or output_pad[1]:
-        data = np.pad(data, pad_width=((0, 0),
+        data = np.pad(data, pad_width=((0, 0), (0, 0),
                                        (pad[0], pad[0] + output_pad[0]),
                                        (pad[1], pad[1] + output_pad[1])),
                       mode='constant', constant_values=0)
@@ -107,32 +172,25 @@ def conv2d(
         nweight[:, :, 0::dilation[0], 0::dilation[1]] = weight
         weight = nweight
 
-    h = (data.shape[1] - weight.shape[3]) // stride[0] + 1  # Resulting output height
-    w = (data.shape[2] - weight.shape[2]) // stride[1] + 1  # Resulting output width
+    h = (data.shape[2] - weight.shape[2]) // stride[0] + 1  # Resulting output height
+    w = (data.shape[3] - weight.shape[3]) // stride[1] + 1  # Resulting output width
 
     view = as_strided(data,
-                      shape=(h, w, data.shape[0], weight.shape[2], weight.shape[3]),
-                      strides=((data.strides[1] * stride[0], data.strides[2] * stride[1],
-                                data.strides[0], data.strides[1], data.strides[2])),
+                      shape=(data.shape[0], h, w, data.shape[1], weight.shape[2], weight.shape[3]),
+                      strides=((data.strides[0],
+                                data.strides[2] * stride[0], data.strides[3] * stride[1],
+                                data.strides[1], data.strides[2], data.strides[3])),
                       writeable=False)
 
-    if groups > 1:
-        nweight = np.zeros((weight.shape[0], in_channels, weight.shape[2], weight.shape[3]),
-                           dtype=weight.dtype)
-        for i in range(weight.shape[0]):
-            for j in range(in_channels // groups):
-                nweight[i, i * (in_channels // groups) + j, :, :] = weight[i, j, :, :]
-        weight = nweight
-
-    output = np.tensordot(view, weight, axes=((2, 3, 4), (1, 2, 3))).transpose(2, 0, 1)
+    output = ENGINES[state.sim_engine](view, weight, groups)
 
     # Apply bias
     if bias is not None:
-        for k in range(out_channels):
-            output[k] += bias[k]
+        output += np.asarray(bias).reshape(-1, 1, 1)
 
-    assert output.shape == tuple(output_size), \
-        f'Shape mismatch: NumPy result {output.shape} vs expected {output_size}'
+    output = output.reshape(batch_shape + output.shape[1:])
+    assert output.shape[-3:] == tuple(output_size), \
+        f'Shape mismatch: NumPy result {output.shape[-3:]} vs expected {output_size}'
 
     return output
 
@@ -191,28 +249,28 @@ def conv1d(
     """
     Compute a 1D convolution.
 
-    Note that all PyTorch numbers are ordered (C, L)
+    Note that all PyTorch numbers are ordered (C, L). `data` may have additional leading
+    (batch) dimensions, in which case all samples are convolved in a single operation.
     """
-    assert data.shape == tuple(input_size)
-    in_channels = input_size[0]
+    assert data.shape[-len(input_size):] == tuple(input_size)
+    batch_shape = data.shape[:-len(input_size)]
     out_channels = output_size[0]
 
     weight = weight.reshape(out_channels, input_size[0] // groups, -1)
-    data = data.reshape(input_size[0], -1)
-
-    output = np.empty(shape=(output_size[0], output_size[1]), dtype=np.int64)
+    data = data.reshape(-1, input_size[0], int(np.prod(input_size[1:])))
 
     # Stretch data for fractionally-strided convolution
     if fractional_stride > 1:
         ndata = np.zeros((data.shape[0],
-                          data.shape[1] * fractional_stride - 1),
+                          data.shape[1],
+                          data.shape[2] * fractional_stride - 1),
                          dtype=data.dtype)
-        ndata[:, 0::fractional_stride] = data
+        ndata[:, :, 0::fractional_stride] = data
         data = ndata
 
     # Create zero padding around data
     if pad or output_pad:
-        data = np.pad(data, pad_width=((0, 0), (pad, pad + output_pad)),
+        data = np.pad(data, pad_width=((0, 0), (0, 0), (pad, pad + output_pad)),
                       mode='constant', constant_values=0)
 
     if dilation > 1:
@@ -223,31 +281,23 @@ def conv1d(
         nweight[:, :, 0::dilation] = weight
         weight = nweight
 
-    ll = (data.shape[1] - weight.shape[2]) // stride + 1  # Resulting output length
+    ll = (data.shape[2] - weight.shape[2]) // stride + 1  # Resulting output length
 
     view = as_strided(data,
-                      shape=(ll, data.shape[0], weight.shape[2]),
-                      strides=((data.strides[1] * stride,
-                                data.strides[0], data.strides[1])),
+                      shape=(data.shape[0], ll, data.shape[1], weight.shape[2]),
+                      strides=((data.strides[0], data.strides[2] * stride,
+                                data.strides[1], data.strides[2])),
                       writeable=False)
 
-    if groups > 1:
-        nweight = np.zeros((weight.shape[0], in_channels, weight.shape[2]),
-                           dtype=weight.dtype)
-        for i in range(weight.shape[0]):
-            for j in range(in_channels // groups):
-                nweight[i, i * (in_channels // groups) + j, :] = weight[i, j, :]
-        weight = nweight
-
-    output = np.tensordot(view, weight, axes=((1, 2), (1, 2))).transpose(1, 0)
+    output = ENGINES[state.sim_engine](view, weight, groups)
 
     # Apply bias
     if bias is not None:
-        for k in range(out_channels):
-            output[k] += bias[k]
+        output += np.asarray(bias).reshape(-1, 1)
 
-    assert output.shape == tuple(output_size[:2]), \
-        f'Shape mismatch: NumPy result {output.shape} vs expected {tuple(output_size[:2])}.'
+    output = output.reshape(batch_shape + output.shape[1:])
+    assert output.shape[-2:] == tuple(output_size[:2]), \
+        f'Shape mismatch: NumPy result {output.shape[-2:]} vs expected {tuple(output_size[:2])}.'
 
     return output
 
@@ -297,29 +347,98 @@ def linear(
     """
     Compute a fully connected layer.
     """
-    output = np.empty(out_features, dtype=np.int64)
-
-    for w in range(out_features):
-        val = np.int64(0)
-        for n in range(in_features):
-            val += data[n] * weight[w][n]
-            stats.account(
-                layer,
-                "true_sw_macc",
-                1,
-            )
-            debug_print(
-                f'w={w}, n={n}, weight={weight[w][n]}, data={data[n]} '
-                f'-> accumulator = {val} '
-            )
-        if bias is not None:
-            val += bias[w]
-            debug_print(f'+bias {bias[w]} --> output[{w}] = {val}')
-        output[w] = val
+    data = np.asarray(data, dtype=np.int64)[:in_features]
+    weight = np.asarray(weight, dtype=np.int64)[:out_features, :in_features]
+
+    output = weight @ data
+    stats.account(
+        layer,
+        "true_sw_macc",
+        in_features * out_features,
+    )
+
+    if state.debug_computation:
+        # Log the running accumulator for every multiply-accumulate
+        accumulator = np.cumsum(weight * data, axis=1)
+        for w in range(out_features):
+            for n in range(in_features):
+                debug_print(
+                    f'w={w}, n={n}, weight={weight[w][n]}, data={data[n]} '
+                    f'-> accumulator = {accumulator[w][n]} '
+                )
+            if bias is not None:
+                debug_print(f'+bias {bias[w]} --> output[{w}] = {output[w] + bias[w]}')
+
+    if bias is not None:
+        output += np.asarray(bias, dtype=np.int64)[:out_features]
 
     return output
 
 
+def pooling(
+        data,
+        output_size,
+        pool_size,
+        stride,
+        average,
+        dilation,
+        floor=True,
+) -> np.ndarray:
+    """
+    Strided-window pooling engine for 1D and 2D pooling (Average or Max).
+    The trailing `len(pool_size)` dimensions of `data` are pooled using windows of `pool_size`
+    with `stride` and `dilation`, resulting in the trailing dimensions of `output_size`. All
+    leading dimensions (channels, operands, samples) are pooled independently.
+    When `floor` is set, averages are truncated towards zero, otherwise they are rounded half
+    away from zero. Windows that extend beyond the data average only the valid elements.
+    """
+    dims = len(pool_size)
+    lead = data.shape[:-dims]
+    in_size = data.shape[-dims:]
+    out_size = tuple(output_size[-dims:])
+
+    # Input extent needed to compute all outputs
+    extent = [(o - 1) * s + (p - 1) * d + 1
+              for o, s, p, d in zip(out_size, stride, pool_size, dilation)]
+    count = None
+    if any(e > i for e, i in zip(extent, in_size)):
+        pad_width = [(0, max(0, e - i)) for e, i in zip(extent, in_size)]
+        if average:
+            count = np.pad(np.ones(in_size, dtype=np.int64), pad_width, mode='constant')
+        data = np.pad(data, [(0, 0)] * len(lead) + pad_width, mode='constant',
+                      constant_values=0 if average else np.iinfo(np.int64).min)
+
+    def window_view(a, leading):
+        """Return a read-only view of `a` with a window for each output position"""
+        strides = a.strides[-dims:]
+        return as_strided(
+            a,
+            shape=a.shape[:leading] + out_size + tuple(pool_size),
+            strides=a.strides[:leading] + tuple(st * s for st, s in zip(strides, stride))
+            + tuple(st * d for st, d in zip(strides, dilation)),
+            writeable=False,
+        )
+
+    axes = tuple(range(-dims, 0))
+    view = window_view(data, len(lead))
+
+    if not average:
+        return view.max(axis=axes)
+
+    total = view.sum(axis=axes, dtype=np.int64)
+    if count is None:
+        count = np.asarray(np.prod(pool_size), dtype=np.int64)
+    else:
+        count = window_view(count, 0).sum(axis=axes, dtype=np.int64)
+
+    if floor:
+        return np.sign(total) * (np.abs(total) // count)
+
+    avg = total / count
+    return np.where(avg < 0., np.ceil(avg - 0.5), np.floor(avg + 0.5)) \
+        .astype(np.int64).clip(min=-128, max=127)
+
+
 def pool2d(
         data,
         input_size,
@@ -361,33 +480,7 @@ def pool2d(
                     ref[c][row//stride[0]][col//stride[1]] = val
 
     # Fast computation using NumPy
-    data_pad = data[
-        :,
-        :(data.shape[1] - pool[0] + dilation[0] - 1) // stride[0] * stride[0] + pool[0],
-        :(data.shape[2] - pool[1] + dilation[1] - 1) // stride[1] * stride[1] + pool[1],
-        ...
-    ]
-    h, w = data_pad.strides[1:]
-
-    view = as_strided(data_pad,
-                      shape=(data_pad.shape[0],
-                             1 + (data_pad.shape[1] - pool[0] - dilation[0] + 1) // stride[0],
-                             1 + (data_pad.shape[2] - pool[1] - dilation[1] + 1) // stride[1],
-                             pool[0], pool[1]),
-                      strides=(data_pad.strides[0], stride[0] * h,
-                               stride[1] * w, h * dilation[0], w * dilation[1]),
-                      writeable=False)
-
-    if average:
-        if floor:
-            pooled = np.nanmean(view, dtype=np.int64, axis=(3, 4))
-        else:
-            pooled = np.mean(view, axis=(3, 4))
-            pooled = np.ceil(pooled - 0.5, where=pooled < 0., out=pooled)
-            pooled = np.floor(pooled + 0.5, where=pooled >= 0., out=pooled) \
-                .astype(np.int64).clip(min=-128, max=127)
-    else:
-        pooled = np.nanmax(view, axis=(3, 4))
+    pooled = pooling(data, output_size, pool, stride, average, dilation, floor=floor)
 
     if state.debug:
         match = (ref == pooled).all()
@@ -407,25 +500,45 @@ def pool1d(
         stride,
         average,
         dilation=1,
-        floor=True,  # pylint: disable=unused-argument
+        floor=True,
 ) -> ArrayLike:
     """
     Compute 1D Pooling (Average or Max)
     """
     assert data.shape == tuple(input_size)
 
-    pooled = np.empty(shape=output_size, dtype=np.int64)
-    for c in range(input_size[0]):
-        for x in range(0, output_size[1]*stride, stride):
-            if average:
-                avg = np.average(data[c][x:x+pool*dilation:dilation])
-                if avg < 0:
-                    val = np.ceil(avg).astype(np.int64).clip(min=-128, max=127)
+    if state.debug:
+        # Slow using pure Python
+        ref = np.empty(shape=output_size, dtype=np.int64)
+
+        for c in range(input_size[0]):
+            for x in range(0, output_size[1]*stride, stride):
+                if average:
+                    avg = np.average(data[c][x:x+pool*dilation:dilation])
+                    if floor:
+                        if avg < 0:
+                            val = np.ceil(avg).astype(np.int64).clip(min=-128, max=127)
+                        else:
+                            val = np.floor(avg).astype(np.int64).clip(min=-128, max=127)
+                    else:
+                        if avg < 0:
+                            val = np.ceil(avg - 0.5).astype(np.int64).clip(min=-128, max=127)
+                        else:
+                            val = np.floor(avg + 0.5).astype(np.int64).clip(min=-128, max=127)
                 else:
-                    val = np.floor(avg).astype(np.int64).clip(min=-128, max=127)
-            else:
-                val = np.amax(data[c][x:x+pool])
-            pooled[c][x//stride] = val
+                    val = np.amax(data[c][x:x+pool*dilation:dilation])
+                ref[c][x//stride] = val
+
+    # Fast computation using NumPy
+    pooled = pooling(data, output_size, (pool, ), (stride, ), average, (dilation, ),
+                     floor=floor)
+
+    if state.debug:
+        match = (ref == pooled).all()
+        if not match:
+            eprint('NumPy <-> Python mismatch in compute.pool1d')
+
+    assert pooled.shape == tuple(output_size), f'shape mismatch {pooled.shape} vs {output_size}'
 
     return pooled
 
@@ -1,12 +1,18 @@
 ###################################################################################################
-# Copyright (C) 2022 Maxim Integrated Products, Inc. All Rights Reserved.
+# Copyright (C) 2022-2024 Maxim Integrated Products, Inc. All Rights Reserved.
 #
 # Maxim Integrated Products, Inc. Default Copyright Notice:
 # https://www.maximintegrated.com/en/aboutus/legal/copyrights.html
 ###################################################################################################
 """
 Define memories.
+
+A memory map holds one int64 entry per 32-bit data memory word with the layer, channel, row and
+column that were stored there. Maps are NumPy arrays, or a `LayeredMap` that combines several
+maps without copying them. The functions ending in `_many` take arrays of offsets and values.
 """
+from typing import Optional, Tuple, Union
+
 import numpy as np
 
 from . import state
@@ -33,6 +39,85 @@ def idx(offs):
     return group * tc.dev.MEM_SIZE * tc.dev.P_NUMPRO // tc.dev.P_SHARED + (memoffs >> 2)
 
 
+class LayeredMap:
+    """
+    Combination of memory maps `maps` that does not copy the maps. A location is taken from the
+    first map that uses it, like `combine()`. Arrays of locations are looked up in the maps in
+    turn. The maps are copied into a single map when single locations are read (once), or when
+    the combination is written to.
+    """
+    def __init__(self, *maps):
+        self.maps = list(maps)
+        self.owned = False
+
+    def __getitem__(self, i):
+        if len(self.maps) == 1 or np.ndim(i) == 0:
+            return self.array()[i]
+        rv = np.array(_array(self.maps[0])[i], copy=True)
+        for m in self.maps[1:]:
+            mask = rv == _UNUSED
+            if not np.any(mask):
+                break
+            rv[mask] = m[np.asarray(i)[mask]]
+        return rv
+
+    def __len__(self):
+        return len(_array(self.maps[0]))
+
+    def combine(self, b):
+        """
+        Add map `b` below the maps in this combination.
+        """
+        self.maps.append(b)
+
+    def array(self) -> np.ndarray:
+        """
+        Return the combination as a single map (which must not be written to).
+        """
+        if len(self.maps) > 1:
+            arr = np.array(_array(self.maps[0]), copy=True)
+            for m in self.maps[1:]:
+                combine(arr, m)
+            self.maps = [arr]
+            self.owned = True
+        return _array(self.maps[0])
+
+    def writable(self) -> np.ndarray:
+        """
+        Return the combination as a single map that can be written to.
+        """
+        arr = self.array()
+        if not self.owned:
+            self.maps = [np.array(arr, copy=True)]
+            self.owned = True
+        return self.maps[0]
+
+
+MemoryMap = Union[np.ndarray, LayeredMap]
+
+
+def _array(arr) -> np.ndarray:
+    """
+    Return map `arr` as a single array.
+    """
+    return arr.array() if isinstance(arr, LayeredMap) else arr
+
+
+def _target(arr) -> np.ndarray:
+    """
+    Return the array that receives the stores to map `arr`.
+    """
+    return arr.writable() if isinstance(arr, LayeredMap) else arr
+
+
+def pack(ll, c, row, col):
+    """
+    Pack layer/channel/row/column (scalars or arrays) into int64 values, see `store()`.
+    """
+    return (np.asarray(ll, dtype=np.int64) << 48) | (np.asarray(c, dtype=np.int64) << 32) \
+        | (np.asarray(row, dtype=np.int64) << 16) | np.asarray(col, dtype=np.int64)
+
+
 def validate(arr, offs, val=None):
     """
     Check whether we're overwriting location `offs` in array `arr`.
@@ -65,7 +150,7 @@ def store(arr, offs, val, check_overwrite=False):
         validate(arr, offs, val)
     (ll, c, row, col) = val
     try:
-        arr[idx(offs)] = (ll << 48) | (c << 32) | (row << 16) | col
+        _target(arr)[idx(offs)] = (ll << 48) | (c << 32) | (row << 16) | col
     except IndexError:
         eprint(f'Data memory overflow in layer {layer_str(ll)} for '
                f'offset 0x{offs:08x}, c={c}, row={row}, col={col}.')
@@ -99,5 +184,110 @@ def combine(a, b):
     """
     Combine two memory maps `a` and `b`; use the first if it's used, else the second.
     """
+    if isinstance(a, LayeredMap):
+        a.combine(b)
+        return
+    b = _array(b)
     mask = a == _UNUSED
     a[mask] = b[mask]
+
+
+def layered(*maps) -> LayeredMap:
+    """
+    Return the combination of memory maps `maps` without copying them. The maps must not be
+    changed while the combination is in use.
+    """
+    return LayeredMap(*maps)
+
+
+def conflicts(
+        arr: MemoryMap,
+        offs: np.ndarray,
+        vals: Optional[np.ndarray] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Check which of the offsets `offs` are already used in map `arr`, or earlier in `offs` when
+    storing the packed values `vals`. Returns the positions in `offs` that would overwrite a
+    used location, and the packed values they would overwrite.
+    """
+    offs = np.asarray(offs, dtype=np.int64)
+    i = idx(offs)
+    prev = np.asarray(arr[i], dtype=np.int64)
+    if vals is not None and len(i) > 1:
+        # Within the batch, each store sees the previous store to the same location
+        order = np.argsort(i, kind='stable')
+        repeat = np.flatnonzero(i[order][1:] == i[order][:-1]) + 1
+        prev[order[repeat]] = np.broadcast_to(vals, i.shape)[order[repeat - 1]]
+    pos = np.flatnonzero(prev != _UNUSED)
+    return pos, prev[pos]
+
+
+def validate_many(
+        arr: MemoryMap,
+        offs: np.ndarray,
+        ll=None,
+        c=None,
+        row=None,
+        col=None,
+) -> np.ndarray:
+    """
+    Check whether any of the offsets `offs` overwrite used locations in array `arr` and report
+    each of them, like `validate()`. The layer/channel/row/column can be scalars or arrays.
+    Returns the positions in `offs` of all conflicts.
+    """
+    vals = pack(ll, c, row, col) if ll is not None else None
+    pos, prev = conflicts(arr, offs, vals)
+    if len(pos) > 0:
+        offs = np.broadcast_to(offs, np.shape(offs))
+        if vals is not None:
+            new = np.broadcast_to(vals, np.shape(offs))[pos]
+            nstrs = [layer_pfx(int(v >> 48)) + f'CHW={v >> 32 & 0xffff},{v >> 16 & 0xffff},'
+                     f'{v & 0xffff} - ' for v in new.tolist()]
+        else:
+            nstrs = [''] * len(pos)
+        for nstr, p, old in zip(nstrs, pos.tolist(), prev.tolist()):
+            eprint(f'{nstr}Overwriting location 0x{int(offs[p]):08x}, previously used by layer '
+                   f'{layer_str(old >> 48)}, CHW={old >> 32 & 0xffff},{old >> 16 & 0xffff},'
+                   f'{old & 0xffff}.',
+                   error=not state.no_error_stop)
+    return pos
+
+
+def store_many(
+        arr: MemoryMap,
+        offs: np.ndarray,
+        ll,
+        c,
+        row,
+        col,
+        check_overwrite: bool = False,
+) -> None:
+    """
+    Store layer/channel/row/column (scalars or arrays) at all offsets `offs`, like `store()`.
+    """
+    offs = np.asarray(offs, dtype=np.int64)
+    target = _target(arr)
+    i = idx(offs)
+    overflow = np.flatnonzero((i < 0) | (i >= len(target)))
+    if len(overflow) > 0:
+        p = overflow[0]
+        eprint(f'Data memory overflow in layer {layer_str(int(np.broadcast_to(ll, i.shape)[p]))} '
+               f'for offset 0x{int(offs[p]):08x}, c={int(np.broadcast_to(c, i.shape)[p])}, '
+               f'row={int(np.broadcast_to(row, i.shape)[p])}, '
+               f'col={int(np.broadcast_to(col, i.shape)[p])}.')
+        return
+    if check_overwrite:
+        validate_many(arr, offs, ll, c, row, col)
+    target[i] = pack(ll, c, row, col)
+
+
+def unpack_many(
+        arr: MemoryMap,
+        offs: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Unpack the entries at offsets `offs` in map `arr`. Returns a mask of the used offsets, and
+    arrays of the layer/channel/row/column (undefined where the mask is `False`).
+    """
+    val = np.asarray(arr[idx(np.asarray(offs, dtype=np.int64))], dtype=np.int64)
+    return val != _UNUSED, val >> 48, val >> 32 & 0xffff, val >> 16 & 0xffff, val & 0xffff
@@ -0,0 +1,75 @@
+###################################################################################################
+# Copyright (C) 2024 Maxim Integrated Products, Inc. All Rights Reserved.
+#
+# Maxim Integrated Products, Inc. Default Copyright Notice:
+# https://www.maximintegrated.com/en/aboutus/legal/copyrights.html
+###################################################################################################
+"""
+Buffered writer for the generated source files
+"""
+import io
+from typing import IO, Iterable, List
+
+# Number of characters collected before they are passed to the file
+CHUNK_SIZE = 1 << 20
+
+
+class Emitter(io.TextIOBase):
+    """
+    Text file wrapper for generated code. The generator emits code in many small pieces,
+    often a single register write or array element per call. These pieces are collected in
+    a list and passed to the underlying `file` in chunks of about `chunk_size` characters.
+    Closing the `Emitter` closes the underlying file.
+    """
+    def __init__(
+            self,
+            file: IO[str],
+            chunk_size: int = CHUNK_SIZE,
+    ):
+        super().__init__()
+        self.file = file
+        self.chunk_size = chunk_size
+        self.buffer: List[str] = []
+        self.size = 0
+
+    @property
+    def name(self):
+        """The name of the underlying file"""
+        return self.file.name
+
+    def writable(self):
+        return True
+
+    def write(self, s: str) -> int:
+        self.buffer.append(s)
+        self.size += len(s)
+        if self.size >= self.chunk_size:
+            self.flush()
+        return len(s)
+
+    def writelines(self, lines: Iterable[str]) -> None:  # type: ignore[override]
+        self.write(''.join(lines))
+
+    def flush(self):
+        if self.buffer:
+            self.file.write(''.join(self.buffer))
+            self.buffer.clear()
+            self.size = 0
+
+    def close(self):
+        if not self.closed:
+            try:
+                super().close()  # Flushes the buffer
+            finally:
+                self.file.close()
+
+
+def open_file(
+        filename: str,
+        mode: str = 'w',
+) -> Emitter:
+    """
+    Open the generated text file `filename` for writing (`mode` 'w' or 'a').
+    """
+    f = open(filename, mode=mode, encoding='utf-8')  # pylint: disable=consider-using-with
+    return Emitter(f)
@@ -16,18 +16,25 @@ import numpy as np
 
 import rich.console
 
-from . import checkpoint, commandline, console, onnxcp, op, rtlsim, sampledata, sampleweight, state
+from . import (IMPORT_START, checkpoint, commandline, console, latency, op, rtlsim, sampledata,
+               sampleweight, state)
 from . import tornadocnn as tc
 from . import versioncheck, yamlcfg
 from .eprint import eprint, nprint, wprint
 from .names import layer_pfx, layer_str
-from .utils import plural
+from .utils import import_times, plural, timed_import
 
 
-def main():
+def main(argv=None):
     """
-    Command line wrapper
+    Command line wrapper. Use the arguments in `argv` instead of the command line if given.
     """
+    if any(arg == '--batch' or arg.startswith('--batch=')
+           for arg in (argv if argv is not None else sys.argv[1:])):
+        from . import jobs  # pylint: disable=import-outside-toplevel,cyclic-import
+        sys.exit(jobs.main(argv))
+
+    start = time.perf_counter()
     np.set_printoptions(threshold=sys.maxsize, linewidth=190)
 
     # Save stdout before colorama potentially wraps it
@@ -35,7 +42,7 @@ def main():
     saved_stdout = sys.stdout
     console.stderr = rich.console.Console(stderr=True)
 
-    args = commandline.get_parser()
+    args = commandline.get_parser(argv)
 
     # Check whether code is up-to-date
     if not args.no_version_check:
@@ -81,6 +88,7 @@ def main():
         fext = args.checkpoint_file.rsplit(sep='.', maxsplit=1)[1].lower()
         if fext == 'onnx':
             # ONNX file selected
+            onnxcp = timed_import('izer.onnxcp')
             layers, weights, bias, output_shift, \
                 input_channels, output_channels = \
                 onnxcp.load(
@@ -191,6 +199,10 @@ def main():
     if data.ndim < 3:
         data = np.expand_dims(data, axis=2)
 
+    sample_batch = None
+    if args.sample_batch is not None:
+        sample_batch = sampledata.get_batch(args.sample_batch, data.shape)
+
     if params['data_buffer_cfg'] is not None:
         data_buffer_dims = params['data_buffer_cfg'][0]['dim']
         data_buffer = np.zeros(data_buffer_dims, dtype=np.int64)
@@ -392,11 +404,17 @@ def main():
     if args.input_csv_format == 555:
         assert input_size[0] == 3
         data = data & ~0x7
+        if sample_batch is not None:
+            sample_batch = sample_batch & ~0x7
     elif args.input_csv_format == 565:
         assert input_size[0] == 3
         data[0] = data[0] & ~0x7
         data[1] = data[1] & ~0x3
         data[2] = data[2] & ~0x7
+        if sample_batch is not None:
+            sample_batch[:, 0] = sample_batch[:, 0] & ~0x7
+            sample_batch[:, 1] = sample_batch[:, 1] & ~0x3
+            sample_batch[:, 2] = sample_batch[:, 2] & ~0x7
 
     # Trace output sizes of the network
     auto_input_dim = [None] * layers
@@ -669,6 +687,7 @@ def main():
     state.processor_map = processor_map
     state.quantization = quantization
     state.read_ahead = readahead
+    state.sample_batch = sample_batch
     state.simulated_sequence = simulated_sequence
     state.snoop = cfg['snoop'] if 'snoop' in cfg else None
     state.snoop_sequence = snoop_sequence
@@ -693,6 +712,42 @@ def main():
     if state.fast_fifo:
         state.fifo = True
 
+    if args.latency_only:
+        if not tc.dev.SUPPORT_LATENCY_CALC:
+            eprint('Latency estimates are not supported on this device.')
+        sequence = []
+        ll = args.start_layer
+        while ll < layers:
+            sequence.append(ll)
+            ll = simulated_sequence[ll] if simulated_sequence[ll] is not None \
+                else next_sequence[ll]
+            if ll == -1:
+                break
+        estimate = latency.network(
+            input_chan=input_channels,
+            pooled_dim=pooled_dim,
+            output_chan=output_channels,
+            output_dim=output_dim,
+            kernel_size=kernel_size,
+            padding=padding,
+            pool=pool,
+            stride=stride,
+            operator=operator,
+            operands=operands,
+            pool_first=pool_first,
+            flatten=flatten,
+            streaming=streaming,
+            processor_map=processor_map,
+            output_processor_map=output_processor_map,
+            output_width=output_width,
+            layers=sequence,
+        )
+        print(latency.report(estimate, [layer_str(ll) for ll in sequence]), end='')
+        sys.stdout = saved_stdout
+        if args.profile_startup:
+            print(startup_report(start))
+        return
+
     # Instantiate backend
     module = locate('izer.backend.' + tc.dev.backend)
     assert module is not None
@@ -710,3 +765,22 @@ def main():
 
     # Restore stdout in case we're wrapped in cProfile
     sys.stdout = saved_stdout
+
+    if args.profile_startup:
+        print(startup_report(start))
+
+
+def startup_report(
+        start: float,
+) -> str:
+    """
+    Return a report of the time spent importing modules, where `start` is the start of `main()`.
+    """
+    end = time.perf_counter()
+    rv = '\nStartup profile:\n'
+    rv += f'  {"Module imports":<30}{start - IMPORT_START:8.3f}s\n'
+    for name, seconds in import_times.items():
+        rv += f'  {"Deferred import " + name:<30}{seconds:8.3f}s\n'
+    rv += f'  {"Total run time":<30}{end - IMPORT_START:8.3f}s\n'
+    rv += '(Use `python -X importtime` for details on the module imports.)'
+    return rv
@@ -0,0 +1,195 @@
+###################################################################################################
+# Copyright (C) 2024 Maxim Integrated Products, Inc. All Rights Reserved.
+#
+# Maxim Integrated Products, Inc. Default Copyright Notice:
+# https://www.maximintegrated.com/en/aboutus/legal/copyrights.html
+###################################################################################################
+"""
+Batch mode: Run many network generations from a YAML job file in a pool of worker processes.
+"""
+import copy
+import io
+import os
+import shlex
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import yaml
+
+from . import commandline, console, state, stats
+from . import tornadocnn as tc
+from .eprint import eprint
+from .izer import main as generate
+
+
+class Job(NamedTuple):
+    """A single network generation"""
+    name: str
+    args: List[str]
+
+
+class Result(NamedTuple):
+    """Outcome of a `Job`"""
+    name: str
+    returncode: int
+    seconds: float
+    stdout: str
+    stderr: str
+
+
+def load(
+        filename: str,
+        extra_args: Optional[List[str]] = None,
+) -> List[Job]:
+    """
+    Load the job file `filename`. The file contains an optional `common` entry with arguments
+    for all jobs, and a `jobs` list. Each job is either a string of command line arguments, or
+    a dictionary with `args` and an optional `name` (the default name is the `--prefix`).
+    `extra_args` are appended to the arguments of every job.
+    """
+    def split(args) -> List[str]:
+        if args is None:
+            return []
+        if isinstance(args, str):
+            return shlex.split(args)
+        return [str(e) for e in args]
+
+    with open(filename, mode='r', encoding='utf-8') as f:
+        cfg = yaml.safe_load(f)
+
+    if not isinstance(cfg, dict) or not isinstance(cfg.get('jobs'), list):
+        eprint(f'Batch file `{filename}` must contain a `jobs` list.')
+
+    common = split(cfg.get('common'))
+    jobs: List[Job] = []
+    for i, entry in enumerate(cfg['jobs']):
+        name = None
+        if isinstance(entry, dict):
+            name = entry.get('name')
+            entry = entry.get('args')
+        args = split(entry) + common + (extra_args or [])
+        if not args:
+            eprint(f'Batch file `{filename}`: Job {i} has no arguments.')
+        if '--batch' in args:
+            eprint(f'Batch file `{filename}`: Job {i} cannot use `--batch`.')
+        if name is None:
+            name = args[args.index('--prefix') + 1] \
+                if '--prefix' in args[:-1] else f'job{i}'
+        jobs.append(Job(str(name), args))
+
+    return jobs
+
+
+# Pristine copies of the global state, captured when a worker starts
+_defaults: Dict[str, Any] = {}
+
+
+def _save_defaults() -> None:
+    """
+    Save the initial values of the global state (worker process initializer).
+    """
+    _defaults['state'] = {name: copy.deepcopy(getattr(state, name))
+                          for name in vars(state)['__annotations__']}
+    _defaults['statsdict'] = copy.deepcopy(stats.statsdict)
+    _defaults['resourcedict'] = copy.deepcopy(stats.resourcedict)
+
+
+def _restore_defaults() -> None:
+    """
+    Reset the global state so that a job cannot see any leftovers from the previous job.
+    """
+    for name, value in _defaults['state'].items():
+        setattr(state, name, copy.deepcopy(value))
+    stats.statsdict.clear()
+    stats.statsdict.update(copy.deepcopy(_defaults['statsdict']))
+    stats.resourcedict.clear()
+    stats.resourcedict.update(copy.deepcopy(_defaults['resourcedict']))
+    tc.dev = None
+    console.stderr = None
+
+
+def _run(
+        job: Job,
+) -> Result:
+    """
+    Run a single `job` in a worker process, capturing its output.
+    """
+    _restore_defaults()
+
+    saved_stdout, saved_stderr = sys.stdout, sys.stderr
+    out, err = io.StringIO(), io.StringIO()
+    sys.stdout, sys.stderr = out, err
+    returncode = 0
+    start = time.monotonic()
+    try:
+        generate(job.args)
+    except SystemExit as exc:
+        returncode = int(exc.code) if isinstance(exc.code, int) else 1 if exc.code else 0
+    except Exception:  # pylint: disable=broad-except
+        traceback.print_exc()
+        returncode = 1
+    finally:
+        seconds = time.monotonic() - start
+        # The generator may have redirected stdout to a log file
+        if sys.stdout not in (out, saved_stdout):
+            sys.stdout.close()
+        sys.stdout, sys.stderr = saved_stdout, saved_stderr
+
+    return Result(job.name, returncode, seconds, out.getvalue(), err.getvalue())
+
+
+def run(
+        jobs: List[Job],
+        workers: Optional[int] = None,
+) -> List[Result]:
+    """
+    Run `jobs` on `workers` processes (default: one per CPU) and print the output of each job
+    in order as soon as it is available. Every worker imports the generator once, and resets
+    the global state before each job.
+    """
+    results: List[Result] = []
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count(),
+                             initializer=_save_defaults) as executor:
+        for result in executor.map(_run, jobs):
+            sys.stdout.write(result.stdout)
+            sys.stderr.write(result.stderr)
+            results.append(result)
+
+    return results
+
+
+def summary(
+        results: List[Result],
+        seconds: float,
+) -> str:
+    """
+    Return a table of the per-job wall time and status.
+    """
+    width = max([len(r.name) for r in results] + [3])
+    rv = f'\n{"Job":<{width}}  Status  Time\n'
+    for r in results:
+        status = 'OK' if r.returncode == 0 else f'rc={r.returncode}'
+        rv += f'{r.name:<{width}}  {status:<6}  {r.seconds:7.1f}s\n'
+    failed = sum(r.returncode != 0 for r in results)
+    rv += f'{len(results)} jobs, {failed} failed, {seconds:.1f}s elapsed ' \
+          f'({sum(r.seconds for r in results):.1f}s job time)\n'
+    return rv
+
+
+def main(
+        argv: Optional[List[str]] = None,
+) -> int:
+    """
+    Batch mode command line wrapper. Returns the process exit code.
+    """
+    args, extra_args = commandline.get_batch_parser(argv)
+    jobs = load(args.batch, extra_args)
+
+    start = time.monotonic()
+    results = run(jobs, args.batch_workers)
+    print(summary(results, time.monotonic() - start), end='')
+
+    return 0 if all(r.returncode == 0 for r in results) else 1
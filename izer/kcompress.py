@@ -0,0 +1,131 @@
+###################################################################################################
+# Copyright (C) 2024 Maxim Integrated Products, Inc. All Rights Reserved.
+#
+# Maxim Integrated Products, Inc. Default Copyright Notice:
+# https://www.maximintegrated.com/en/aboutus/legal/copyrights.html
+###################################################################################################
+"""
+Compressed kernel streams for the kernel loader
+
+The stream is a byte array. Each chunk of consecutive kernels starts with the 32-bit (big
+endian) start address, followed by tokens:
+  0x00              end of chunk
+  0x01-0x7f         run of 1-127 literal kernels, the 9 bytes of each kernel follow
+  0x80-0xbf         run of 1-64 zero kernels
+  0xc0-0xff, 1 byte kernel from the dictionary, 14-bit index (high bits in the token byte)
+An address of 0 ends the stream. The dictionary holds the 9 bytes of each kernel that occurs
+more than once.
+"""
+from typing import List, NamedTuple, Tuple
+
+import numpy as np
+
+from .eprint import nprint
+
+END = 0x00
+LITERAL_MAX = 0x7f
+ZERO = 0x80
+ZERO_MAX = 0x40
+DICTIONARY = 0xc0
+DICTIONARY_MAX = 0x4000
+
+# Approximate Arm Cortex-M4 cycles for the generated loaders, used for the load time estimate
+CYCLES_WORD = 5  # Uncompressed: Load a word from flash, write it to kernel memory, loop
+CYCLES_BYTE = 4  # Compressed: Load a byte and shift it into the output word
+CYCLES_TOKEN = 12  # Compressed: Decode a token and call the kernel writer
+
+
+class Stats(NamedTuple):
+    """Statistics for a compressed kernel stream"""
+    kernels: int
+    literal: int
+    zero: int
+    dictionary: int
+    entries: int
+    tokens: int
+    size: int
+
+
+def compress(
+        addresses: List[int],
+        chunks: List[np.ndarray],
+) -> Tuple[np.ndarray, np.ndarray, Stats]:
+    """
+    Compress the chunks of kernels `chunks` (arrays of 9 bytes per kernel) that start at
+    `addresses`. Returns the stream, the dictionary and the statistics.
+    """
+    if len(chunks) > 0:
+        kernels = np.concatenate(chunks)
+    else:
+        kernels = np.zeros((0, 9), dtype=np.uint8)
+
+    # Dictionary: The most frequent non-zero kernels that are used more than once
+    unique, inverse, counts = np.unique(kernels, axis=0, return_inverse=True,
+                                        return_counts=True)
+    candidates = np.flatnonzero((counts > 1) & unique.any(axis=1))
+    candidates = candidates[np.argsort(-counts[candidates], kind='stable')][:DICTIONARY_MAX]
+    entry = np.full(len(unique), -1, dtype=np.int64)
+    entry[candidates] = np.arange(len(candidates))
+    # For each kernel: -2 for zero, the dictionary index, or -1 for a literal
+    kind = np.where(kernels.any(axis=1), entry[inverse.reshape(-1)], -2).tolist()
+
+    stream = bytearray()
+    literal = zero = dictionary = tokens = 0
+    start = 0
+    for addr, chunk in zip(addresses, chunks):
+        stream += addr.to_bytes(4, byteorder='big')
+        end = start + len(chunk)
+        i = start
+        while i < end:
+            k = kind[i]
+            j = i + 1
+            if k == -2:
+                while j < end and j - i < ZERO_MAX and kind[j] == -2:
+                    j += 1
+                stream.append(ZERO + j - i - 1)
+                zero += j - i
+            elif k >= 0:
+                stream += (DICTIONARY << 8 | k).to_bytes(2, byteorder='big')
+                dictionary += 1
+            else:
+                while j < end and j - i < LITERAL_MAX and kind[j] == -1:
+                    j += 1
+                stream.append(j - i)
+                stream += kernels[i:j].tobytes()
+                literal += j - i
+            tokens += 1
+            i = j
+        stream.append(END)
+        start = end
+    stream += bytes(4)  # EOF
+
+    stream_array = np.frombuffer(stream, dtype=np.uint8)
+    dictionary_array = unique[candidates].ravel()
+    return stream_array, dictionary_array, Stats(
+        kernels=len(kernels),
+        literal=literal,
+        zero=zero,
+        dictionary=dictionary,
+        entries=len(candidates),
+        tokens=tokens,
+        size=len(stream_array) + len(dictionary_array),
+    )
+
+
+def report(
+        stats: Stats,
+        words: int,
+        writes: int,
+) -> None:
+    """
+    Print the flash size and the estimated load cycles of the compressed kernel stream
+    `stats`, compared to the uncompressed stream of `words` 32-bit words. `writes` is the
+    number of kernel memory writes, which is the same for both.
+    """
+    cycles = CYCLES_WORD * words
+    compressed_cycles = CYCLES_BYTE * 9 * stats.kernels + CYCLES_TOKEN * stats.tokens
+    nprint(f'Kernel compression: {stats.size:,} bytes instead of {words * 4:,} bytes '
+           f'({100.0 * stats.size / max(words * 4, 1):.1f}%) for {stats.kernels:,} kernels '
+           f'({stats.literal:,} literal, {stats.zero:,} zero, {stats.dictionary:,} from a '
+           f'dictionary of {stats.entries:,}). Estimated load time: {compressed_cycles:,} '
+           f'instead of {cycles:,} cycles for {writes:,} kernel memory writes.')
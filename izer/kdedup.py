@@ -9,7 +9,7 @@ Deduplicate kernel values
 """
 import operator as opr
 from functools import reduce
-from typing import List, Optional, Tuple
+from typing import Dict, List, NamedTuple, Optional, Tuple
 
 import numpy as np
 
@@ -34,6 +34,7 @@ def deduplicate(
     weights_out: List[Optional[np.ndarray]] = []
     weight_hash: List[Optional[int]] = []
     weight_ptrs: List[Optional[int]] = []
+    hash_idx: Dict[int, List[int]] = {}  # Indices of the weights with a given hash
     h3 = xxhash.xxh3_128()
     n: int = 0
     saved_weight_bytes: int = 0
@@ -57,25 +58,24 @@ def deduplicate(
 
         duplicate: bool = False
         duplicate_idx: Optional[int] = None
-        if w_hash in weight_hash:  # OK to use slow operator (max array length is 128)
-            # Check for collisions (hash matches, but other properties don't)
-            for i, wh in enumerate(weight_hash):
-                if wh == w_hash:
-                    weights_out_i = weights_out[i]
-                    assert weights_out_i is not None
-                    weight_ptrs_i = weight_ptrs[i]
-                    assert weight_ptrs_i is not None
-                    if w.shape == weights_in[weight_ptrs_i].shape \
-                       and (quantization[ll] == quantization[weight_ptrs_i]
-                            and processor_map[ll] == processor_map[weight_ptrs_i]
-                            or kind == 'bias') \
-                       and np.array_equal(weights_out_i, w):
-                        duplicate_idx = i
-                        duplicate = True
-                        break
+        # Check for collisions (hash matches, but other properties don't)
+        for i in hash_idx.get(w_hash, []):
+            weights_out_i = weights_out[i]
+            assert weights_out_i is not None
+            weight_ptrs_i = weight_ptrs[i]
+            assert weight_ptrs_i is not None
+            if w.shape == weights_in[weight_ptrs_i].shape \
+               and (quantization[ll] == quantization[weight_ptrs_i]
+                    and processor_map[ll] == processor_map[weight_ptrs_i]
+                    or kind == 'bias') \
+               and np.array_equal(weights_out_i, w):
+                duplicate_idx = i
+                duplicate = True
+                break
 
         i = len(weights_out)
         if not duplicate:
+            hash_idx.setdefault(w_hash, []).append(i)
             weight_hash.append(w_hash)
             weight_ptrs.append(i)
             weights_out.append(w)
@@ -91,3 +91,58 @@ def deduplicate(
                f'for {n} {plural(n, "layer")} ({saved_weight_bytes:,} bytes)')
 
     return weight_ptrs, weights_out
+
+
+class KernelStats(NamedTuple):
+    """Counts of individual kernels and their duplicates"""
+    kernels: int
+    unique: int
+    zero: int
+    duplicate_bytes: int
+    zero_bytes: int
+
+
+def analyze_kernels(
+        weights: List[Optional[np.ndarray]],
+        layers: int,
+        quantization: List[int],
+        kernel_size: List[List[int]],
+) -> KernelStats:
+    """
+    Find the duplicates among the individual kernels (for example, 3x3) of all layers and
+    processors in `weights`, after layer level deduplication. Kernels are compared when they
+    have the same size and quantization. 1x1 kernels are single weights and are not counted.
+    The hardware addresses the kernels of a layer using a single offset for all processors,
+    so individual kernels cannot share kernel memory; the report shows the potential savings.
+    """
+    kernels: Dict[Tuple[int, int], List[np.ndarray]] = {}
+    for ll, w in enumerate(weights[:layers]):
+        if w is None:
+            continue
+        size = kernel_size[ll][0] * kernel_size[ll][1]
+        if size == 1 or w.size % size != 0:
+            continue
+        kernels.setdefault((abs(quantization[ll]), size), []).append(w.reshape(-1, size))
+
+    total = unique = zero = duplicate_bytes = zero_bytes = 0
+    for (bits, size), layer_kernels in kernels.items():
+        k = np.ascontiguousarray(np.concatenate(layer_kernels))
+        # Compare each kernel as a single value
+        rows = k.view(np.dtype((np.void, k.dtype.itemsize * size))).ravel()
+        values, first, counts = np.unique(rows, return_index=True, return_counts=True)
+        is_zero = ~k[first].any(axis=1)
+        kernel_bytes = size * bits / 8
+        total += len(rows)
+        unique += len(values)
+        zero += int(counts[is_zero].sum())
+        duplicate_bytes += int((len(rows) - len(values)) * kernel_bytes)
+        zero_bytes += int(counts[is_zero].sum() * kernel_bytes)
+
+    if state.verbose and total > 0:
+        nprint(f'Kernel level deduplication: {unique:,} of {total:,} {plural(total, "kernel")} '
+               f'are unique, {total - unique:,} duplicate {plural(total - unique, "kernel")} '
+               f'({duplicate_bytes:,} bytes); {zero:,} zero {plural(zero, "kernel")} '
+               f'({zero_bytes:,} bytes)')
+
+    return KernelStats(kernels=total, unique=unique, zero=zero,
+                       duplicate_bytes=duplicate_bytes, zero_bytes=zero_bytes)
@@ -7,12 +7,14 @@
 """
 Kernel related functions
 """
+import functools
 import sys
-from typing import Optional
+import time
+from typing import Callable, List, Optional, Tuple
 
 import numpy as np
 
-from . import console, op, rv, state
+from . import console, kcompress, op, rv, state
 from . import tornadocnn as tc
 from .eprint import eprint, eprint_noprefix, wprint
 from .names import layer_pfx
@@ -49,7 +51,295 @@ def print_map(
     print_fn('-' * tc.dev.MASK_WIDTH_LARGE * width)
 
 
-def load(  # pylint: disable=too-many-branches,too-many-statements
+def utilization(
+        kmap: np.ndarray,
+) -> List[Tuple[int, int, int, int]]:
+    """
+    Return a list of (used kernels, size, free blocks, largest free block) for every processor in
+    kernel map `kmap`.
+    """
+    assert tc.dev is not None
+    stats = []
+    for p in range(tc.dev.MAX_PROC):
+        free = np.concatenate(([False], kmap[p][:tc.dev.mask_width(p)] == _INVALID_VALUE,
+                               [False]))
+        edges = np.flatnonzero(np.diff(free))  # Start and end of each free block
+        blocks = edges[1::2] - edges[::2]
+        stats.append((tc.dev.mask_width(p) - int(blocks.sum()), tc.dev.mask_width(p),
+                      len(blocks), int(blocks.max()) if len(blocks) > 0 else 0))
+    return stats
+
+
+def print_utilization(
+        kmap: np.ndarray,
+        print_fn=print,
+) -> None:
+    """
+    Print the utilization and fragmentation of kernel memory for every processor in kernel map
+    `kmap`. Fragmentation is the part of the free memory that is not in the largest free block.
+    """
+    def fragmentation(size, largest):
+        return 100.0 * (1.0 - largest / size) if size > 0 else 0.0
+
+    print_fn('\nKernel memory utilization:')
+    print_fn('Proc   Used   Size   Util  Free blocks  Largest free  Fragmentation')
+    total_used = total_size = total_blocks = 0
+    for p, (used, size, blocks, largest) in enumerate(utilization(kmap)):
+        print_fn(f'{p:4} {used:6} {size:6} {100.0 * used / size:5.1f}% {blocks:12} {largest:13}'
+                 f' {fragmentation(size - used, largest):13.1f}%')
+        total_used += used
+        total_size += size
+        total_blocks += blocks
+    print_fn(f'Total: {total_used} of {total_size} kernels used '
+             f'({100.0 * total_used / total_size:.1f}%), {total_blocks} free blocks')
+
+
+def plan_kernel_order(
+        order: List[int],
+        place: Callable[[int, np.ndarray], int],
+        footprint: Callable[[int], Tuple[int, int]],
+        time_budget: float,
+        seed: int = 0,
+) -> Tuple[List[int], int, int]:
+    """
+    Plan the order in which the greedy allocator places the kernels of the layers in `order`.
+    `place(ll, kmap)` returns the offset for layer `ll` in kernel map `kmap` (or -1 when the
+    layer does not fit), and `footprint(ll)` returns the processor map and the kernel length.
+
+    When all layers fit in the given order, that order is returned unchanged. Otherwise, orders
+    sorted by decreasing size are simulated, and the one that places the most layers with the
+    fewest free blocks wins. When layers still do not fit, layers are moved randomly
+    (reproducible for `seed`) until all fit or `time_budget` seconds have passed.
+    Return the best order, the number of layers that do not fit, and the number of orders tried.
+    """
+    def simulate(order):
+        kmap = np.full((tc.dev.MAX_PROC, tc.dev.MASK_WIDTH_LARGE),
+                       fill_value=_INVALID_VALUE, dtype=np.int64)
+        unplaced = 0
+        for ll in order:
+            offs = place(ll, kmap)
+            if offs < 0:
+                unplaced += 1
+                continue
+            proc_map, length = footprint(ll)
+            for p in range(tc.dev.MAX_PROC):
+                if (proc_map >> p) & 1:
+                    kmap[p][offs:offs + length] = ll
+        return unplaced, sum(blocks for _, _, blocks, _ in utilization(kmap))
+
+    def area(ll):
+        proc_map, length = footprint(ll)
+        return popcount(proc_map) * length
+
+    candidates = [
+        list(order),
+        sorted(order, key=lambda ll: -area(ll)),
+        sorted(order, key=lambda ll: -footprint(ll)[1]),
+        sorted(order, key=lambda ll: (-popcount(footprint(ll)[0]), -footprint(ll)[1])),
+    ]
+    best_order = candidates[0]
+    best = simulate(best_order)
+    tried = 1
+    if best[0] == 0:
+        return best_order, 0, tried
+    for i, candidate in enumerate(candidates[1:], start=1):
+        if candidate in candidates[:i]:
+            continue
+        score = simulate(candidate)
+        tried += 1
+        if score < best:
+            best_order, best = candidate, score
+
+    rng = np.random.default_rng(seed)
+    start = time.perf_counter()
+    while best[0] > 0 and len(order) > 1 and time.perf_counter() - start < time_budget:
+        # Move a random layer to a random position
+        candidate = list(best_order)
+        i, j = rng.choice(len(candidate), size=2, replace=False)
+        candidate.insert(int(i), candidate.pop(int(j)))
+        score = simulate(candidate)
+        tried += 1
+        if score <= best:
+            best_order, best = candidate, score
+
+    return best_order, best[0], tried
+
+
+def scan_kernel_mem(
+        kernel_map: np.ndarray,
+        p: int,
+        offs: int,
+        length: int,
+        reverse: bool = False,
+) -> Optional[int]:
+    """
+    Return the first used column for processor `p` when looking at `length` columns of
+    `kernel_map` starting at `offs` (towards lower columns when `reverse`), or None when all
+    columns are free. The columns are checked one by one.
+    """
+    step = -1 if reverse else 1
+    for i in range(offs, offs + step * length, step):
+        if kernel_map[p][i] != _INVALID_VALUE:
+            return i
+    return None
+
+
+def first_used(
+        kernel_map: np.ndarray,
+        p: int,
+        offs: int,
+        length: int,
+        reverse: bool = False,
+) -> Optional[int]:
+    """
+    Same as `scan_kernel_mem()`, checking all columns of the window at once.
+    """
+    if not reverse:
+        if 0 <= offs and offs + length <= kernel_map.shape[1] and length > 0:
+            used = kernel_map[p, offs:offs + length] != _INVALID_VALUE
+            i = int(used.argmax())
+            return offs + i if used[i] else None
+    elif 0 <= offs - length + 1 and offs < kernel_map.shape[1] and length > 0:
+        used = kernel_map[p, offs - length + 1:offs + 1][::-1] != _INVALID_VALUE
+        i = int(used.argmax())
+        return offs - i if used[i] else None
+    # Windows that leave the map (or are empty)
+    return scan_kernel_mem(kernel_map, p, offs, length, reverse)
+
+
+def search_kernel_mem(  # pylint: disable=too-many-return-statements
+        kernel_map: np.ndarray,
+        length: int,
+        offs: int,
+        proc_map: int,
+        check: Callable[..., bool],
+        weight_mask: bool = False,
+        reverse: bool = False,
+        vectorized: bool = True,
+) -> int:
+    """
+    Search `kernel_map` for `length` free columns on all processors in `proc_map`, starting at
+    column `offs` (and searching towards lower columns when `reverse`). When `weight_mask` is
+    set, all columns must be in the same memory instance. `check(p, offs, reverse=False)`
+    returns whether there is space at `offs` for processor `p` (or exits).
+    When `vectorized` is not set, the kernel map is checked column by column.
+    Return the column found, or -1.
+    """
+    assert tc.dev is not None
+
+    def kernel_mem_mask(
+            offs: int,
+    ):
+        """Return the mask bits for the kernel memory at offset `offs`"""
+        assert tc.dev is not None
+        if offs + 1 >= tc.dev.MASK_WIDTH_SMALL:
+            return tc.dev.MASK_INSTANCE_SMALL-1
+        return tc.dev.MASK_INSTANCE_LARGE-1
+
+    def align(
+            offs: int,
+    ) -> Optional[int]:
+        """Return `offs` adjusted for the weight mask, or None when the kernels cannot fit"""
+        if not weight_mask:
+            return offs
+        # Ensure that all kernels for this layer are in the same memory instance
+        if not reverse:
+            # Large or small memory instance mask?
+            mmask = kernel_mem_mask(offs + 1)
+            # Round up to next instance
+            if (offs + 1) & ~mmask != (offs + length) & ~mmask:
+                offs = ((offs + mmask) & ~mmask) - 1
+            # Update mask in case we move into the small instances
+            mmask = kernel_mem_mask(offs + 1)
+            if (offs + 1) & ~mmask != (offs + length) & ~mmask:
+                # Cannot ever make this fit since we just ran out of large instances
+                return None
+        else:
+            # Note: reverse can only ever be true when length <= MASK_INSTANCE_SMALL
+            # Large or small memory instance mask?
+            mmask = kernel_mem_mask(offs - 1)
+            if (offs - 1) & ~mmask != (offs - length) & ~mmask:
+                offs &= ~mmask
+        return offs
+
+    def next_candidate(
+            i: int,
+    ) -> int:
+        """Return the next candidate (at least one more than used column `i`, rounded)"""
+        if not reverse:
+            return (i + 1 + tc.dev.P_SHARED-1) & ~(tc.dev.P_SHARED-1)
+        return (i - 1) & ~(tc.dev.P_SHARED-1)
+
+    first_proc = ffs(proc_map)
+    last_proc = fls(proc_map)
+
+    p = first_proc
+    # Find the first free column for the first processor
+    while kernel_map[p][offs] != _INVALID_VALUE:
+        # Start at a multiple of 4 - round up to next multiple
+        if not reverse:
+            offs += tc.dev.P_SHARED
+        else:
+            offs -= tc.dev.P_SHARED
+        if not check(p, offs, reverse=reverse):
+            return -1
+
+    # Check all processors at once. In reverse, the adjusted offset may depend on how often the
+    # weight mask adjustment was applied, so check processor by processor as below.
+    if vectorized and not (reverse and weight_mask):
+        procs = np.array([(proc_map >> p) & 1 for p in range(first_proc, last_proc + 1)],
+                         dtype=bool)[:, np.newaxis]
+        while True:
+            aligned = align(offs)
+            if aligned is None:
+                return -1
+            offs = aligned
+            start = offs - length + 1 if reverse else offs
+            if start < 0 or start + length > kernel_map.shape[1] or length == 0:
+                break  # Windows that leave the map
+            used = kernel_map[first_proc:last_proc + 1, start:start + length] != _INVALID_VALUE
+            used &= procs
+            if reverse:
+                used = used[:, ::-1]
+            # First used column of the first processor (in order) that has one
+            i = int(used.argmax())
+            if not used.flat[i]:
+                return offs
+            p, i = divmod(i, length)
+            p += first_proc
+            offs = next_candidate(offs - i if reverse else offs + i)
+            if not check(p, offs):
+                return -1
+        p = first_proc
+
+    while p < last_proc+1:
+        if (proc_map >> p) & 1 == 0:
+            # Skip unused processors
+            p += 1
+            continue
+
+        # For this processor, is there space for all kernels starting at column 'offs'?
+        aligned = align(offs)
+        if aligned is None:
+            return -1
+        offs = aligned
+        if vectorized:
+            i = first_used(kernel_map, p, offs, length, reverse)
+        else:
+            i = scan_kernel_mem(kernel_map, p, offs, length, reverse)
+        if i is not None:
+            # No, go to the next candidate
+            offs = next_candidate(i)
+            if not check(p, offs):
+                return -1
+            # Reset to start at first processor again
+            p = first_proc - 1  # Subtract 1 since it's increased again below
+        # Check next processor
+        p += 1
+    return offs
+
+
+def load(  # pylint: disable=too-many-locals,too-many-branches,too-many-statements
         embedded_code,
         apb,
         layers,
@@ -101,6 +391,7 @@ def load(  # pylint: disable=too-many-branches,too-many-statements
     kernel_map = np.full((tc.dev.MAX_PROC, tc.dev.MASK_WIDTH_LARGE),
                          fill_value=_INVALID_VALUE, dtype=np.int64)
     kernels_used = np.zeros((tc.dev.MAX_PROC, tc.dev.MASK_WIDTH_LARGE), dtype=np.int64)
+    mask_widths = np.array([tc.dev.mask_width(p) for p in range(tc.dev.MAX_PROC)])
     kernel_data = np.zeros((tc.dev.MAX_PROC, tc.dev.MASK_WIDTH_LARGE, 9), dtype=np.uint8)
     # There are four 32-bit words per 9-byte kernel.
     # The value map is initialized with zeros so we can later ignore unused entries and use
@@ -132,6 +423,168 @@ def load(  # pylint: disable=too-many-branches,too-many-statements
             return False
         return True
 
+    def kernel_target(ll, p, col_target):
+        """Return the processor(s) and column(s) for kernel(s) `col_target`"""
+        ct = col_target
+        if ll == 0 and quad:
+            p = p + ct % 4 * tc.dev.P_NUMPRO
+            ct = ct // 4
+        return p, kern_offs[ll] + ct
+
+    def kernel_stream_pos(ll, p, col_target):
+        """
+        Return the position of the next free byte in kernel `col_target` for processor `p`, in
+        the stream of 9-byte kernels for the layer (9 * kernel + byte).
+        """
+        tp, col = kernel_target(ll, p, col_target)
+        if col >= mask_widths[tp]:
+            return col_target * 9  # Reported by add_kernel_data()
+        assert kernels_used[tp][col] <= 8
+        return col_target * 9 + kernels_used[tp][col]
+
+    def write_kernel_data(ll, p, stream, b):
+        """
+        Write the bytes in array `b` to the kernels for processor `p` at the positions in array
+        `stream` (see kernel_stream_pos()).
+        """
+        tp, col = kernel_target(ll, p, stream // 9)
+        tp = np.broadcast_to(tp, col.shape)
+        invalid = col >= mask_widths[tp]
+        if np.any(invalid):
+            n = int(invalid.argmax())
+            if n > 0:
+                write_kernel_data(ll, p, stream[:n], b[:n])
+            check_kernel_mem(ll, int(tp[n]), int(col[n]), length=1)
+
+        used = stream % 9
+        first = used == 0  # Update kernel map
+        assert np.all(kernel_map[tp[first], col[first]] == _INVALID_VALUE)
+        kernel_map[tp[first], col[first]] = ll
+
+        kernel_data[tp, col, 8 - used] = b & 0xff
+        last = np.append(stream[1:] // 9 != stream[:-1] // 9, True)
+        kernels_used[tp[last], col[last]] = used[last] + 1
+
+    def add_kernel_data(ll, p, starts, data):
+        """
+        Add the bytes in the arrays `data` to the kernels for processor `p`, where each array
+        starts at the corresponding stream position in `starts` (see kernel_stream_pos()).
+        """
+        lengths = [len(b) for b in data]
+        if sum(lengths) == 0:
+            return
+        b = np.concatenate(data)
+        assert b.dtype == np.int64, f'Kernel is type {b.dtype} instead of numpy.int64'
+        assert np.all((b >= 0) & (b <= 255)), f'Trying to add kernel values {b}'
+        stream = np.repeat(np.array(starts, dtype=np.int64) - np.cumsum([0] + lengths[:-1]),
+                           lengths) + np.arange(len(b))
+        write_kernel_data(ll, p, stream, b)
+
+    def pad_kernel_data(ll, p, col_target, stop):
+        """Add zero bytes to the kernels for processor `p` up to kernel `stop`"""
+        while col_target < stop:
+            pos = kernel_stream_pos(ll, p, col_target)
+            # The input layer in quad mode may wrap around to partially used kernels
+            end = (col_target + 1) * 9 if ll == 0 and quad else stop * 9
+            add_kernel_data(ll, p, [pos], [np.zeros(end - pos, dtype=np.int64)])
+            col_target = end // 9
+        return col_target
+
+    def find_kernel_mem(ll, kernel_map, check):
+        """
+        Return the kernel offset for layer `ll` in `kernel_map` (greedy allocator), and whether
+        space was found. `check` is check_kernel_mem() or a function with the same arguments.
+        """
+        proc_map = processor_map[ll]
+        if ll == 0 and quad:
+            proc_map &= 2**tc.dev.P_NUMPRO - 1
+        first_proc = ffs(proc_map)
+        last_proc = fls(proc_map)
+        next_layer_map = output_processor_map[ll]
+        qfactor = 8 // abs(quantization[ll])
+
+        # Find the first block of kern_len[ll] size that is available for all used
+        # processors.
+        # Initially, start looking at 0 and subsequently at the first available for the
+        # previously examined processors. Stop looking at the highest used offset for all
+        # processors.
+
+        weight_mask = tc.dev.REQUIRE_WEIGHT_MASK and conv_groups[ll] > 1
+
+        found = True
+        search_col = -1  # Nothing found
+        if state.new_kernel_loader and not (ll > 0 and calcx4[ll] and not calcx4[ll-1]):
+            # Check whether all processors used have extended mask space
+            extended_masks = tc.dev.MASK_WIDTH_LARGE > tc.dev.MASK_WIDTH_SMALL  # 2 sizes?
+            if extended_masks:
+                for p in range(first_proc, last_proc+1):
+                    # Any used processors does not have the extended space
+                    if (proc_map >> p) & 1 == 1 and not tc.dev.mask_large(p):
+                        extended_masks = False
+                        break
+
+            # Try the end of kernel memory first for processors with extended memory
+            if extended_masks and (not tc.dev.REQUIRE_WEIGHT_MASK
+                                   or conv_groups[ll] == 1
+                                   or kern_len[ll] <= tc.dev.MASK_INSTANCE_SMALL):
+                search_col = search_kernel_mem(
+                    kernel_map, int(kern_len[ll]),
+                    tc.dev.MASK_WIDTH_LARGE - 1, proc_map,
+                    functools.partial(check, ll, error=False),
+                    weight_mask=weight_mask, reverse=True,
+                )
+
+        # If nothing found at the end of kernel memory, start search at the beginning
+        if search_col == -1:
+            search_col = (start_offs + tc.dev.P_SHARED - 1) & ~(tc.dev.P_SHARED - 1)
+            search_col = search_kernel_mem(kernel_map, int(kern_len[ll]),
+                                           search_col, proc_map,
+                                           functools.partial(check, ll),
+                                           weight_mask=weight_mask)
+            found = search_col != -1
+
+            # All used processors have kernel_len space starting at this column
+            offs = search_col
+
+            if ll > 0 and calcx4[ll] and not calcx4[ll-1]:
+                # FIXME: This is a quick workaround that should be properly addressed for
+                # mixed non-x4/x4 situations (most common: quad-fast-fifo input and calcx4
+                # in the rest of the network)
+                offs *= 4
+
+            # We don't have to use dummy columns if there's space available on the left
+            if not state.new_kernel_loader:
+                offs = max(0, offs - (((ffs(next_layer_map) % tc.dev.P_SHARED)
+                                       + qfactor - 1) // qfactor))
+
+            offs = (offs + tc.dev.P_SHARED-1) & ~(tc.dev.P_SHARED-1)
+        else:
+            search_col -= kern_len[ll] - 1
+            # All used processors have kernel_len space starting at this column
+            offs = search_col
+            offs = offs & ~(tc.dev.P_SHARED-1)
+        return offs, found
+
+    def kernel_footprint(ll):
+        """Return the processor map and the kernel length for layer `ll`"""
+        proc_map = processor_map[ll]
+        if ll == 0 and quad:
+            proc_map &= 2**tc.dev.P_NUMPRO - 1
+            # The kernels are spread across all four groups
+            proc_map |= proc_map << tc.dev.P_NUMPRO | proc_map << 2 * tc.dev.P_NUMPRO \
+                | proc_map << 3 * tc.dev.P_NUMPRO
+        return proc_map, int(kern_len[ll])
+
+    def place_layer(ll, kmap):
+        """Return the offset for layer `ll` in kernel map `kmap` (greedy allocator), or -1"""
+        offs, found = find_kernel_mem(ll, kmap,
+                                      functools.partial(check_kernel_mem, error=False))
+        proc_map, length = kernel_footprint(ll)
+        if not found or offs < 0 or any(offs + length > tc.dev.mask_width(p)
+                                        for p in range(tc.dev.MAX_PROC) if (proc_map >> p) & 1):
+            return -1
+        return offs
+
     with console.Progress(start=True) as progress:
         task0 = progress.add_task(description='Arranging weights...', total=layers-start_layer)
         start_range = []
@@ -141,11 +594,39 @@ def load(  # pylint: disable=too-many-branches,too-many-statements
                 start_range.append(ll)
             else:
                 end_range.append(ll)
-        for ll in start_range + end_range:
+
+        def layer_order():
+            """
+            Yield (layer, size_only) for all layers. For the global kernel placement, the kernel
+            lengths for all layers are determined first (size_only), and the layers are then
+            placed in the planned order.
+            """
+            order = start_range + end_range
+            if state.global_kernel_placement and state.greedy_kernel_allocator:
+                for ll in order:
+                    yield ll, True
+                start = time.perf_counter()
+                planned, unplaced, tried = plan_kernel_order(sized, place_layer, kernel_footprint,
+                                                             state.kernel_placement_time)
+                if tried == 1 and unplaced == 0:
+                    print('Global kernel placement: all layers fit in network order')
+                else:
+                    print(f'Global kernel placement: tried {tried} layer orders '
+                          f'in {time.perf_counter() - start:.2f}s')
+                if unplaced > 0:
+                    wprint(f'Global kernel placement: {unplaced} layer'
+                           f'{"s do" if unplaced != 1 else " does"} not fit.')
+                order = planned + [ll for ll in order if ll not in sized]
+            for ll in order:
+                yield ll, False
+
+        sized = []  # Layers with kernels
+        for ll, size_only in layer_order():
             if operator[ll] == op.NONE or bypass[ll] or kernel[ll] is None:
                 assert kern_len[ll] == 0
                 assert kern_offs[ll] == start_offs
-                progress.advance(task0)
+                if not size_only:
+                    progress.advance(task0)
                 continue
 
             qfactor = 8 // abs(quantization[ll])
@@ -230,7 +711,7 @@ def load(  # pylint: disable=too-many-branches,too-many-statements
             next_layer_map = output_processor_map[ll]
             first_output_proc = ffs(next_layer_map)
             start_col = first_output_proc % tc.dev.P_SHARED  # First target column out of 4 shared
-            if start_col > 0 and quantization[ll] != 8:
+            if start_col > 0 and quantization[ll] != 8 and not size_only:
                 wprint(f'{layer_pfx(ll)}Warning: {quantization[ll]}-bit quantization uses '
                        'unaligned output processors, this may cause issues')
 
@@ -276,93 +757,9 @@ def load(  # pylint: disable=too-many-branches,too-many-statements
                 kern_count[0] = (kern_count[0] + 3) // 4
                 kern_ochan[0] = (kern_ochan[0] + 3) // 4
 
-            def search_kernel_mem(
-                    ll: int,
-                    offs: int,
-                    first_proc: int,
-                    last_proc: int,
-                    proc_map: int,
-                    reverse: bool = False,
-                    error: bool = True,
-            ) -> int:
-                """Search kernel memory for free space"""
-                assert tc.dev is not None
-
-                def kernel_mem_mask(
-                        offs: int,
-                ):
-                    """Return the mask bits for the kernel memory at offset `offs`"""
-                    assert tc.dev is not None
-                    if offs + 1 >= tc.dev.MASK_WIDTH_SMALL:
-                        return tc.dev.MASK_INSTANCE_SMALL-1
-                    return tc.dev.MASK_INSTANCE_LARGE-1
-
-                p = first_proc
-                # Find the first free column for the first processor
-                while kernel_map[p][offs] != _INVALID_VALUE:
-                    # Start at a multiple of 4 - round up to next multiple
-                    if not reverse:
-                        offs += tc.dev.P_SHARED
-                    else:
-                        offs -= tc.dev.P_SHARED
-                    if not check_kernel_mem(ll, p, offs, error=error, reverse=reverse):
-                        return -1
-
-                while p < last_proc+1:
-                    if (proc_map >> p) & 1 == 0:
-                        # Skip unused processors
-                        p += 1
-                        continue
-
-                    # For this processor, is there space for all kernels starting at
-                    # column 'offs'?
-                    if not reverse:
-                        if tc.dev.REQUIRE_WEIGHT_MASK and conv_groups[ll] > 1:
-                            # Ensure that all kernels for this layer are in the same memory
-                            # instance
-                            # Large or small memory instance mask?
-                            mmask = kernel_mem_mask(offs + 1)
-                            # Round up to next instance
-                            if (offs + 1) & ~mmask != (offs + kern_len[ll]) & ~mmask:
-                                offs = ((offs + mmask) & ~mmask) - 1
-                            # Update mask in case we move into the small instances
-                            mmask = kernel_mem_mask(offs + 1)
-                            if (offs + 1) & ~mmask != (offs + kern_len[ll]) & ~mmask:
-                                # Cannot ever make this fit since we just ran out of large
-                                # instances
-                                return -1
-                        start_range = offs
-                        end_range = offs + kern_len[ll]
-                        step_range = 1
-                    else:
-                        # Note: reverse can only ever be true
-                        # when kern_len[ll] <= MASK_INSTANCE_SMALL
-                        if tc.dev.REQUIRE_WEIGHT_MASK and conv_groups[ll] > 1:
-                            # Ensure that all kernels for this layer are in the same memory
-                            # instance
-                            # Large or small memory instance mask?
-                            mmask = kernel_mem_mask(offs - 1)
-                            if (offs - 1) & ~mmask != (offs - kern_len[ll]) & ~mmask:
-                                offs &= ~mmask
-                        start_range = offs
-                        end_range = offs - kern_len[ll]
-                        step_range = -1
-                    for i in range(start_range, end_range, step_range):
-                        if kernel_map[p][i] != _INVALID_VALUE:
-                            # No, go to the next candidate
-                            # (at least one more than what we're looking at, rounded)
-                            if not reverse:
-                                offs = (i + 1 + tc.dev.P_SHARED-1) & ~(tc.dev.P_SHARED-1)
-                            else:
-                                offs = (i - 1) & ~(tc.dev.P_SHARED-1)
-                            if not check_kernel_mem(ll, p, offs, error=error):
-                                return -1
-                            # Reset to start at first processor again
-                            p = first_proc - 1  # Subtract 1 since it's increased again below
-                            break
-                    # Check next processor
-                    p += 1
-                return offs
+            if size_only:
+                sized.append(ll)
+                continue
 
             # Find space for kernels
             if not state.greedy_kernel_allocator:
@@ -373,57 +770,7 @@ def load(  # pylint: disable=too-many-branches,too-many-statements
                     # Get highest offset for all used processors
                     kern_offs[ll] = max(proc_kern_max[p], kern_offs[ll])
             else:
-                # Find the first block of kern_len[ll] size that is available for all used
-                # processors.
-                # Initially, start looking at 0 and subsequently at the first available for the
-                # previously examined processors. Stop looking at the highest used offset for all
-                # processors.
-
-                search_col = -1  # Nothing found
-                if state.new_kernel_loader and not (ll > 0 and calcx4[ll] and not calcx4[ll-1]):
-                    # Check whether all processors used have extended mask space
-                    extended_masks = tc.dev.MASK_WIDTH_LARGE > tc.dev.MASK_WIDTH_SMALL  # 2 sizes?
-                    if extended_masks:
-                        for p in range(first_proc, last_proc+1):
-                            # Any used processors does not have the extended space
-                            if (proc_map >> p) & 1 == 1 and not tc.dev.mask_large(p):
-                                extended_masks = False
-                                break
-
-                    # Try the end of kernel memory first for processors with extended memory
-                    if extended_masks and (not tc.dev.REQUIRE_WEIGHT_MASK
-                                           or conv_groups[ll] == 1
-                                           or kern_len[ll] <= tc.dev.MASK_INSTANCE_SMALL):
-                        search_col = search_kernel_mem(ll, tc.dev.MASK_WIDTH_LARGE - 1,
-                                                       first_proc, last_proc, proc_map,
-                                                       reverse=True, error=False)
-
-                # If nothing found at the end of kernel memory, start search at the beginning
-                if search_col == -1:
-                    search_col = (start_offs + tc.dev.P_SHARED - 1) & ~(tc.dev.P_SHARED - 1)
-                    search_col = search_kernel_mem(ll, search_col, first_proc, last_proc, proc_map)
-
-                    # All used processors have kernel_len space starting at this column
-                    kern_offs[ll] = search_col
-
-                    if ll > 0 and calcx4[ll] and not calcx4[ll-1]:
-                        # FIXME: This is a quick workaround that should be properly addressed for
-                        # mixed non-x4/x4 situations (most common: quad-fast-fifo input and calcx4
-                        # in the rest of the network)
-                        kern_offs[ll] *= 4
-
-                    # We don't have to use dummy columns if there's space available on the left
-                    if not state.new_kernel_loader:
-                        kern_offs[ll] = \
-                            max(0, kern_offs[ll] - (((ffs(next_layer_map) % tc.dev.P_SHARED)
-                                                    + qfactor - 1) // qfactor))
-
-                    kern_offs[ll] = (kern_offs[ll] + tc.dev.P_SHARED-1) & ~(tc.dev.P_SHARED-1)
-                else:
-                    search_col -= kern_len[ll] - 1
-                    # All used processors have kernel_len space starting at this column
-                    kern_offs[ll] = search_col
-                    kern_offs[ll] = kern_offs[ll] & ~(tc.dev.P_SHARED-1)
+                kern_offs[ll], _ = find_kernel_mem(ll, kernel_map, check_kernel_mem)
 
             # Check for overflow
             check_kernel_mem(ll, last_proc, kern_offs[ll])
@@ -433,29 +780,6 @@ def load(  # pylint: disable=too-many-branches,too-many-statements
             # Start at the first used instance
             this_map_init = next_layer_map >> ffs(next_layer_map)
 
-            def add_kernel_data(ll, p, col_target, b):
-                ct = col_target
-                if ll == 0 and quad:
-                    ct //= 4
-                    p += col_target % 4 * tc.dev.P_NUMPRO
-                col = kern_offs[ll] + ct
-                check_kernel_mem(ll, p, col, length=1)
-
-                if kernels_used[p][col] == 0:  # Update kernel map
-                    assert kernel_map[p][col] == _INVALID_VALUE
-                    kernel_map[p][col] = ll
-
-                assert kernels_used[p][col] <= 8
-                assert isinstance(b, np.int64), f'Kernel is type {type(b)} instead of numpy.int64'
-                assert 0 <= b <= 255, f'Trying to add kernel value {b}'
-                kernel_data[p][col][8 - kernels_used[p][col]] = b & 0xff
-                kernels_used[p][col] += 1
-
-                if kernels_used[p][col] == 9:  # Flush
-                    col_target += 1  # Write 1
-
-                return col_target
-
             task1 = progress.add_task(f'Layer {ll}...', total=1+last_proc-first_proc)
             for p in range(first_proc, last_proc + 1):
                 if (proc_map >> p) & 1 == 0:
@@ -465,9 +789,15 @@ def load(  # pylint: disable=too-many-branches,too-many-statements
                 # Skip start_col processors. Each takes up ksize bytes, or ksize // 9 full
                 # kernel words. There are col_bytes leftover bytes.
                 col_target, col_bytes = divmod(start_col * ksize * in_exp, 9)
+                # Collect the kernel bytes for this processor and write them all at once.
+                # pos is the position in the stream of kernels (9 * col_target + byte).
+                pos = kernel_stream_pos(ll, p, col_target)
+                starts = []
+                data = []
                 # Pad out the leftovers
-                for _ in range(col_bytes // qfactor):  # FIXME for quantization
-                    col_target = add_kernel_data(ll, p, col_target, np.int64(0))
+                starts.append(pos)
+                data.append(np.zeros(col_bytes // qfactor, dtype=np.int64))  # FIXME quantization
+                pos += len(data[-1])
 
                 out_range = out_expand[ll] if conv_groups[ll] == 1 else 1
                 for expand in range(out_range):
@@ -485,7 +815,7 @@ def load(  # pylint: disable=too-many-branches,too-many-statements
                         if this_map != 0:
                             while this_map & proc_mask == 0:
                                 assert this_map != 0
-                                col_target += 1  # Completely skip
+                                pos = (pos // 9 + 1) * 9  # Completely skip
                                 this_map >>= qfactor  # and slide forward
                         this_mask = this_map & proc_mask
                         this_map >>= qfactor
@@ -536,19 +866,18 @@ def load(  # pylint: disable=too-many-branches,too-many-statements
                                                 dtype=np.int64,
                                             ),
                                         )
-                                    for i in range(0, len(k) // qfactor):
-                                        e = k[i * qfactor]
-                                        for j in range(1, qfactor):
-                                            e |= k[i * qfactor + j] << (j * abs(quantization[ll]))
-                                        col_target = add_kernel_data(ll, p, col_target, e)
+                                    e = np.bitwise_or.reduce(
+                                        k.reshape(-1, qfactor)
+                                        << np.arange(0, 8, abs(quantization[ll]), dtype=np.int64),
+                                        axis=1,
+                                    )
+                                    data.append(e)
                                 else:
-                                    for i in range(ksize):
-                                        col_target = add_kernel_data(ll, p, col_target,
-                                                                     k[ksize - i - 1])
-
+                                    data.append(k[ksize - 1::-1])
                             else:  # When expanding, need to pad with zero kernels if needed
-                                for _ in range(ksize // qfactor):
-                                    col_target = add_kernel_data(ll, p, col_target, np.int64(0))
+                                data.append(np.zeros(ksize // qfactor, dtype=np.int64))
+                            starts.append(pos)
+                            pos += len(data[-1])
 
                         # Consume kernels
                         if not flatten[ll]:
@@ -558,13 +887,15 @@ def load(  # pylint: disable=too-many-branches,too-many-statements
                             col += 1
                             m += 1
 
+                add_kernel_data(ll, p, starts, data)
+                col_target = pos // 9
+
                 if ll == 0 and quad:
                     col_target = (col_target - start_col + 3) // 4 + start_col
                 if kern_offs[ll] + col_target < tc.dev.mask_width(p) \
                    and kernels_used[p][kern_offs[ll] + col_target] > 0:  # Partials
                     col_target += 1
-                while col_target - start_col < kern_len[ll]:
-                    col_target = add_kernel_data(ll, p, col_target, np.int64(0))
+                col_target = pad_kernel_data(ll, p, col_target, start_col + kern_len[ll])
                 if flatten[ll]:
                     kern_len[ll] = col_target
                 elif not state.new_kernel_loader:
@@ -580,13 +911,67 @@ def load(  # pylint: disable=too-many-branches,too-many-statements
             progress.remove_task(task1)
             progress.advance(task0)
 
+    # Used kernels (columns) for every processor
+    kernel_cols = [np.flatnonzero(kernel_map[p][:tc.dev.mask_width(p)] != _INVALID_VALUE)
+                   for p in range(tc.dev.MAX_PROC)]
+
+    def kernel_col_range(
+            min_col: int,
+    ):
+        """Return lists of the lowest (or `min_col`) and highest (or -1) used column"""
+        max_cols = [-1] * len(kernel_cols)
+        min_cols = [min_col] * len(kernel_cols)
+        for p, cols in enumerate(kernel_cols):
+            if len(cols) > 0:
+                max_cols[p] = int(cols[-1])
+                min_cols[p] = min(min_col, int(cols[0]))
+        return min_cols, max_cols
+
     with console.Progress(start=True) as progress:
         if state.verbose:
             print('\nKernel map:')
             print_map(layers, kernel_map)
+        if state.global_kernel_placement:
+            print_utilization(kernel_map)
 
         if state.new_kernel_loader and not state.rtl_preload_weights:
-            apb.output('static const uint32_t kernels[] = KERNELS;\n\n', api)
+            if not state.compress_kernels:
+                apb.output('static const uint32_t kernels[] = KERNELS;\n\n', api)
+            else:
+                apb.output('static const uint8_t kernels[] = KERNELS;\n'
+                           'static const uint8_t kernels_dict[] = KERNELS_DICT;\n\n', api)
+                # Write one 9-byte kernel to kernel memory in the same format as the
+                # uncompressed loader
+                if state.mexpress:
+                    apb.function_header(prefix='', function='write_kernel',
+                                        return_type='static void',
+                                        arguments='volatile uint32_t **addr, const uint8_t *k, '
+                                        'uint32_t *val, int *count')
+                    apb.output(
+                        '  int i;\n\n'
+                        '  for (i = 0; i < 9; i++) {\n'
+                        '    *val = (*val << 8) | k[i];\n'
+                        '    if (++(*count) == 4) {\n'
+                        '      *(*addr)++ = *val;\n'
+                        '      *count = 0;\n'
+                        '    }\n'
+                        '  }\n',
+                        api,
+                    )
+                else:
+                    apb.function_header(prefix='', function='write_kernel',
+                                        return_type='static void',
+                                        arguments='volatile uint32_t **addr, const uint8_t *k')
+                    apb.output(
+                        '  *(*addr)++ = k[0];\n'
+                        '  *(*addr)++ = (uint32_t) k[1] << 24 | (uint32_t) k[2] << 16 '
+                        '| (uint32_t) k[3] << 8 | k[4];\n'
+                        '  *(*addr)++ = (uint32_t) k[5] << 24 | (uint32_t) k[6] << 16 '
+                        '| (uint32_t) k[7] << 8 | k[8];\n'
+                        '  *(*addr)++ = 0;\n',
+                        api,
+                    )
+                apb.function_footer(return_value='void')  # write_kernel()
 
         if verify:
             if state.new_kernel_loader:
@@ -653,15 +1038,14 @@ def load(  # pylint: disable=too-many-branches,too-many-statements
             else:
                 # Write in-line
                 for p in range(tc.dev.MAX_PROC):
-                    for col in range(0, tc.dev.mask_width(p)):
+                    for col in kernel_cols[p]:
                         ll = kernel_map[p][col]
-                        if ll != _INVALID_VALUE:
-                            apb.write_kern(ll, p, col, kernel_data[p][col],
-                                           verify_only=verify, calc_x4=calcx4[ll],
-                                           kern_offs=kern_offs,
-                                           count=in_expand[ll] * output_chan[ll] * 9
-                                           * abs(quantization[ll])
-                                           // (kernel_size[ll][0] * kernel_size[ll][1] * 8))
+                        apb.write_kern(ll, p, col, kernel_data[p][col],
+                                       verify_only=verify, calc_x4=calcx4[ll],
+                                       kern_offs=kern_offs,
+                                       count=in_expand[ll] * output_chan[ll] * 9
+                                       * abs(quantization[ll])
+                                       // (kernel_size[ll][0] * kernel_size[ll][1] * 8))
             apb.function_footer()  # verify_weights()
 
         if state.new_kernel_loader or not (embedded_code or mexpress) or any(calcx4):
@@ -669,19 +1053,62 @@ def load(  # pylint: disable=too-many-branches,too-many-statements
             # Write (or store) in-line
             task = progress.add_task('Storing weights...  ', total=tc.dev.MAX_PROC)
             for p in range(tc.dev.MAX_PROC):
-                for col in range(0, tc.dev.mask_width(p)):
+                for col in kernel_cols[p]:
                     ll = kernel_map[p][col]
-                    if ll != _INVALID_VALUE:
-                        k = kernel_data[p][col]
-                        if not zero_sram or np.any(k != 0):
-                            apb.write_kern(ll, p, col, k, calc_x4=calcx4[ll],
-                                           kern_offs=kern_offs,
-                                           count=in_expand[ll] * output_chan[ll] * 9
-                                           * abs(quantization[ll])
-                                           // (kernel_size[ll][0] * kernel_size[ll][1] * 8))
+                    k = kernel_data[p][col]
+                    if not zero_sram or np.any(k != 0):
+                        apb.write_kern(ll, p, col, k, calc_x4=calcx4[ll],
+                                       kern_offs=kern_offs,
+                                       count=in_expand[ll] * output_chan[ll] * 9
+                                       * abs(quantization[ll])
+                                       // (kernel_size[ll][0] * kernel_size[ll][1] * 8))
                 progress.advance(task)
 
-            if state.new_kernel_loader and not state.rtl_preload_weights:
+            if state.new_kernel_loader and not state.rtl_preload_weights \
+               and state.compress_kernels:
+                # See kcompress.py for the format
+                write_args = ', &val, &count' if state.mexpress else ''
+                apb.output('  static const uint8_t zero_kernel[9] = { 0 };\n'
+                           '  volatile uint32_t *addr;\n'
+                           '  const uint8_t *ptr = kernels;\n'
+                           '  uint32_t val = 0;\n'
+                           '  int n, count;\n'
+                           '\n'
+                           '  while ((addr = (volatile uint32_t *) ((uint32_t) ptr[0] << 24 '
+                           '| (uint32_t) ptr[1] << 16\n'
+                           '                                        | (uint32_t) ptr[2] << 8 '
+                           '| ptr[3])) != 0) {\n'
+                           '    ptr += 4;\n',
+                           api)
+                if state.mexpress:
+                    apb.output('    *((volatile uint8_t *) ((uint32_t) addr | 1)) = 0x01; '
+                               '// Set address\n',
+                               api)
+                apb.output('    count = 0;\n'
+                           '    while ((n = *ptr++) != 0) {\n'
+                           f'      if (n < 0x{kcompress.ZERO:02x}) {{ // Literal kernels\n'
+                           '        while (n-- > 0) {\n'
+                           f'          write_kernel(&addr, ptr{write_args});\n'
+                           '          ptr += 9;\n'
+                           '        }\n'
+                           f'      }} else if (n < 0x{kcompress.DICTIONARY:02x}) {{ '
+                           '// Zero kernels\n'
+                           f'        n -= 0x{kcompress.ZERO - 1:02x};\n'
+                           '        while (n-- > 0)\n'
+                           f'          write_kernel(&addr, zero_kernel{write_args});\n'
+                           '      } else { // Kernel from dictionary\n'
+                           f'        n = (n & 0x{~kcompress.DICTIONARY & 0xff:02x}) << 8 '
+                           '| *ptr++;\n'
+                           f'        write_kernel(&addr, &kernels_dict[n * 9]{write_args});\n'
+                           '      }\n'
+                           '    }\n',
+                           api)
+                if state.mexpress:
+                    apb.output('    if (count > 0)\n'
+                               '      *addr = val << ((4 - count) * 8);\n',
+                               api)
+                apb.output('  }\n', api)
+            elif state.new_kernel_loader and not state.rtl_preload_weights:
                 apb.output('  uint32_t len;\n'
                            '  volatile uint32_t *addr;\n'
                            '  const uint32_t *ptr = kernels;\n'
@@ -706,29 +1133,20 @@ def load(  # pylint: disable=too-many-branches,too-many-statements
 
             if not mexpress:
                 task = progress.add_task('Storing weights...  ', total=tc.dev.MAX_PROC)
+                # Pack each 9-byte kernel into three of the four 32-bit words
+                shifts = np.array([0, 24, 16, 8, 0, 24, 16, 8, 0], dtype=np.int64)
+                words = np.array([0, 1, 1, 1, 1, 2, 2, 2, 2])
                 for p in range(tc.dev.MAX_PROC):
-                    for col in range(0, tc.dev.mask_width(p)):
-                        ll = kernel_map[p][col]
-                        if ll != _INVALID_VALUE:
-                            k = kernel_data[p][col]
-                            offs = _WORDS_PER_KERNEL * col
-                            kernel_values[p][offs] = k[0] & 0xff
-                            kernel_values[p][offs + 1] = (k[1] & 0xff) << 24 \
-                                | (k[2] & 0xff) << 16 | (k[3] & 0xff) << 8 | k[4] & 0xff
-                            kernel_values[p][offs + 2] = (k[5] & 0xff) << 24 \
-                                | (k[6] & 0xff) << 16 | (k[7] & 0xff) << 8 | k[8] & 0xff
+                    k = kernel_data[p][kernel_cols[p]].astype(np.int64) << shifts
+                    values = kernel_values[p].reshape(-1, _WORDS_PER_KERNEL)
+                    for i in range(3):
+                        values[kernel_cols[p], i] = np.bitwise_or.reduce(k[:, words == i], axis=1)
                     progress.advance(task)
 
                 # First, define the weights (will move to header file)
                 # Combining memcopy() requires stacked memories
-                max_col = [-1] * tc.dev.MAX_PROC
-                min_col = [tc.dev.MASK_WIDTH_LARGE if not legacy_kernels else 0] * tc.dev.MAX_PROC
-                for p in range(0, tc.dev.MAX_PROC):
-                    for col in range(0, tc.dev.mask_width(p)):
-                        ll = kernel_map[p][col]
-                        if ll != _INVALID_VALUE:
-                            max_col[p] = col
-                            min_col[p] = min(min_col[p], col)
+                min_col, max_col = kernel_col_range(tc.dev.MASK_WIDTH_LARGE
+                                                    if not legacy_kernels else 0)
                 p = 0
                 while p < tc.dev.MAX_PROC:
                     if max_col[p] >= 0:
@@ -795,34 +1213,21 @@ def load(  # pylint: disable=too-many-branches,too-many-statements
             else:
                 # When using the express loader, gather all consecutive kernels for each processor
                 # and pack them.
-                zero_kernel = np.array([0] * 9, dtype=np.uint8)
-                k = None
-
                 task = progress.add_task('Storing weights...  ', total=tc.dev.MAX_PROC)
                 for p in range(tc.dev.MAX_PROC):
                     # Find min/max from kernel_map
                     max_col = -1
                     min_col = tc.dev.mask_width(p) if not legacy_kernels else 0
-                    for col in range(0, tc.dev.mask_width(p)):
-                        ll = kernel_map[p][col]
-                        if ll != _INVALID_VALUE:
-                            max_col = col
-                            min_col = min(min_col, col)
+                    if len(kernel_cols[p]) > 0:
+                        max_col = int(kernel_cols[p][-1])
+                        min_col = min(min_col, int(kernel_cols[p][0]))
                     if max_col >= 0:
-                        for col in range(min_col, max_col + 1):
-                            ll = kernel_map[p][col]
-                            if ll != _INVALID_VALUE:
-                                new_k = (kernel_data[p][col] & 0xff).astype(np.uint8)
-                            else:
-                                new_k = zero_kernel
-                            if k is None:
-                                k = new_k
-                            else:
-                                k = np.concatenate((k, new_k))
-
-                        # Round up to multiple of 4
-                        if len(k) % 4 != 0:
-                            k = np.concatenate((k, zero_kernel[:4 - len(k) % 4]))
+                        # Unused kernels between min_col and max_col are zero.
+                        # Round up to multiple of 4.
+                        span = max_col + 1 - min_col
+                        k = np.zeros((span * 9 + 3) & ~3, dtype=np.uint8)
+                        k[:span * 9].reshape(span, 9)[kernel_cols[p] - min_col] = \
+                            kernel_data[p][kernel_cols[p]]
                         # '>u4' swaps endianness to what the hardware needs,
                         # `view` packs into 32-bit
                         if not state.block_mode:
@@ -840,20 +1245,13 @@ def load(  # pylint: disable=too-many-branches,too-many-statements
                         if riscv_flash:
                             apb.output(rv.RISCV_FLASH, api)
                         apb.output(f'static const uint32_t kernels_{p}[] = KERNELS_{p};\n', api)
-                        k = None
                     progress.advance(task)
                 apb.output('\n', api)
 
             if not state.block_mode:
                 apb.function_header(function='load_weights')
-                max_col = [-1] * tc.dev.MAX_PROC
-                min_col = [tc.dev.MASK_WIDTH_LARGE if not legacy_kernels else 0] * tc.dev.MAX_PROC
-                for p in range(0, tc.dev.MAX_PROC):
-                    for col in range(0, tc.dev.mask_width(p)):
-                        ll = kernel_map[p][col]
-                        if ll != _INVALID_VALUE:
-                            max_col[p] = col
-                            min_col[p] = min(min_col[p], col)
+                min_col, max_col = kernel_col_range(tc.dev.MASK_WIDTH_LARGE
+                                                    if not legacy_kernels else 0)
                 p = 0
                 while p < tc.dev.MAX_PROC:
                     if max_col[p] >= 0:
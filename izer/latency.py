@@ -1,5 +1,5 @@
 ###################################################################################################
-# Copyright (C) 2022 Maxim Integrated Products, Inc. All Rights Reserved.
+# Copyright (C) 2022-2024 Maxim Integrated Products, Inc. All Rights Reserved.
 #
 # Maxim Integrated Products, Inc. Default Copyright Notice:
 # https://www.maximintegrated.com/en/aboutus/legal/copyrights.html
@@ -7,9 +7,157 @@
 """
 Latency calculations
 """
-from typing import Tuple
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
 
+import numpy as np
+from numpy.typing import ArrayLike
+
+from izer import op
 from izer import tornadocnn as tc
+from izer.utils import ffs, fls, popcount
+
+# Fixed states of the layer sequencer
+RD_STATE = 1
+TRAM_WRT = 1
+WRT_STATE = 1
+DUMMY_CLOCK = 1
+
+
+class Estimate(NamedTuple):
+    """
+    Latency estimate for a network. `cycles` and `streaming` (the cycles are an estimate for
+    streaming layers) have one entry for each of the `layers`, and `total` includes the
+    startup cycle.
+    """
+    layers: List[int]
+    cycles: np.ndarray
+    streaming: np.ndarray
+    total: int
+
+
+def terms(
+        pool: np.ndarray,
+        pooled_dim: np.ndarray,
+        multipass: np.ndarray,
+        output_chan: np.ndarray,
+        output_dim: np.ndarray,
+        kernel_size: np.ndarray,
+        padding: np.ndarray,
+        num_elements: np.ndarray,
+        pool_first: np.ndarray,
+        passthrough: np.ndarray,
+        pass_out_chan: np.ndarray,
+        flatten: np.ndarray,
+        streaming: np.ndarray,
+        kern_offs: np.ndarray,
+) -> Dict[str, np.ndarray]:
+    """
+    Return the terms of the latency equation for one or more layers. Dimensions have a last
+    axis of length 2, all other arguments have one value per layer.
+    """
+    assert tc.dev is not None
+    img_pooled_rows, img_pooled_cols = pooled_dim[..., 0], pooled_dim[..., 1]
+    row_pad, col_pad = padding[..., 0], padding[..., 1]
+    kern_rows, kern_cols = kernel_size[..., 0], kernel_size[..., 1]
+    output_cols = output_dim[..., 1]
+    pool_size = pool[..., 0] * pool[..., 1]
+
+    t: Dict[str, np.ndarray] = {}
+    t['flatten_adj'] = flatten.astype(np.int64)  # FIXME
+    t['meq_one'] = ((output_chan == 1) & (multipass == 1)).astype(np.int64)
+
+    # Input processing
+    t['pre_read'] = np.where(
+        ~pool_first & tc.dev.REQUIRE_MP_KERNOFF_MULTIWRITE
+        & ((multipass > 1) | (num_elements > 1)),
+        ((img_pooled_rows + 2*row_pad - kern_cols + 1) * col_pad
+         + (img_pooled_cols + 2*col_pad - kern_rows + 1) * row_pad
+         - row_pad * col_pad) * kern_offs,
+        0,
+    )
+    in_pad_mp = t['in_pad_mp'] = np.where(pool_first, num_elements, 1) * multipass \
+        * (RD_STATE + TRAM_WRT)
+    in_dat_mp = t['in_dat_mp'] = np.where(
+        pool_first,
+        multipass * num_elements * (pool_size * RD_STATE + TRAM_WRT),
+        multipass * (num_elements * RD_STATE * pool_size + TRAM_WRT),
+    )
+    mp_multiplier = np.where(pool_first, 1, multipass)
+
+    col = t['col'] = 2 * col_pad * (in_pad_mp + WRT_STATE)
+    t['pad_row'] = mp_multiplier * img_pooled_cols * (in_pad_mp + WRT_STATE)
+    t['inp_pad_row'] = col + t['pad_row']
+    t['dat_row'] = mp_multiplier * img_pooled_cols * (in_dat_mp + WRT_STATE)
+    t['inp_dat_row_no_conv'] = col + t['dat_row']
+
+    t['left_col_pad'] = col_pad * (in_pad_mp + WRT_STATE)
+    t['data_no_conv'] = mp_multiplier * (kern_cols - 1 - col_pad) * (in_dat_mp + WRT_STATE)
+    t['data_conv'] = mp_multiplier * (output_cols - col_pad) * in_dat_mp
+    t['right_pad'] = in_pad_mp * col_pad
+    t['inp_dat_row_conv'] = t['left_col_pad'] + t['data_no_conv'] + t['data_conv'] \
+        + t['right_pad']
+
+    t['pad_no_conv'] = mp_multiplier * (kern_cols - 1 - col_pad) * (in_pad_mp + WRT_STATE)
+    t['pad_conv'] = mp_multiplier * (output_cols - col_pad) * in_pad_mp
+    t['inp_pad_bottom_row'] = t['left_col_pad'] + t['pad_no_conv'] + t['pad_conv'] \
+        + t['right_pad']
+
+    # Output processing
+    out_dat = t['out_dat'] = np.where(
+        passthrough,
+        multipass * img_pooled_rows * img_pooled_cols,
+        multipass * output_cols * output_chan + output_chan * t['meq_one'],
+    )
+
+    # Frame equation
+    total = np.where(
+        passthrough,
+        img_pooled_rows * img_pooled_cols * (in_dat_mp + multipass * pass_out_chan),
+        t['flatten_adj'] + t['pre_read'] + row_pad * t['inp_pad_row']
+        + (kern_rows - 1 - row_pad) * t['inp_dat_row_no_conv']
+        + (t['inp_dat_row_conv'] + out_dat) * (img_pooled_rows - (kern_rows - 1 - row_pad))
+        + row_pad * (t['inp_pad_bottom_row'] + out_dat),
+    )
+    t['total'] = np.where(streaming, (15 * total + 9) // 10, total)  # 1.5x regular layer
+    return t
+
+
+def cycles(
+        pool: ArrayLike,
+        pooled_dim: ArrayLike,
+        multipass: ArrayLike,
+        output_chan: ArrayLike,
+        output_dim: ArrayLike,
+        kernel_size: ArrayLike,
+        padding: ArrayLike,
+        num_elements: ArrayLike,
+        pool_first: ArrayLike,
+        passthrough: ArrayLike,
+        pass_out_chan: ArrayLike,
+        flatten: ArrayLike,
+        streaming: ArrayLike,
+        kern_offs: ArrayLike,
+) -> np.ndarray:
+    """
+    Return the latency in cycles for each layer, where each argument has one entry per layer
+    (see `calculate()`). Streaming layers return an estimate.
+    """
+    return terms(
+        pool=np.asarray(pool, dtype=np.int64).reshape(-1, 2),
+        pooled_dim=np.asarray(pooled_dim, dtype=np.int64).reshape(-1, 2),
+        multipass=np.asarray(multipass, dtype=np.int64),
+        output_chan=np.asarray(output_chan, dtype=np.int64),
+        output_dim=np.asarray(output_dim, dtype=np.int64).reshape(-1, 2),
+        kernel_size=np.asarray(kernel_size, dtype=np.int64).reshape(-1, 2),
+        padding=np.asarray(padding, dtype=np.int64).reshape(-1, 2),
+        num_elements=np.asarray(num_elements, dtype=np.int64),
+        pool_first=np.asarray(pool_first, dtype=bool),
+        passthrough=np.asarray(passthrough, dtype=bool),
+        pass_out_chan=np.asarray(pass_out_chan, dtype=np.int64),
+        flatten=np.asarray(flatten, dtype=bool),
+        streaming=np.asarray(streaming, dtype=bool),
+        kern_offs=np.asarray(kern_offs, dtype=np.int64),
+    )['total']
 
 
 def calculate(
@@ -30,10 +178,32 @@ def calculate(
         flatten: bool,
         streaming: bool,
         kern_offs: int,
+        detail: bool = True,
 ) -> Tuple[int, str]:
     """
     Calculate the latency in cycles for a single layer with the arguments given.
+    The detailed calculation is returned as a string when `detail` is `True`.
     """
+    t = {k: int(v) for k, v in terms(
+        pool=np.array(pool),
+        pooled_dim=np.array(pooled_dim),
+        multipass=np.array(multipass),
+        output_chan=np.array(output_chan),
+        output_dim=np.array(output_dim),
+        kernel_size=np.array(kernel_size),
+        padding=np.array(padding),
+        num_elements=np.array(num_elements),
+        pool_first=np.array(pool_first),
+        passthrough=np.array(passthrough),
+        pass_out_chan=np.array(pass_out_chan),
+        flatten=np.array(flatten),
+        streaming=np.array(streaming),
+        kern_offs=np.array(kern_offs),
+    ).items()}
+    total = t['total']
+    if not detail:
+        return total, ''
+
     # Input
     img_rows, img_cols = input_dim
     pool_rows, pool_cols = pool
@@ -52,102 +222,174 @@ def calculate(
         f'Kernel size{kern_rows:27}{kern_cols:11}\n' \
         f'Output dimensions{output_chan:10}{output_rows:11}{output_cols:11}\n\n'
 
-    rd_state: int = 1
-    tram_wrt: int = 1
-    wrt_state: int = 1
-    dummy_clock: int = 1
-    flatten_adj: int = 1 if flatten else 0  # FIXME
-    meq_one: int = 1 if output_chan == 1 and multipass == 1 else 0
-
     s += f'Multipass{multipass:18}\n' \
         f'NumElements{num_elements:16}\n' \
         f'PoolFirst{pool_first:18}\n' \
         f'Passthrough{passthrough:16}\n' \
-        f'RdState{rd_state:20}\n' \
-        f'TRAMWrt{tram_wrt:20}\n' \
-        f'WrtState{wrt_state:19}\n' \
-        f'DummyClock{dummy_clock:17}\n' \
+        f'RdState{RD_STATE:20}\n' \
+        f'TRAMWrt{TRAM_WRT:20}\n' \
+        f'WrtState{WRT_STATE:19}\n' \
+        f'DummyClock{DUMMY_CLOCK:17}\n' \
         f'PassOutChan{pass_out_chan:16}\n' \
-        f'MeqOne{meq_one:21}\n' \
-        f'FlattenAdj{flatten_adj:17}\n\n'
+        f'MeqOne{t["meq_one"]:21}\n' \
+        f'FlattenAdj{t["flatten_adj"]:17}\n\n'
 
-    pre_read: int = 0
-    # Input processing
     if pool_first:
-        in_pad_mp: int = multipass * num_elements * (rd_state + tram_wrt)
-        in_dat_mp: int = multipass * num_elements * ((pool[0] * pool[1] * rd_state) + tram_wrt)
-        mp_multiplier: int = 1
-
-        s += f'InPadMPPoolElt{in_pad_mp:13}\n' \
-            f'InDatMPPoolElt{in_dat_mp:13}\n\n'
+        s += f'InPadMPPoolElt{t["in_pad_mp"]:13}\n' \
+            f'InDatMPPoolElt{t["in_dat_mp"]:13}\n\n'
     else:  # Implies pooling > 1,1
         assert tc.dev is not None
         if tc.dev.REQUIRE_MP_KERNOFF_MULTIWRITE \
            and (multipass > 1 or num_elements > 1):
-            pre_read = ((pooled_dim[0] + 2*row_pad - kern_cols + 1) * col_pad
-                        + (pooled_dim[1] + 2*col_pad - kern_rows + 1) * row_pad
-                        - row_pad * col_pad) * kern_offs
-            s += f'PreRead{pre_read:20}\n'
-        in_pad_mp = multipass * (rd_state + tram_wrt)
-        in_dat_mp = multipass * ((num_elements * rd_state * pool[0] * pool[1]) + tram_wrt)
-        mp_multiplier = multipass
-
-        s += f'InPadMPEltPool{in_pad_mp:13}\n' \
-            f'InDatMPEltPool{in_dat_mp:13}\n\n'
-
-    col: int = 2 * col_pad * (in_pad_mp + wrt_state)
-    row: int = mp_multiplier * img_pooled_cols * (in_pad_mp + wrt_state)
-
-    inp_pad_row: int = col + row
+            s += f'PreRead{t["pre_read"]:20}\n'
+        s += f'InPadMPEltPool{t["in_pad_mp"]:13}\n' \
+            f'InDatMPEltPool{t["in_dat_mp"]:13}\n\n'
 
     s += '                      Total    Col Pad   Row Data\n' \
-        f'First Row Pad{inp_pad_row:14}{col:11}{row:11}\n'
+        f'First Row Pad{t["inp_pad_row"]:14}{t["col"]:11}{t["pad_row"]:11}\n' \
+        f'Row Data (No Conv){t["inp_dat_row_no_conv"]:9}{t["col"]:11}{t["dat_row"]:11}\n'
 
-    row = mp_multiplier * img_pooled_cols * (in_dat_mp + wrt_state)
-    inp_dat_row_no_conv: int = col + row
+    s += '                      Total   Left Pad   Data NoC  Data Conv  Right Pad\n' \
+        f'Row Data{t["inp_dat_row_conv"]:19}{t["left_col_pad"]:11}' \
+        f'{t["data_no_conv"]:11}{t["data_conv"]:11}{t["right_pad"]:11}\n' \
+        f'Bottom Pad Row{t["inp_pad_bottom_row"]:13}{t["left_col_pad"]:11}' \
+        f'{t["pad_no_conv"]:11}{t["pad_conv"]:11}{t["right_pad"]:11}\n\n'
 
-    s += f'Row Data (No Conv){inp_dat_row_no_conv:9}{col:11}{row:11}\n'
+    s += f'Data Row{t["out_dat"]:19}\n\n'
 
-    left_col_pad: int = col_pad * (in_pad_mp + wrt_state)
-    data_no_conv: int = mp_multiplier * (kern_cols - 1 - col_pad) * (in_dat_mp + wrt_state)
-    data_conv: int = mp_multiplier * (output_cols - col_pad) * in_dat_mp
-    right_pad: int = in_pad_mp * col_pad
+    if not streaming:
+        s += f'Layer Subtotal{total:13}\n'
+    else:
+        s += f'Layer Subtotal{total:13} (streaming estimate)\n'
 
-    inp_dat_row_conv: int = left_col_pad + data_no_conv + data_conv + right_pad
+    return total, s
 
-    s += '                      Total   Left Pad   Data NoC  Data Conv  Right Pad\n' \
-        f'Row Data{inp_dat_row_conv:19}{left_col_pad:11}' \
-        f'{data_no_conv:11}{data_conv:11}{right_pad:11}\n'
 
-    data_no_conv = mp_multiplier * (kern_cols - 1 - col_pad) * (in_pad_mp + wrt_state)
-    data_conv = mp_multiplier * (output_cols - col_pad) * in_pad_mp
+def network(
+        input_chan: Sequence[int],
+        pooled_dim: Sequence[Tuple[int, int]],
+        output_chan: Sequence[int],
+        output_dim: Sequence[Tuple[int, int]],
+        kernel_size: Sequence[Tuple[int, int]],
+        padding: Sequence[Tuple[int, int]],
+        pool: Sequence[Tuple[int, int]],
+        stride: Sequence[Tuple[int, int]],
+        operator: Sequence[int],
+        operands: Sequence[int],
+        pool_first: Sequence[bool],
+        flatten: Sequence[bool],
+        streaming: Sequence[bool],
+        processor_map: Sequence[int],
+        output_processor_map: Sequence[int],
+        output_width: Sequence[int],
+        layers: Optional[Sequence[int]] = None,
+) -> Estimate:
+    """
+    Estimate the latency of a network from its parsed configuration, i.e., the per-layer
+    lists that the YAML file and the checkpoint shapes define, for the `layers` given
+    (default: all layers). No simulation or code generation is needed.
+    Kernel placement is not known at this point, so the estimate does not include the
+    pre-read for multi-pass layers on devices that require it, and layers that the backend
+    maps to different hardware operators (for example, dilated Conv1d) use the configured
+    operator.
+    """
+    assert tc.dev is not None
+    if layers is None:
+        layers = range(len(input_chan))
+    layers = list(layers)
+
+    hw_output_chan = []
+    hw_pooled_dim = []
+    hw_output_dim = []
+    hw_padding = []
+    multipass = []
+    pass_out_chan = []
+    hw_flatten = []
+    for ll in layers:
+        in_expand = (input_chan[ll] + tc.dev.MAX_PROC - 1) // tc.dev.MAX_PROC
+        out_expand = (output_chan[ll] + tc.dev.MAX_PROC - 1) // tc.dev.MAX_PROC
+        pooled_size = pooled_dim[ll][0] * pooled_dim[ll][1]
 
-    inp_pad_bottom_row: int = left_col_pad + data_no_conv + data_conv + right_pad
+        if operator[ll] == op.CONVTRANSPOSE2D:
+            hw_pooled_dim.append((pooled_dim[ll][0] * stride[ll][0],
+                                  pooled_dim[ll][1] * stride[ll][1]))
+            # Padding is flipped around to match PyTorch conventions for ConvTranspose2d
+            hw_padding.append((kernel_size[ll][0] - 1 - padding[ll][0],
+                               kernel_size[ll][1] - 1 - padding[ll][1]))
+        else:
+            hw_pooled_dim.append(pooled_dim[ll])
+            hw_padding.append(padding[ll])
 
-    s += f'Bottom Pad Row{inp_pad_bottom_row:13}{left_col_pad:11}' \
-        f'{data_no_conv:11}{data_conv:11}{right_pad:11}\n\n'
+        if operator[ll] == op.NONE or flatten[ll]:
+            hw_output_chan.append(output_chan[ll])
+        else:
+            # The hardware computes the output channels for all processors between the first
+            # and the last output processor, starting at the first of 4 shared processors
+            first_output_proc = ffs(output_processor_map[ll])
+            start_col = first_output_proc % tc.dev.P_SHARED
+            if out_expand > 1:
+                first_output_proc -= start_col
+            hw_output_chan.append((1 + fls(output_processor_map[ll]) - first_output_proc
+                                   + start_col) * out_expand)
 
-    # Output processing
-    if passthrough:
-        out_dat: int = multipass * img_pooled_rows * img_pooled_cols
-    else:
-        out_dat = multipass * output_cols * output_chan + output_chan * meq_one
+        if tc.dev.REQUIRE_2X_MP_PASSTHROUGH and operator[ll] == op.NONE \
+           and out_expand > 1 and (pool[ll][0] > 1 or pool[ll][1] > 1):
+            multipass.append(2 * in_expand - 1)
+        else:
+            multipass.append(in_expand)
 
-    s += f'Data Row{out_dat:19}\n\n'
+        # For passthrough, the time slot count is the maximum across all used groups
+        timeslots = 1
+        if operator[ll] == op.NONE:
+            for group in range(tc.dev.P_NUMGROUPS):
+                count = popcount(processor_map[ll] >> group * tc.dev.P_NUMPRO
+                                 & 2**tc.dev.P_NUMPRO - 1)
+                if count != 0:
+                    timeslots = max(timeslots, (count * output_width[ll] // 8 - 1) // 4 + 1)
+        if flatten[ll]:
+            timeslots *= pooled_size
+            hw_output_dim.append((output_dim[ll][0] * pooled_dim[ll][0],
+                                  output_dim[ll][1] * pooled_dim[ll][1]))
+        else:
+            hw_output_dim.append(output_dim[ll])
+        pass_out_chan.append(timeslots)
+        hw_flatten.append(flatten[ll] and in_expand * pooled_size - 1 >= 2**4)
 
-    # Frame equation
-    if passthrough:
-        total: int = img_pooled_rows * img_pooled_cols * (in_dat_mp + multipass * pass_out_chan)
-    else:
-        total = flatten_adj + pre_read + row_pad * inp_pad_row + \
-            ((kern_rows - 1 - row_pad) * inp_dat_row_no_conv) + \
-            (inp_dat_row_conv + out_dat) * (img_pooled_rows - (kern_rows - 1 - row_pad)) + \
-            row_pad * (inp_pad_bottom_row + out_dat)
+    latency = cycles(
+        pool=[pool[ll] for ll in layers],
+        pooled_dim=hw_pooled_dim,
+        multipass=multipass,
+        output_chan=hw_output_chan,
+        output_dim=hw_output_dim,
+        kernel_size=[kernel_size[ll] for ll in layers],
+        padding=hw_padding,
+        num_elements=[operands[ll] for ll in layers],
+        pool_first=[pool_first[ll] for ll in layers],
+        passthrough=[operator[ll] == op.NONE for ll in layers],
+        pass_out_chan=pass_out_chan,
+        flatten=hw_flatten,
+        streaming=[streaming[ll] for ll in layers],
+        kern_offs=[0] * len(layers),
+    )
+    is_streaming = np.array([streaming[ll] for ll in layers], dtype=bool)
+    return Estimate(layers=layers, cycles=latency, streaming=is_streaming,
+                    total=1 + int(latency.sum()))
 
-    if not streaming:
-        s += f'Layer Subtotal{total:13}\n'
-    else:
-        total = (15 * total + 9) // 10  # 1.5x regular layer
-        s += f'Layer Subtotal{total:13} (streaming estimate)\n'
 
-    return total, s
+def report(
+        estimate: Estimate,
+        names: Optional[Sequence[str]] = None,
+) -> str:
+    """
+    Return a printable report for the latency `estimate`, using the layer `names` if given.
+    """
+    if names is None:
+        names = [str(ll) for ll in estimate.layers]
+    rv = 'ESTIMATED LATENCY\n' \
+        f'{"Startup":9}{1:18,}\n'
+    for name, layer_lat, est in zip(names, estimate.cycles.tolist(),
+                                    estimate.streaming.tolist()):
+        rv += f'{"Layer " + name:9}{layer_lat:18,}{" (est)" if est else ""}\n'
+    rv += '                 ==========\n' \
+        f'Total{estimate.total:22,} cycles{" (est)" if estimate.streaming.any() else ""}\n'
+    return rv
@@ -1,5 +1,5 @@
 ###################################################################################################
-# Copyright (C) 2019-2021 Maxim Integrated Products, Inc. All Rights Reserved.
+# Copyright (C) 2019-2024 Maxim Integrated Products, Inc. All Rights Reserved.
 #
 # Maxim Integrated Products, Inc. Default Copyright Notice:
 # https://www.maximintegrated.com/en/aboutus/legal/copyrights.html
@@ -7,7 +7,7 @@
 """
 Load Tornado CNN data memory
 """
-from typing import List
+from typing import List, Tuple
 
 import numpy as np
 
@@ -17,6 +17,71 @@ from .eprint import eprint
 from .utils import popcount, s2u
 
 
+def pack_bytes(
+        data: np.ndarray,
+) -> np.ndarray:
+    """
+    Pack the bytes (signed or unsigned) along the last axis of `data` into little endian 32-bit
+    words, and pad the last word with zeros.
+    """
+    data = np.asarray(data, dtype=np.int64)
+    padded = np.zeros(data.shape[:-1] + ((data.shape[-1] + 3) & ~3,), dtype=np.uint8)
+    padded[..., :data.shape[-1]] = data & 0xff
+    return padded.view('<u4').astype(np.uint32)
+
+
+def hwc_words(
+        data: np.ndarray,
+        input_chan: int,
+        c: int,
+        instance_map: int,
+        operands: int = 1,
+) -> np.ndarray:
+    """
+    Return the HWC words for the processors in the 4-bit `instance_map`, starting at channel
+    `c` of the `input_chan` channels of each of the `operands` in `data`. The result has one
+    row per pixel and one column per operand.
+    """
+    pixels = data.shape[1] * data.shape[2]
+    channels = np.asarray(data, dtype=np.int64).reshape(-1, pixels)
+    word_bytes = np.zeros((pixels, operands, 4), dtype=np.uint8)
+    this_c = c
+    for i in range(4):
+        if instance_map & 2**i:
+            if this_c < len(data) // operands:
+                word_bytes[:, :, i] = \
+                    channels[this_c + np.arange(operands) * input_chan].T & 0xff
+            this_c += 1
+    return word_bytes.view('<u4')[..., 0].astype(np.uint32)
+
+
+def fifo_routing(
+        processor_map: int,
+        count: int,
+        chw: bool,
+) -> List[Tuple[int, int]]:
+    """
+    Return the FIFO and the 4-bit instance map for each of the `count` channels (CHW, if `chw`
+    is `True`) or groups of four channels (HWC) that are loaded into FIFOs for `processor_map`.
+    Each FIFO feeds one group of 16 processors, and the assignment wraps around to the first
+    FIFO when the processor map is exhausted.
+    """
+    routing = []
+    pmap = 0
+    fifo = 0
+    for _ in range(count):
+        if pmap == 0:
+            pmap = processor_map
+            fifo = 0
+        while pmap & (0x01 if chw else 0x0f) == 0:
+            pmap >>= 16
+            fifo += 1
+        routing.append((fifo, pmap & 0x0f))
+        pmap >>= 16
+        fifo += 1
+    return routing
+
+
 def load(
         embedded_code,
         apb,
@@ -131,30 +196,18 @@ def load(
             if embedded_code and split == 1:
                 # Create optimized code when we're not splitting the input
                 apb.output(f'// CHW {input_size[1]}x{input_size[2]}, channel {c}\n')
-                offs = 0
-                code_buffer = np.zeros((input_size[1] * input_size[2] + 3) // 4, dtype=np.int64)
                 addr = data_offs
-
-                val = 0
-                for row in range(input_size[1]):
-                    for col in range(input_size[2]):
-                        shift = (row * input_size[2] + col) % 4
-                        val |= (s2u(data[c][row][col]) & 0xff) << (shift * 8)
-                        if shift == 3:
-                            datamem.store(out_map, data_offs & ~3, (-1, c, row, col),
-                                          check_overwrite=True)
-                            code_buffer[offs] = val
-                            offs += 1
-                            val = 0
-                        data_offs += 1
-                        if data_offs & ~3 == 0:
-                            data_offs += 4 * (in_expand - 1)
-
-                if shift != 3:
-                    datamem.store(out_map, data_offs & ~3, (-1, c, row, col),
-                                  check_overwrite=True)
-                    code_buffer[offs] = val
-                    offs += 1
+                code_buffer = pack_bytes(data[c].reshape(-1))
+                offs = len(code_buffer)
+
+                # Each word is recorded with the position of its last byte
+                pixels = input_size[1] * input_size[2]
+                last = np.minimum(np.arange(3, 4 * offs, 4), pixels - 1)
+                row, col = np.divmod(last, input_size[2])
+                datamem.store_many(out_map,
+                                   np.where(last % 4 == 3, addr + last, addr + pixels) & ~3,
+                                   -1, c, row, col, check_overwrite=True)
+                data_offs += pixels
 
                 if not fixed_input:
                     b = code_buffer if synthesize is None else code_buffer[:state.synthesize_words]
@@ -226,35 +279,22 @@ def load(
                 apb.output(f'// HWC {input_size[1]}x{input_size[2]}, '
                            f'channels {c} to {c+num_ch-1}\n')
 
-            if embedded_code:
-                offs = 0
-                code_buffer = np.zeros(operands * input_size[1] * input_size[2], dtype=np.int64)
-                addr = data_offs
-
-            for row in range(input_size[1]):
-                for col in range(input_size[2]):
-                    for op in range(operands):
-                        # Always write multiple of four bytes even for last input
-                        # Handle gaps and fill with 0
-                        val = 0
-                        this_c = c
-                        for i in range(4):
-                            if instance_map & 2**i:
-                                if this_c < len(data) // operands:
-                                    val |= (s2u(data[this_c + op*input_size[0]][row][col])
-                                            & 0xff) << (i * 8)
-                                this_c += 1
-
-                        datamem.store(out_map, data_offs, (-1, this_c, row, col),
-                                      check_overwrite=True)
-                        if not embedded_code:
-                            apb.write_data(data_offs, val)
-                        else:
-                            code_buffer[offs] = val
-                            offs += 1
-                        apb.data_offs = data_offs  # For mixed HWC/CHW operation
-                        data_offs += 4
-                    data_offs += 4 * (in_expand - 1) * operands
+            # Always write multiple of four bytes even for last input. Handle gaps and fill with 0
+            pixels = input_size[1] * input_size[2]
+            code_buffer = hwc_words(data, input_size[0], c, instance_map, operands).reshape(-1)
+            addr = data_offs
+            offs = len(code_buffer)
+            pixel, op = np.divmod(np.arange(pixels * operands), operands)
+            word_offs = addr + 4 * (pixel * in_expand * operands + op)
+            row, col = np.divmod(pixel, input_size[2])
+            datamem.store_many(out_map, word_offs, -1, c + num_ch, row, col,
+                               check_overwrite=True)
+            if not embedded_code:
+                for woffs, val in zip(word_offs.tolist(), code_buffer.tolist()):
+                    apb.write_data(woffs, val)
+            if pixels > 0:
+                apb.data_offs = int(word_offs[-1])  # For mixed HWC/CHW operation
+            data_offs += 4 * pixels * in_expand * operands
 
             if embedded_code:
                 proc = ch % tc.dev.MAX_PROC
@@ -263,18 +303,16 @@ def load(
                 buffer_list[proc].append((code_buffer, addr, c, c+num_ch-1))
 
                 if expand == in_expand-1:
-                    # Big buffer holds the multi-pass data
-                    buf = np.zeros((expand + 1) * operands * input_size[1] * input_size[2],
-                                   dtype=np.int64)
+                    # Big buffer holds the multi-pass data, interleaved by pixel
+                    buf = np.zeros((input_size[1] * input_size[2], expand + 1, operands),
+                                   dtype=np.uint32)
 
                     # Merge all buffers into big buffer
                     for i, e in enumerate(buffer_list[proc]):
                         apb.output(f'// HWC {input_size[1]}x{input_size[2]}, '
                                    f'channels {e[2]} to {e[3]}\n')
-                        for j, val in enumerate(e[0]):
-                            target = i * operands + (j // operands) * in_expand * operands \
-                                + j % operands
-                            buf[target] = val
+                        buf[:, i, :] = e[0].reshape(-1, operands)
+                    buf = buf.reshape(-1)
 
                     if not fixed_input:
                         b = buf if synthesize is None else buf[:state.synthesize_words]
@@ -362,36 +400,21 @@ def loadfifo(
             apb.output(f' total / {input_size[1]*input_size[2]} bytes per channel')
         apb.output('):\n')
 
-        if embedded_code:
-            code_buffer = np.zeros((input_size[0], (input_size[1] * input_size[2] + 3) // 4),
-                                   dtype=np.int64)
-
-        for row_col in range(0, input_size[1] * input_size[2], 4):
-            pmap = 0
-            for c in range(input_size[0]):
-                if pmap == 0:
-                    pmap = processor_map
-                    fifo = 0
-                while pmap & 1 == 0:
-                    pmap >>= 16
-                    fifo += 1
-                val = 0
-                for b in range(4):
-                    if row_col + b < input_size[1] * input_size[2]:
-                        row, col = divmod(row_col + b, input_size[2])
-                        val |= (s2u(data[c][row][col]) & 0xff) << b * 8
-                if not embedded_code:
+        # The FIFO for each channel depends only on the processor map
+        routing = fifo_routing(processor_map, input_size[0], chw=True)
+        words = pack_bytes(np.asarray(data[:input_size[0]]).reshape(input_size[0], -1))
+
+        if not embedded_code:
+            for row_words in words.T.tolist():
+                for val, (fifo, _) in zip(row_words, routing):
                     apb.write(0, val, '', fifo=fifo, fifo_wait=state.fifo_wait)
                     for _ in range(state.slow_load):
                         apb.output('  asm volatile("nop");\n')
-                else:
-                    code_buffer[fifo][row_col // 4] = val
-
-                pmap >>= 16
-                fifo += 1
-
-        if embedded_code:
+        else:
             fifos = input_size[0]
+            code_buffer = np.zeros((fifos, words.shape[1]), dtype=np.int64)
+            for c, (fifo, _) in enumerate(routing):
+                code_buffer[fifo] = words[c]
     else:
         # HWC ("Little Data") - (Up to) four channels packed into a word (0BGR0BGR0BGR0BGR0BGR....)
         apb.output('// Data input: HWC '
@@ -401,36 +424,26 @@ def loadfifo(
             apb.output(f' total / {input_size[1]*input_size[2]} bytes per channel')
         apb.output('):\n')
 
-        if embedded_code:
-            code_buffer = np.zeros(((input_size[0] + 3) // 4, input_size[1] * input_size[2]),
-                                   dtype=np.int64)
-
-        for row in range(input_size[1]):
-            for col in range(input_size[2]):
-                pmap = 0
-                for c in range(0, input_size[0], 4):
-                    if pmap == 0:
-                        pmap = processor_map
-                        fifo = 0
-                    while pmap & 0x0f == 0:
-                        pmap >>= 16
-                        fifo += 1
-                    val = 0
-                    for b in range(4):
-                        if pmap & 1 != 0 and c + b < input_size[0]:
-                            val |= (s2u(data[c + b][row][col]) & 0xff) << b * 8
-                        pmap >>= 1
-                    if not embedded_code:
-                        apb.write(0, val, '', fifo=fifo, fifo_wait=state.fifo_wait)
-                        for _ in range(state.slow_load):
-                            apb.output('  asm volatile("nop");\n')
-                    else:
-                        code_buffer[fifo][row * input_size[2] + col] = val
-                    pmap >>= 12
-                    fifo += 1
-
-        if embedded_code:
-            fifos = (input_size[0] + 3) // 4
+        # The FIFO and the enabled processors for each group of four channels depend only on
+        # the processor map
+        routing = fifo_routing(processor_map, (input_size[0] + 3) // 4, chw=False)
+        words = np.empty((len(routing), input_size[1] * input_size[2]), dtype=np.int64)
+        for i, (_, instance_map) in enumerate(routing):
+            byte_mask = sum(0xff << b * 8 for b in range(4) if instance_map & 1 << b)
+            words[i] = hwc_words(data[:input_size[0]], input_size[0], i * 4, 0x0f)[:, 0] \
+                & byte_mask
+
+        if not embedded_code:
+            for pixel_words in words.T.tolist():
+                for val, (fifo, _) in zip(pixel_words, routing):
+                    apb.write(0, val, '', fifo=fifo, fifo_wait=state.fifo_wait)
+                    for _ in range(state.slow_load):
+                        apb.output('  asm volatile("nop");\n')
+        else:
+            fifos = len(routing)
+            code_buffer = np.zeros((fifos, words.shape[1]), dtype=np.int64)
+            for i, (fifo, _) in enumerate(routing):
+                code_buffer[fifo] = words[i]
 
     if embedded_code:
         for c in range(fifos):
@@ -607,39 +620,21 @@ def loadcsv(
 
         apb.output('}\n\n')
 
-        with open(csv_file, mode='w', encoding='utf-8') as f:
-            camera.header(f)
-
-            if camera_format == 888:
-                for row in range(input_size[1]):
-                    for col in range(input_size[2]):
-                        for c in range(0, input_size[0]):
-                            camera.pixel(f, s2u(data[c][row][col]) & 0xff)
-                    if chw:
-                        # Round up so we have a full 4 bytes
-                        for _ in range(input_size[2] % 4):
-                            for _ in range(0, input_size[0]):
-                                camera.pixel(f, 0)
-                    camera.finish_row(f, retrace=state.input_csv_retrace)
-            elif camera_format == 555:
-                for row in range(input_size[1]):
-                    for col in range(input_size[2]):
-                        w = (s2u(data[0][row][col]) & 0xf8) << 7 \
-                            | (s2u(data[1][row][col]) & 0xf8) << 2 \
-                            | (s2u(data[2][row][col]) & 0xf8) >> 3
-                        camera.pixel(f, w >> 8 & 0xff)
-                        camera.pixel(f, w & 0xff)
-                    camera.finish_row(f, retrace=state.input_csv_retrace)
-            elif camera_format == 565:
-                for row in range(input_size[1]):
-                    for col in range(input_size[2]):
-                        w = (s2u(data[0][row][col]) & 0xf8) << 8 \
-                            | (s2u(data[1][row][col]) & 0xfc) << 3 \
-                            | (s2u(data[2][row][col]) & 0xf8) >> 3
-                        camera.pixel(f, w >> 8 & 0xff)
-                        camera.pixel(f, w & 0xff)
-                    camera.finish_row(f, retrace=state.input_csv_retrace)
+        # One row of camera data bytes per image row
+        data = np.asarray(data[:input_size[0]], dtype=np.int64)
+        if camera_format == 888:
+            pixels = data.transpose(1, 2, 0).reshape(input_size[1], -1) & 0xff
+            if chw:
+                # Round up so we have a full 4 bytes
+                pixels = np.pad(pixels, ((0, 0), (0, input_size[2] % 4 * input_size[0])))
+        elif camera_format in (555, 565):
+            if camera_format == 555:
+                w = (data[0] & 0xf8) << 7 | (data[1] & 0xf8) << 2 | (data[2] & 0xf8) >> 3
             else:
-                raise RuntimeError(f'Unknown camera format {camera_format}')
+                w = (data[0] & 0xf8) << 8 | (data[1] & 0xfc) << 3 | (data[2] & 0xf8) >> 3
+            pixels = np.stack((w >> 8 & 0xff, w & 0xff), axis=-1).reshape(input_size[1], -1)
+        else:
+            raise RuntimeError(f'Unknown camera format {camera_format}')
 
-            camera.finish_image(f)
+        camera.save(csv_file, camera.image(pixels, retrace=state.input_csv_retrace),
+                    binary=state.input_csv_binary)
@@ -1,5 +1,5 @@
 ###################################################################################################
-# Copyright (C) 2019-2023 Maxim Integrated Products, Inc. All Rights Reserved.
+# Copyright (C) 2019-2024 Maxim Integrated Products, Inc. All Rights Reserved.
 #
 # Maxim Integrated Products, Inc. Default Copyright Notice:
 # https://www.maximintegrated.com/en/aboutus/legal/copyrights.html
@@ -379,6 +379,15 @@ def create_runtest_sv(
                 runfile.write('logic hsync_val;\n')
                 runfile.write('logic vsync_val;\n')
                 runfile.write('logic [11:0] data_val;\n\n')
+                if state.input_csv_binary:
+                    # Big endian 16-bit words {5'b0, vsync, href, pclk, d[7:0]}
+                    runfile.write('logic [15:0] sample;\n\n')
+                    csv_read = '      if ($fread(sample, input_file) == 2)\n' \
+                        '        {vsync_val, hsync_val, pixclk_val, data_val} = ' \
+                        '{sample[10:8], 4\'b0, sample[7:0]};\n'
+                else:
+                    csv_read = '      $fscanf(input_file, "%H,%H,%H,%H", ' \
+                        'vsync_val, hsync_val, pixclk_val, data_val);\n'
                 runfile.write('assign `PCIF_PIXCLK  = pixclk_val;\n')
                 runfile.write('assign `PCIF_HSYNC   = hsync_val;\n')
                 runfile.write('assign `PCIF_VSYNC   = vsync_val;\n')
@@ -419,8 +428,7 @@ def create_runtest_sv(
                     runfile.write('always @(posedge clk_pix) begin\n')
                     runfile.write('  if (start_io) begin\n')
                     runfile.write('    if (!$feof(input_file)) begin\n')
-                    runfile.write('      $fscanf(input_file, "%H,%H,%H,%H", '
-                                  'vsync_val, hsync_val, pixclk_val, data_val);\n')
+                    runfile.write(csv_read)
                     runfile.write('    end else begin\n')
                     runfile.write('      end_of_file = 1;\n')
                     runfile.write('      start_io    = 0;\n')
@@ -434,7 +442,8 @@ def create_runtest_sv(
                 runfile.write('  hsync_val = 0;\n')
                 runfile.write('  vsync_val = 0;\n')
                 runfile.write('  data_val = \'0;\n')
-                runfile.write('  input_file = $fopen(`CSV_FILE, "r");\n')
+                runfile.write('  input_file = $fopen(`CSV_FILE, '
+                              f'"{"rb" if state.input_csv_binary else "r"}");\n')
 
                 if state.input_sync:
                     runfile.write('\n  start_io    = 0;\n')
@@ -447,7 +456,8 @@ def create_runtest_sv(
                 runfile.write('    $finish;\n')
                 runfile.write('  end\n\n')
                 runfile.write('  @(posedge sim.trig[0]);\n\n')
-                runfile.write('  $fgets(null_string, input_file);\n')
+                if not state.input_csv_binary:
+                    runfile.write('  $fgets(null_string, input_file);\n')
                 runfile.write('  $display("Reading camera image from %s", `CSV_FILE);\n')
 
                 if state.input_sync:
@@ -460,8 +470,7 @@ def create_runtest_sv(
                     runfile.write('\n  while (!$feof(input_file))\n')
                     runfile.write('    begin\n')
                     runfile.write('      count++;\n')
-                    runfile.write('      $fscanf(input_file, "%H,%H,%H,%H", '
-                                  'vsync_val, hsync_val, pixclk_val, data_val);\n')
+                    runfile.write(csv_read)
                     runfile.write(f'      #{state.input_csv_period}ns;\n')
                     runfile.write('    end\n')
 
@@ -1,5 +1,5 @@
 ###################################################################################################
-# Copyright (C) 2020-2022 Maxim Integrated Products, Inc. All Rights Reserved.
+# Copyright (C) 2020-2024 Maxim Integrated Products, Inc. All Rights Reserved.
 #
 # Maxim Integrated Products, Inc. Default Copyright Notice:
 # https://www.maximintegrated.com/en/aboutus/legal/copyrights.html
@@ -15,7 +15,35 @@ import numpy as np
 
 from . import stats
 from .eprint import eprint
-from .utils import s2u, u2s
+
+
+def synthesize(
+        data: np.ndarray,
+        pixels: int,
+        synthesize_input: int,
+) -> np.ndarray:
+    """
+    Return `pixels` pixels for each of the 1 to 4 channels of the first words in `data`
+    (channels x words). Each subsequent set of words is the previous set plus
+    `synthesize_input`, added to the combined 32-bit word for all channels.
+    """
+    channels, words = data.shape
+    mask = (1 << channels * 8) - 1
+
+    first = np.zeros(words, dtype=np.int64)
+    for c in range(channels - 1, -1, -1):
+        first = first << 8 | np.where(data[c] < 0, data[c] + 256, data[c])
+
+    # Set k is the first set plus k times `synthesize_input`
+    steps = np.arange(pixels // words, dtype=np.int64)
+    vals = ((first + steps[:, np.newaxis] * (synthesize_input & mask)) & mask).reshape(-1)
+
+    rv = np.empty((channels, pixels), dtype=np.int64)
+    for c in range(channels):
+        val = vals >> c * 8 & 0xff
+        rv[c] = np.where(val > 127, val - 256, val)
+    rv[:, :words] = data
+    return rv
 
 
 def get(
@@ -34,7 +62,8 @@ def get(
     # np.save(os.path.join('tests', f'sample_{dataset}'), data,
     #         allow_pickle=False, fix_imports=False)
 
-    data = np.load(filename)
+    # Map the file, so that only the first words are read when synthesizing the input
+    data = np.load(filename, mmap_mode='r')
     if data.dtype.type is not np.dtype('int64').type:
         eprint(f'The sample data array in {filename} is of type {data.dtype}, rather than '
                'int64!')
@@ -51,23 +80,38 @@ def get(
         if data.shape[1] % synthesize_words != 0:
             eprint('`--synthesize-words` must be a divisor of the number of pixels per channel '
                    f'({data.shape[1]}).')
-        if shape[0] == 3:
-            mask = 0xffffff
-        elif shape[0] == 2:
-            mask = 0xffff
-        elif shape[0] == 1:
-            mask = 0xff
-        else:
-            mask = 0xffffffff
-        for i in range(synthesize_words, data.shape[1], synthesize_words):
-            for j in range(synthesize_words):
-                val = 0
-                for c in range(shape[0]-1, -1, -1):
-                    val = val << 8 | s2u(data[c, i+j-synthesize_words])
-                val += synthesize_input
-                val &= mask
-                for c in range(shape[0]-1, -1, -1):
-                    data[c, i+j] = u2s((val >> c * 8) & 0xff)
-        data = data.reshape(shape)
+        data = synthesize(data[:, :synthesize_words], data.shape[1],
+                          synthesize_input).reshape(shape)
+    else:
+        data = np.array(data)
+
+    return data
+
+
+def get_batch(
+        filename,
+        shape,
+):
+    """
+    Return a batch of sample inputs from the file name `filename` in channel-first format
+    (i.e., NCL, NCHW). Each sample must have the shape `shape` of the sample input.
+    """
+    if not os.path.exists(filename):
+        eprint(f'Sample batch file {filename} does not exist!')
+
+    data = np.load(filename)
+    if data.dtype.type is not np.dtype('int64').type:
+        eprint(f'The sample batch array in {filename} is of type {data.dtype}, rather than '
+               'int64!')
+    if np.max(data) > 127 or np.min(data) < -128:
+        eprint(f'Sample batch {filename} contains values that are outside the limits of '
+               f'signed 8-bit (data min={np.min(data)}, max={np.max(data)})!')
+
+    # Work with 1D input data
+    if data.ndim == len(shape) and data.shape[-1] != shape[-1]:
+        data = np.expand_dims(data, axis=-1)
+    if data.ndim != len(shape) + 1 or data.shape[1:] != tuple(shape):
+        eprint(f'The sample batch array in {filename} has shape {data.shape}, but the sample '
+               f'input requires N x {"x".join(str(d) for d in shape)}.')
 
     return data
@@ -0,0 +1,113 @@
+###################################################################################################
+# Copyright (C) 2024 Maxim Integrated Products, Inc. All Rights Reserved.
+#
+# Maxim Integrated Products, Inc. Default Copyright Notice:
+# https://www.maximintegrated.com/en/aboutus/legal/copyrights.html
+###################################################################################################
+"""
+Thread pool scheduler for the layer simulation. Tasks whose inputs are ready run concurrently,
+while the results (and anything the tasks print) are consumed in a deterministic order.
+"""
+import io
+import sys
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional
+
+
+class _ThreadOutput:
+    """
+    Stand-in for sys.stdout/sys.stderr that diverts writes from scheduler threads into a
+    per-task buffer, and passes everything else through to the original stream.
+    """
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()
+
+    def write(self, s):
+        """Write to the current task's buffer, or to the original stream"""
+        buffer = getattr(self.local, 'buffer', None)
+        if buffer is not None:
+            return buffer.write(s)
+        return self.stream.write(s)
+
+    def flush(self):
+        """Flush the original stream (task buffers are replayed later)"""
+        if getattr(self.local, 'buffer', None) is None:
+            self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+class Scheduler:
+    """
+    Run tasks on `threads` worker threads. Every task names the keys of the tasks it
+    depends on and receives their results. Tasks must be submitted in dependency order.
+
+    Use as a context manager. While active, sys.stdout and sys.stderr are redirected so
+    that output from a task is buffered and replayed when its result is retrieved with
+    `result()`, in the same order a sequential run would have produced it.
+    """
+    def __init__(self, threads: int):
+        self.executor = ThreadPoolExecutor(max_workers=threads,
+                                           thread_name_prefix='izer-sim')
+        self.futures: Dict[Hashable, Future] = {}
+        self.output: Dict[Hashable, Any] = {}
+        self.stdout: Optional[_ThreadOutput] = None
+        self.stderr: Optional[_ThreadOutput] = None
+
+    def __enter__(self):
+        self.stdout = _ThreadOutput(sys.stdout)
+        self.stderr = _ThreadOutput(sys.stderr)
+        sys.stdout = self.stdout
+        sys.stderr = self.stderr
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        assert self.stdout is not None and self.stderr is not None
+        sys.stdout = self.stdout.stream
+        sys.stderr = self.stderr.stream
+
+    def submit(
+            self,
+            key: Hashable,
+            func: Callable,
+            depends: Iterable[Hashable] = (),
+    ) -> None:
+        """
+        Schedule `func(results)` as task `key`, where `results` maps every key in `depends`
+        to the result of that task. Since tasks are submitted in dependency order and the
+        pool starts them in submission order, waiting for a dependency cannot deadlock.
+        """
+        futures = {d: self.futures[d] for d in depends}
+        buffer = self.output[key] = (io.StringIO(), io.StringIO())
+
+        def run():
+            assert self.stdout is not None and self.stderr is not None
+            results = {d: future.result() for d, future in futures.items()}
+            self.stdout.local.buffer, self.stderr.local.buffer = buffer
+            try:
+                return func(results)
+            finally:
+                self.stdout.local.buffer = self.stderr.local.buffer = None
+
+        self.futures[key] = self.executor.submit(run)
+
+    def result(
+            self,
+            key: Hashable,
+    ) -> Any:
+        """
+        Wait for task `key`, replay its output, and return its result (or raise its
+        exception).
+        """
+        future = self.futures[key]
+        exc = future.exception()
+        out, err = self.output.pop(key)
+        sys.stdout.write(out.getvalue())
+        sys.stderr.write(err.getvalue())
+        if exc is not None:
+            raise exc
+        return future.result()
@@ -1,5 +1,5 @@
 ###################################################################################################
-# Copyright (C) 2019-2023 Maxim Integrated Products, Inc. All Rights Reserved.
+# Copyright (C) 2019-2024 Maxim Integrated Products, Inc. All Rights Reserved.
 #
 # Maxim Integrated Products, Inc. Default Copyright Notice:
 # https://www.maximintegrated.com/en/aboutus/legal/copyrights.html
@@ -14,7 +14,8 @@ import numpy as np
 from . import op, state, stats
 from . import tornadocnn as tc
 from .compute import conv1d, conv2d, convtranspose2d, eltwise, linear, pool1d, pool2d
-from .names import layer_str
+from .eprint import eprint
+from .names import layer_pfx, layer_str
 
 
 def print_data(
@@ -110,13 +111,17 @@ def conv2d_layer(
         groups=1,
         bypass=False,
         datafile=None,
+        batch=False,
 ):
     """
     Perform 2D convolution for one layer.
+    When `batch` is set, `data` has a leading sample dimension and nothing is printed or
+    accounted.
     """
+    verbose = state.verbose and not batch
     verbose_data = state.verbose_all or state.output_layer[layer]
 
-    if state.verbose:
+    if verbose:
         print(f"{kernel_size[0]}x{kernel_size[1]} KERNEL(S)", end='')
         if bypass:
             print(' (BYPASS)')
@@ -165,7 +170,7 @@ def conv2d_layer(
     if datafile is not None:
         np.save(datafile, out_buf, allow_pickle=False, fix_imports=False)
 
-    if state.verbose and verbose_data:
+    if verbose and verbose_data:
         print(f"{out_size[0]}x{out_size[1]}x{out_size[2]} FULL-RES OUTPUT:")
         if out_size[1] == out_size[2] == 1:
             print(np.squeeze(out_buf))
@@ -173,18 +178,19 @@ def conv2d_layer(
             print(out_buf)
         print('')
 
-    stats.account(
-        layer,
-        "macc",
-        (input_size[0] // groups) * kernel_size[0] * kernel_size[1] * out_size[0]
-        * out_size[1] * out_size[2],
-    )
+    if not batch:
+        stats.account(
+            layer,
+            "macc",
+            (input_size[0] // groups) * kernel_size[0] * kernel_size[1] * out_size[0]
+            * out_size[1] * out_size[2],
+        )
 
     if output_width != 32:
         out_buf = np.floor(0.5 + out_buf / (128 / 2.0**output_shift)).astype(np.int64). \
             clip(-(2**(bits-1)), 2**(bits-1)-1)
 
-        if state.verbose and verbose_data:
+        if verbose and verbose_data:
             print(f"{out_size[0]}x{out_size[1]}x{out_size[2]} OUTPUT "
                   f"{'BEFORE ACTIVATION' if activation is not None else '(NO ACTIVATION)'}:")
             if out_size[1] == out_size[2] == 1:
@@ -199,7 +205,7 @@ def conv2d_layer(
         elif activation == op.ACT_ABS:
             out_buf = np.abs(out_buf).clip(0, 2**(bits-1)-1)
 
-        if state.verbose and verbose_data:
+        if verbose and verbose_data:
             print(f"{out_size[0]}x{out_size[1]}x{out_size[2]} ACTIVATED OUTPUT"
                   f" ({op.act_string(activation).upper()}):")
             if out_size[1] == out_size[2] == 1:
@@ -208,13 +214,14 @@ def conv2d_layer(
                 print(out_buf)
             print('')
 
-        stats.account(
-            layer,
-            "comp",
-            out_size[0] * out_size[1] * out_size[2],
-        )
+        if not batch:
+            stats.account(
+                layer,
+                "comp",
+                out_size[0] * out_size[1] * out_size[2],
+            )
 
-    if state.verbose and not verbose_data:
+    if verbose and not verbose_data:
         print(f"{out_size[0]}x{out_size[1]}x{out_size[2]} OUTPUT"
               f" ({op.act_string(activation).upper()})\n")
 
@@ -240,13 +247,17 @@ def convtranspose2d_layer(
         groups=1,
         bypass=False,
         datafile=None,
+        batch=False,
 ):
     """
     Perform a fractionally strided 2D convolution for one layer.
+    When `batch` is set, `data` has a leading sample dimension and nothing is printed or
+    accounted.
     """
+    verbose = state.verbose and not batch
     verbose_data = state.verbose_all or state.output_layer[layer]
 
-    if state.verbose:
+    if verbose:
         print(f"{kernel_size[0]}x{kernel_size[1]} KERNEL(S)", end='')
         if bypass:
             print(' (BYPASS)')
@@ -298,7 +309,7 @@ def convtranspose2d_layer(
     if datafile is not None:
         np.save(datafile, out_buf, allow_pickle=False, fix_imports=False)
 
-    if state.verbose and verbose_data:
+    if verbose and verbose_data:
         print(f"{out_size[0]}x{out_size[1]}x{out_size[2]} FULL-RES OUTPUT:")
         if out_size[1] == out_size[2] == 1:
             print(np.squeeze(out_buf))
@@ -306,18 +317,19 @@ def convtranspose2d_layer(
             print(out_buf)
         print('')
 
-    stats.account(
-        layer,
-        "macc",
-        (input_size[0] // groups) * kernel_size[0] * kernel_size[1] * out_size[0]
-        * out_size[1] * out_size[2],
-    )
+    if not batch:
+        stats.account(
+            layer,
+            "macc",
+            (input_size[0] // groups) * kernel_size[0] * kernel_size[1] * out_size[0]
+            * out_size[1] * out_size[2],
+        )
 
     if output_width != 32:
         out_buf = np.floor(0.5 + out_buf / (128 / 2.0**output_shift)).astype(np.int64). \
             clip(-(2**(bits-1)), 2**(bits-1)-1)
 
-        if state.verbose and verbose_data:
+        if verbose and verbose_data:
             print(f"{out_size[0]}x{out_size[1]}x{out_size[2]} OUTPUT "
                   f"{'BEFORE ACTIVATION' if activation is not None else '(NO ACTIVATION)'}:")
             if out_size[1] == out_size[2] == 1:
@@ -332,7 +344,7 @@ def convtranspose2d_layer(
         elif activation == op.ACT_ABS:
             out_buf = np.abs(out_buf).clip(0, 2**(bits-1)-1)
 
-        if state.verbose and verbose_data:
+        if verbose and verbose_data:
             print(f"{out_size[0]}x{out_size[1]}x{out_size[2]} ACTIVATED OUTPUT"
                   f" ({op.act_string(activation).upper()}):")
             if out_size[1] == out_size[2] == 1:
@@ -341,13 +353,14 @@ def convtranspose2d_layer(
                 print(out_buf)
             print('')
 
-        stats.account(
-            layer,
-            "comp",
-            out_size[0] * out_size[1] * out_size[2],
-        )
+        if not batch:
+            stats.account(
+                layer,
+                "comp",
+                out_size[0] * out_size[1] * out_size[2],
+            )
 
-    if state.verbose and not verbose_data:
+    if verbose and not verbose_data:
         print(f"{out_size[0]}x{out_size[1]}x{out_size[2]} OUTPUT"
               f" ({op.act_string(activation).upper()})\n")
 
@@ -372,13 +385,17 @@ def conv1d_layer(
         groups=1,
         bypass=False,
         datafile=None,
+        batch=False,
 ):
     """
     Perform 1D convolution for one layer.
+    When `batch` is set, `data` has a leading sample dimension and nothing is printed or
+    accounted.
     """
+    verbose = state.verbose and not batch
     verbose_data = state.verbose_all or state.output_layer[layer]
 
-    if state.verbose:
+    if verbose:
         print(f"KERNEL SIZE {kernel_size}", end='')
         if bypass:
             print(' (BYPASS)')
@@ -409,27 +426,28 @@ def conv1d_layer(
         fractional_stride=1,
         output_pad=0,
         groups=groups,
-    )[:, :, np.newaxis]
+    )[..., np.newaxis]
 
     if datafile is not None:
         np.save(datafile, out_buf, allow_pickle=False, fix_imports=False)
 
-    if state.verbose and verbose_data:
+    if verbose and verbose_data:
         print(f"{out_size[0]}x{out_size[1]} FULL-RES OUTPUT:")
         print(out_buf.squeeze(axis=-1))
         print('')
 
-    stats.account(
-        layer,
-        "macc",
-        (input_size[0] // groups) * kernel_size * out_size[0] * out_size[1],
-    )
+    if not batch:
+        stats.account(
+            layer,
+            "macc",
+            (input_size[0] // groups) * kernel_size * out_size[0] * out_size[1],
+        )
 
     if output_width != 32:
         out_buf = np.floor(0.5 + out_buf / (128 / 2.0**output_shift)).astype(np.int64). \
             clip(-(2**(bits-1)), 2**(bits-1)-1)
 
-        if state.verbose and verbose_data:
+        if verbose and verbose_data:
             print(f"{out_size[0]}x{out_size[1]} OUTPUT "
                   f"{'BEFORE ACTIVATION' if activation is not None else '(NO ACTIVATION)'}:")
             print(out_buf.squeeze(axis=-1))
@@ -441,19 +459,20 @@ def conv1d_layer(
         elif activation == op.ACT_ABS:
             out_buf = np.abs(out_buf).clip(0, 2**(bits-1)-1)
 
-        if state.verbose and verbose_data:
+        if verbose and verbose_data:
             print(f"{out_size[0]}x{out_size[1]} ACTIVATED OUTPUT"
                   f" ({op.act_string(activation).upper()}):")
             print(out_buf.squeeze(axis=-1))
             print('')
 
-        stats.account(
-            layer,
-            "comp",
-            out_size[0] * out_size[1],
-        )
+        if not batch:
+            stats.account(
+                layer,
+                "comp",
+                out_size[0] * out_size[1],
+            )
 
-    if state.verbose and not verbose_data:
+    if verbose and not verbose_data:
         print(f"{out_size[0]}x{out_size[1]} OUTPUT"
               f" ({op.act_string(activation).upper()})\n")
 
@@ -562,16 +581,20 @@ def eltwise_layer(
         data,
         output_width=8,
         operands=1,
+        batch=False,
 ):
     """
     Element-wise operators for one layer.
+    When `batch` is set, each operand in `data` has a leading sample dimension and nothing is
+    printed or accounted.
     """
+    verbose = state.verbose and not batch
     verbose_data = state.verbose_all or state.output_layer[layer]
 
     bits = 8
     assert operands == len(data)
 
-    if state.verbose:
+    if verbose:
         print(f"{operands}-OPERAND {op.string(operator, elt=True).upper()}:\n")
 
     out_buf = eltwise(
@@ -580,7 +603,7 @@ def eltwise_layer(
         input_size=input_size,
     )
 
-    if state.verbose and verbose_data:
+    if verbose and verbose_data:
         print(f"{input_size[0]}x{input_size[1]}x{input_size[2]} FULL-RES OUTPUT:")
         if input_size[1] == input_size[2] == 1:
             print(np.squeeze(out_buf))
@@ -589,23 +612,26 @@ def eltwise_layer(
         print('')
 
     if operator in [op.ELTWISE_ADD, op.ELTWISE_SUB]:
-        stats.account(
-            layer,
-            "add",
-            (operands - 1) * out_buf.size,
-        )
+        if not batch:
+            stats.account(
+                layer,
+                "add",
+                (operands - 1) * out_buf.size,
+            )
     elif operator == op.ELTWISE_MUL:
-        stats.account(
-            layer,
-            "mul",
-            (operands - 1) * out_buf.size,
-        )
+        if not batch:
+            stats.account(
+                layer,
+                "mul",
+                (operands - 1) * out_buf.size,
+            )
     elif operator in [op.ELTWISE_OR, op.ELTWISE_XOR]:
-        stats.account(
-            layer,
-            "bitwise",
-            (operands - 1) * out_buf.size,
-        )
+        if not batch:
+            stats.account(
+                layer,
+                "bitwise",
+                (operands - 1) * out_buf.size,
+            )
 
     if output_width != 32:
         if operator == op.ELTWISE_MUL:
@@ -614,7 +640,7 @@ def eltwise_layer(
         else:
             np.clip(out_buf, -(2**(bits-1)), 2**(bits-1)-1, out_buf)
 
-        if state.verbose and verbose_data:
+        if verbose and verbose_data:
             print(f"{input_size[0]}x{input_size[1]}x{input_size[2]} OUTPUT:")
             if input_size[1] == input_size[2] == 1:
                 print(np.squeeze(out_buf))
@@ -622,7 +648,7 @@ def eltwise_layer(
                 print(out_buf)
             print('')
 
-    if state.verbose and not verbose_data:
+    if verbose and not verbose_data:
         print(f"{input_size[0]}x{input_size[1]}x{input_size[2]} OUTPUT")
 
     return out_buf, input_size
@@ -642,10 +668,14 @@ def pooling_layer(
         rounding=False,
         debug_data=None,
         dilation=(1, 1),
+        batch=False,
 ):
     """
     Perform pooling for one layer.
+    When `batch` is set, the samples are folded into the channels of `data` and nothing is
+    printed or accounted.
     """
+    verbose = state.verbose and not batch
     # Always apply stride
     if operation != op.CONV1D:
         pooled_size = [input_size[0],
@@ -678,7 +708,7 @@ def pooling_layer(
                     dilation=dilation,
                     floor=not rounding,
                 )
-                if state.verbose:
+                if verbose:
                     if dilation[0] > 1 or dilation[1] > 1:
                         dilation_str = f", DILATION {dilation[0]}/{dilation[1]}"
                     else:
@@ -702,17 +732,19 @@ def pooling_layer(
 
             st = pool[0] * pool[1] * pooled_size[0] * pooled_size[1] * pooled_size[2] * operands
             if pool_average:
-                stats.account(
-                    layer,
-                    "add",
-                    st,
-                )
+                if not batch:
+                    stats.account(
+                        layer,
+                        "add",
+                        st,
+                    )
             else:
-                stats.account(
-                    layer,
-                    "comp",
-                    st,
-                )
+                if not batch:
+                    stats.account(
+                        layer,
+                        "comp",
+                        st,
+                    )
         else:
             pooled = pool1d(
                 data[0],
@@ -724,7 +756,7 @@ def pooling_layer(
                 dilation=dilation[0],
                 floor=not rounding,
             )
-            if state.verbose:
+            if verbose:
                 print(f"{'AVERAGE' if pool_average else 'MAX'} "
                       f"POOL {pool[0]} WITH STRIDE {pool_stride[0]} ", end='')
                 if dilation[0] > 1:
@@ -736,17 +768,19 @@ def pooling_layer(
                 print('')
 
             if pool_average:
-                stats.account(
-                    layer,
-                    "add",
-                    pool[0] * pooled_size[0] * pooled_size[1],
-                )
+                if not batch:
+                    stats.account(
+                        layer,
+                        "add",
+                        pool[0] * pooled_size[0] * pooled_size[1],
+                    )
             else:
-                stats.account(
-                    layer,
-                    "comp",
-                    pool[0] * pooled_size[0] * pooled_size[1],
-                )
+                if not batch:
+                    stats.account(
+                        layer,
+                        "comp",
+                        pool[0] * pooled_size[0] * pooled_size[1],
+                    )
 
             pooled = np.expand_dims(pooled, axis=0)
 
@@ -755,7 +789,7 @@ def pooling_layer(
         if operation != op.CONV1D:
             pooled = data[:, :, ::pool_stride[0], ::pool_stride[1]]
             if pool_stride[0] > 1 or pool_stride[1] > 1:
-                if state.verbose:
+                if verbose:
                     print(f"{'AVERAGE' if pool_average else 'MAX'} "
                           f"POOL {pool[0]}x{pool[1]} WITH STRIDE {pool_stride[0]}/{pool_stride[1]}"
                           f" {input_size} -> {pooled_size}", end='')
@@ -766,7 +800,7 @@ def pooling_layer(
         else:
             pooled = data[:, :, ::pool_stride[0]]
             if pool_stride[0] > 1:
-                if state.verbose:
+                if verbose:
                     print(f"{'AVERAGE' if pool_average else 'MAX'} "
                           f"POOL {pool[0]} WITH STRIDE {pool_stride[0]} "
                           f"{input_size} -> {pooled_size}", end='')
@@ -827,3 +861,372 @@ def show_data(
                 print(':')
                 print(np.squeeze(data))
             print('')
+
+
+def run_eltwise(
+        data,
+        ll,
+        batch=False,
+):
+    """
+    In-flight element-wise operations
+    """
+    if state.operator[ll] == op.NONE:
+        # Let element-wise do 32-bit, else 8-bit only
+        o_width = state.output_width[ll]
+    else:
+        o_width = 8
+    d_shape = data.shape
+
+    data, out_size = eltwise_layer(
+        state.eltwise[ll],
+        ll,
+        data[0].shape,
+        state.output_shift[ll],
+        data,
+        output_width=o_width,
+        operands=state.operands[ll],
+        batch=batch,
+    )
+    assert tuple(out_size) == d_shape[1:]
+
+    return data
+
+
+def simulate_layer(  # pylint: disable=too-many-branches,too-many-statements
+        ll,
+        data_buf,
+        kernel,
+        bias,
+        kernel_ptrs,
+        bias_ptrs,
+        data_buffer=None,
+        expand=None,
+        expand_thresh=None,
+        datafile=None,
+        debug_data=None,
+        batch=False,
+):
+    """
+    Compute the output of layer `ll` from the layer outputs in `data_buf`, where
+    `data_buf[ll + 1]` is the output of layer `ll` and `data_buf[0]` is the network input.
+    The weights are `kernel[kernel_ptrs[ll]]` and `bias[bias_ptrs[ll]]`, and `data_buffer`
+    is the rolling data buffer (if any).
+    When `batch` is set, all data (including `data_buffer`) has a leading sample dimension,
+    all samples are computed at once, and nothing is printed, logged, or accounted.
+    Return the layer output and its size (for a single sample).
+    """
+    b = 1 if batch else 0  # Number of leading sample dimensions
+    verbose = state.verbose and not batch
+
+    # Cache variables locally
+    in_sequences = state.in_sequences
+    input_dim = state.input_dim
+    operands = state.operands
+    operator = state.operator
+    pool = state.pool
+    pool_stride = state.pool_stride
+    pool_dilation = state.pool_dilation
+    buffer_shift = state.buffer_shift
+    kernel_size = state.kernel_size
+    output_chan = state.output_channels
+    conv_groups = state.conv_groups
+    bypass = state.bypass
+
+    # Concatenate input data if needed
+    if in_sequences[ll] is not None:
+        if len(in_sequences[ll]) > 1:
+            err_concat = None
+            try:
+                data = np.concatenate([data_buf[i + 1] for i in in_sequences[ll]], axis=b)
+            except ValueError as err:
+                err_concat = err
+            if err_concat is not None:
+                try:
+                    data = np.concatenate(
+                        [data_buf[i + 1].reshape(data_buf[i + 1].shape[:b + 1] + (-1, ))
+                         for i in in_sequences[ll]],
+                        axis=b + 1,
+                    ).reshape(data_buf[in_sequences[ll][0] + 1].shape[:b + 1]
+                              + (input_dim[ll][0], input_dim[ll][1]))
+                except ValueError as err:
+                    eprint(f'{layer_pfx(ll)}Input data concatenation unsuccessful: ',
+                           err_concat, err)
+        elif in_sequences[ll][0] == -2:
+            data = data_buffer
+        else:
+            data = data_buf[in_sequences[ll][0]+1]
+    else:
+        data = data_buf[ll]
+
+    # Split data into multiple inputs if needed
+    if operands[ll] > 1:
+        if ll == state.start_layer and state.legacy_test:
+            data = np.array(np.split(data, operands[ll], axis=b))
+        elif state.legacy_test:
+            d = np.empty((operands[ll], ) + data.shape[:-1] + (data.shape[-1] // operands[ll], ),
+                         dtype=np.int64)
+            for i in range(operands[ll]):
+                d[i] = data[..., i::operands[ll]]
+            data = d
+        else:
+            data = np.array(np.split(data, operands[ll], axis=b))
+    else:
+        data = np.expand_dims(data, 0)
+
+    in_chan = state.input_channels[ll]
+
+    # Drop input channels?
+    if state.reshape_inputs:
+        if state.input_channel_skip[ll] > 0:
+            data = np.delete(data, np.s_[:state.input_channel_skip[ll]], axis=b + 1)
+        data = np.delete(data, np.s_[in_chan:], axis=b + 1)
+
+    if datafile is not None:
+        # Log input to npy
+        np.save(datafile, data, allow_pickle=False, fix_imports=False)
+
+    if not batch:
+        show_data(
+            ll,
+            data.shape,
+            data,
+            expand=expand,
+            expand_thresh=expand_thresh,
+            operation=operator[ll],
+            operands=operands[ll],
+        )
+
+    # Run in-flight element-wise operations first?
+    if operands[ll] > 1 and not state.pool_first[ll]:
+        data = np.expand_dims(run_eltwise(data, ll, batch), 0)
+
+    # Allow 1D <-> 2D and 2D W/L conversions, and skipping/subsetting
+    input_crop = state.input_crop[ll]
+    if input_crop[0] != 0 or input_crop[1] != 0:  # line skip count
+        data = data[..., input_crop[0]:-input_crop[1], :]
+    if operator[ll] == op.CONV1D:
+        if in_sequences[ll] != [-2]:
+            assert input_dim[ll][1] == 1
+        else:
+            data = np.moveaxis(data, b + 1, -1)
+        data = data.reshape(data.shape[:b + 1] + (-1, input_dim[ll][0]))
+    elif buffer_shift[ll] is None:
+        data = data.reshape(data.shape[:b + 1] + (-1, input_dim[ll][0], input_dim[ll][1]))
+
+    # In-flight pooling
+    if batch:
+        # Pooling operates on each channel separately, so fold the samples into the channels
+        samples = data.shape[1]
+        data = data.reshape((data.shape[0], -1) + data.shape[3:])
+    data, out_size = pooling_layer(
+        ll,
+        data[0].shape,
+        pool[ll],
+        pool_stride[ll],
+        state.pool_average[ll],
+        data,
+        dilation=pool_dilation[ll],
+        expand=expand,
+        expand_thresh=expand_thresh,
+        operation=operator[ll],
+        operands=data.shape[0],
+        rounding=state.avg_pool_rounding,
+        debug_data=debug_data,
+        batch=batch,
+    )
+    if batch:
+        data = data.reshape((data.shape[0], samples, -1) + data.shape[2:])
+        out_size = [out_size[0] // samples] + out_size[1:]
+
+    if datafile is not None:
+        # Pooling output (pre-elementwise)
+        if pool[ll][0] > 1 or pool[ll][1] > 1 \
+           or pool_stride[ll][0] > 1 or pool_stride[ll][1] > 1 \
+           or pool_dilation[ll][0] > 1 or pool_dilation[ll][1] > 1:
+            np.save(datafile, data, allow_pickle=False, fix_imports=False)
+        else:
+            np.save(datafile, np.empty((0)), allow_pickle=False, fix_imports=False)
+
+    pooled_dim = state.pooled_dim[ll]
+    if operator[ll] == op.CONV1D:
+        if out_size[0] != in_chan \
+           or out_size[1] != pooled_dim[0] or pooled_dim[1] != 1:
+            eprint(f'{layer_pfx(ll)}Input dimensions do not match. '
+                   f'Expected: {in_chan}x{pooled_dim[0]}, '
+                   f'got {out_size[0]}x{out_size[1]}.')
+    elif buffer_shift[ll] is None:
+        if out_size[0] != in_chan \
+           or out_size[1] != pooled_dim[0] or out_size[2] != pooled_dim[1]:
+            eprint(f'{layer_pfx(ll)}Input dimensions do not match. '
+                   f'Expected: {in_chan}x{pooled_dim[0]}x{pooled_dim[1]}, '
+                   f'got {out_size[0]}x{out_size[1]}x{out_size[2]}.')
+
+    if operands[ll] > 1 and state.pool_first[ll]:
+        data = run_eltwise(data, ll, batch)
+    else:
+        data = np.squeeze(data, axis=0)
+
+    if datafile is not None:
+        np.save(datafile, data, allow_pickle=False, fix_imports=False)
+
+    # Convolution or passthrough
+    if operator[ll] in [op.CONV2D, op.LINEAR]:
+        if state.flatten[ll]:
+            in_chan *= pooled_dim[0] * pooled_dim[1]
+            data = data.reshape(data.shape[:b] + (in_chan, 1, 1))
+            if verbose:
+                print_data(
+                    verbose,
+                    f'FLATTEN TO {in_chan}x1x1',
+                    data,
+                    data.shape,
+                    1,
+                    in_chan,
+                )
+
+        if not bypass[ll]:
+            k = kernel[kernel_ptrs[ll]].reshape(
+                    output_chan[ll],
+                    in_chan // conv_groups[ll],
+                    kernel_size[ll][0],
+                    kernel_size[ll][1],
+                )
+        else:
+            k = np.full(
+                    (output_chan[ll], in_chan, kernel_size[ll][0], kernel_size[ll][1]),
+                    1,
+                    dtype=np.int64,
+                )
+
+        out_buf, out_size = conv2d_layer(
+            ll,
+            data.shape[b:],
+            kernel_size[ll],
+            state.output_shift[ll],
+            output_chan[ll],
+            state.padding[ll],
+            state.dilation[ll],
+            state.stride[ll],
+            state.activation[ll],
+            k,
+            bias[bias_ptrs[ll]],
+            data,
+            output_width=state.output_width[ll],
+            groups=conv_groups[ll],
+            bypass=bypass[ll],
+            datafile=datafile,
+            batch=batch,
+        )
+    elif operator[ll] == op.CONVTRANSPOSE2D:
+        if not bypass[ll]:
+            k = kernel[kernel_ptrs[ll]].reshape(
+                    output_chan[ll],
+                    in_chan // conv_groups[ll],
+                    kernel_size[ll][0],
+                    kernel_size[ll][1],
+                )
+        else:
+            k = np.full(
+                    (output_chan[ll], in_chan, kernel_size[ll][0], kernel_size[ll][1]),
+                    1,
+                    dtype=np.int64,
+                )
+
+        out_buf, out_size = convtranspose2d_layer(
+            ll,
+            data.shape[b:],
+            kernel_size[ll],
+            state.output_shift[ll],
+            output_chan[ll],
+            state.padding[ll],
+            state.dilation[ll],
+            state.stride[ll],
+            state.output_padding[ll],
+            state.activation[ll],
+            k,
+            bias[bias_ptrs[ll]],
+            data,
+            output_width=state.output_width[ll],
+            groups=conv_groups[ll],
+            bypass=bypass[ll],
+            datafile=datafile,
+            batch=batch,
+        )
+    elif operator[ll] == op.CONV1D:
+        if not bypass[ll]:
+            k = kernel[kernel_ptrs[ll]].reshape(
+                    output_chan[ll],
+                    state.input_channels[ll] // conv_groups[ll],
+                    kernel_size[ll][0],
+                )
+        else:
+            k = np.full(
+                    (output_chan[ll], state.input_channels[ll], kernel_size[ll][0],),
+                    1,
+                    dtype=np.int64,
+                )
+
+        out_buf, out_size = conv1d_layer(
+            ll,
+            data.shape[b:],
+            kernel_size[ll][0],
+            state.output_shift[ll],
+            output_chan[ll],
+            state.padding[ll][0],
+            state.dilation[ll][0],
+            state.stride[ll][0],
+            state.activation[ll],
+            k,
+            bias[bias_ptrs[ll]],
+            data,
+            output_width=state.output_width[ll],
+            groups=conv_groups[ll],
+            bypass=bypass[ll],
+            datafile=datafile,
+            batch=batch,
+        )
+    elif operator[ll] == op.NONE:  # '0'D (pooling only or passthrough)
+        out_buf, out_size = passthrough_layer(
+            ll,
+            data.shape[b:],
+            data,
+            datafile=datafile,
+        )
+    else:
+        eprint(f'Unknown operator `{op.string(operator[ll])}`.')
+        return None, None
+
+    return out_buf, out_size
+
+
+def update_buffer(
+        ll,
+        out_buf,
+        data_buffer,
+):
+    """
+    Apply the buffer shift and buffer insertion of layer `ll` to the layer output `out_buf` and
+    the rolling `data_buffer`. Both may have leading sample dimensions.
+    Return the updated layer output and data buffer.
+    """
+    buffer_shift = state.buffer_shift[ll]
+    buffer_insert = state.buffer_insert[ll]
+
+    if buffer_shift is not None:
+        data_buffer = np.roll(data_buffer, -buffer_shift, axis=-3)
+        data_buffer[..., -buffer_shift:, :, :] = 0
+        out_buf = np.roll(out_buf, -buffer_shift, axis=-3)
+        out_buf[..., -buffer_shift:, :, :] = 0
+    if buffer_insert is not None:
+        try:
+            buffer_dims = data_buffer.shape
+            data_buffer[..., -buffer_insert:, :, :] = \
+                np.moveaxis(out_buf, -3, -1).reshape(out_buf.shape[:-3]
+                                                     + (1, buffer_dims[-2], -1))
+        except IndexError:
+            eprint(f'{layer_pfx(ll)}Buffer insertion unsuccessful. Check that the '
+                   f'output dimensions of the layer are consistent with the buffer '
+                   f'specification (dim and channels)')
+
+    return out_buf, data_buffer
@@ -20,6 +20,7 @@ avg_pool_rounding: bool = False
 avgpool_reset_layer: List[bool] = []
 balance_power: bool = True
 base_directory: str = ''
+batch_numpy: Optional[str] = None
 bias_group_map: List[Any] = []
 bias: List[Any] = []
 big_data: List[bool] = []
@@ -31,10 +32,12 @@ buffer_shift: List[int] = []
 bypass: List[bool] = []
 c_filename: str = ''
 calcx4: List[bool] = []
+checkpoint_cache: Optional[str] = None
 clock_divider: Optional[int] = None
 clock_trim: Optional[List[int]] = None
 compact_data: bool = False
 compact_weights: bool = False
+compress_kernels: bool = False
 conv_groups: List[int] = []
 data: Any = None
 data_buffer: Optional[List[List[Any]]] = None
@@ -74,6 +77,7 @@ final_scale: List[int] = []
 flatten: List[bool] = []
 forever: bool = False
 generate_kat: bool = True
+global_kernel_placement: bool = False
 greedy_kernel_allocator: bool = True
 ignore_activation: bool = False
 ignore_bias_groups: bool = False
@@ -91,6 +95,7 @@ input_csv_format: int = 888
 input_csv_period: int = 0
 input_csv_retrace: int = 0
 input_csv: Optional[str] = None
+input_csv_binary: bool = False
 input_dim: List[List[int]] = []
 input_crop: List[List[int]] = []
 input_fifo: bool = False
@@ -100,6 +105,7 @@ input_pix_clk: int = 0
 input_skip: List[int] = []
 input_sync: bool = False
 kernel_format: str = ''
+kernel_placement_time: float = 10.0
 kernel_size: List[List[int]] = []
 layer_name: List[Optional[int]] = []
 layers: int = 0
@@ -176,7 +182,10 @@ rtl_preload_weights: bool = False
 rtl_preload: bool = False
 runtest_filename: str = ''
 scale_output: bool = True
+sample_batch: Any = None
 sample_filename: str = ''
+sim_engine: str = 'reference'
+sim_threads: int = 1
 simple1b: bool = False
 simulated_sequence: List[Any] = []
 sleep: bool = False
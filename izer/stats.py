@@ -8,6 +8,7 @@
 Statistics for the pure Python computation modules
 """
 import operator
+import threading
 from functools import reduce
 from typing import Optional
 
@@ -29,6 +30,9 @@ statsdict = {
     "true_sw_macc": [0],
 }
 
+# Layers may be simulated concurrently (see scheduler.py)
+_lock = threading.Lock()
+
 resourcedict = {
     "kmem_used": 0,  # Used kernel memory
     "bmem_used": 0,  # Used bias memory
@@ -79,11 +83,12 @@ def account(
     if operation not in statsdict:
         raise NotImplementedError
 
-    dlen = len(statsdict[operation])
-    if dlen <= layer:
-        statsdict[operation] += [0] * (1 + layer - dlen)
+    with _lock:
+        dlen = len(statsdict[operation])
+        if dlen <= layer:
+            statsdict[operation] += [0] * (1 + layer - dlen)
 
-    statsdict[operation][layer] += val
+        statsdict[operation][layer] += val
 
 
 def summary(
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+###################################################################################################
+# Copyright (C) 2024 Maxim Integrated Products, Inc. All Rights Reserved.
+#
+# Maxim Integrated Products, Inc. Default Copyright Notice:
+# https://www.maximintegrated.com/en/aboutus/legal/copyrights.html
+###################################################################################################
+"""
+Test the kernel memory image and the batch verification of the APB writers.
+"""
+import io
+import os
+import sys
+
+import numpy as np
+
+# Allow test to run outside of pytest
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from izer import apbaccess, state  # noqa: E402 pylint: disable=wrong-import-position
+from izer import tornadocnn as tc  # noqa: E402 pylint: disable=wrong-import-position
+
+
+def test_kernel_chunks():
+    """Check the kernel memory image and the chunks of consecutive kernels."""
+    tc.dev = tc.get_device(87)
+    new_kernel_loader = state.new_kernel_loader
+    state.new_kernel_loader = True
+    try:
+        apb = apbaccess.APB(io.StringIO())
+    finally:
+        state.new_kernel_loader = new_kernel_loader
+
+    # Processor 0, last kernels in the first memory instance and first in the second
+    for idx in range(1020, 1030):
+        apb.write_kern(0, 0, idx, np.arange(idx, idx + 9))
+    # Processor 17 (group 1, processor 1), a single kernel of size 1 and a separate run
+    apb.write_kern(1, 17, 5, [-1], size=1)
+    apb.write_kern(2, 17, 100, list(range(-9, 0)))
+    apb.write_kern(2, 17, 101, list(range(9)))
+
+    addr, data = apb.kernel_chunks()
+    base = state.apb_base + tc.dev.C_MRAM_BASE
+    assert addr == [
+        base + 1020 * 16,
+        base + tc.dev.C_GROUP_OFFS + tc.dev.MASK_OFFS * 16 + 5 * 16,
+        base + tc.dev.C_GROUP_OFFS + tc.dev.MASK_OFFS * 16 + 100 * 16,
+    ]
+    assert [len(val) for val in data] == [10, 1, 2]
+    assert np.array_equal(data[0], (np.arange(1020, 1030)[:, None] + np.arange(9)) & 0xff)
+    assert np.array_equal(apb.kernel_mem[0][0][1][5], np.arange(1029, 1038) & 0xff)
+    assert apb.kernel_mem[1][1][0][5].tolist() == [0xff, 0, 0, 0, 0, 0, 0, 0, 0]
+    assert apb.kernel_mem[1][1][0][100].tolist() == list(range(256 - 9, 256))
+    assert np.count_nonzero(apb.kernel_valid) == 13
+
+
+# Masks and the corresponding byte count and first byte for verify()
+MASKS = {0xffffffff: (4, 0), 0xff: (1, 0), 0xff00: (1, 1), 0xffff00: (2, 1), 0xffffff: (3, 0)}
+
+
+def random_checks(rng, n):
+    """Return `n` random addresses with runs of consecutive words, data, masks and comments."""
+    addrs = tc.dev.C_SRAM_BASE + 4 * np.cumsum(rng.choice([1, 1, 1, 2, 7], n))
+    vals = rng.integers(0, 2**32, n, dtype=np.int64)
+    masks = rng.choice(list(MASKS), n)
+    masks[:n // 2] = masks[0]  # Long runs with the same mask
+    return addrs, vals, masks, [f' // {i},0,0' for i in range(n)]
+
+
+def test_verify_many():
+    """Compare verify_many() to verify() for each address."""
+    tc.dev = tc.get_device(85)
+    rng = np.random.default_rng(seed=2)
+    addrs, vals, masks, comments = random_checks(rng, 200)
+
+    for apb_class in (apbaccess.APBTopLevel, apbaccess.APBBlockLevel):
+        single = apb_class(io.StringIO())
+        batch = apb_class(io.StringIO())
+        for addr, val, mask, comment in zip(addrs.tolist(), vals.tolist(), masks.tolist(),
+                                            comments):
+            num_bytes, first_proc = MASKS[mask]
+            single.verify(addr, val, num_bytes=num_bytes, first_proc=first_proc, comment=comment)
+        batch.verify_many(addrs, vals, masks, comments=comments)
+        assert batch.verify_text == single.verify_text
+        assert batch.memfile.getvalue() == single.memfile.getvalue()
+        assert batch.reads == single.reads
+
+
+def test_verify_unload_finalize():
+    """Check the SAMPLE_OUTPUT runs of consecutive addresses with the same mask."""
+    tc.dev = tc.get_device(85)
+    rng = np.random.default_rng(seed=9)
+    addrs, vals, masks, _ = random_checks(rng, 300)
+    max_count = state.max_count
+    state.max_count = 250
+    try:
+        apb = apbaccess.APBTopLevel(io.StringIO(), sampleoutput_header=io.StringIO())
+        order = rng.permutation(len(addrs))
+        apb.verify_many(addrs[order[:100]], vals[order[:100]], masks[order[:100]],
+                        use_list=True)
+        apb.verify_many(addrs[order[100:]], vals[order[100:]], masks[order[100:]],
+                        use_list=True)
+        apb.verify_unload_finalize()
+    finally:
+        state.max_count = max_count
+
+    # One word at a time, in order of mask and address
+    expected = []
+    next_addr = None
+    start = 0
+    checks = sorted(zip(masks.tolist(), (addrs + state.apb_base).tolist(),
+                        (vals & masks).tolist()))[:251]
+    for i, (mask, addr, val) in enumerate(checks):
+        if addr != next_addr or mask != checks[i - 1][0]:
+            expected += [addr, mask, 0]
+            start = len(expected) - 1
+        expected[start] += 1
+        expected.append(val)
+        next_addr = addr + 4
+    expected.append(0)
+
+    define = apb.sampleoutput_header.getvalue()
+    assert define.startswith('#define SAMPLE_OUTPUT {')
+    assert [int(e, 16) for e in define[define.index('{') + 1:define.index('}')]
+            .replace('\\', '').replace(',', ' ').split()] == expected
+
+
+if __name__ == '__main__':
+    test_kernel_chunks()
+    test_verify_many()
+    test_verify_unload_finalize()
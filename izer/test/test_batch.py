@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+###################################################################################################
+# Copyright (C) 2024 Maxim Integrated Products, Inc. All Rights Reserved.
+#
+# Maxim Integrated Products, Inc. Default Copyright Notice:
+# https://www.maximintegrated.com/en/aboutus/legal/copyrights.html
+###################################################################################################
+"""
+Test batched (multi-sample) conv1d and conv2d operators and `--sample-batch`.
+"""
+import os
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+import torch
+
+REPO = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+# Allow test to run outside of pytest
+sys.path.insert(0, REPO)
+
+from izer import compute, state  # noqa: E402 pylint: disable=wrong-import-position
+
+
+def convolve2d_batch(data, weight, bias, pad, stride, dilation, groups=1):
+    """Convolve a batch of 2D data and compare to PyTorch and to single samples"""
+    t = torch.nn.functional.conv2d(
+        torch.as_tensor(data, dtype=torch.float),
+        torch.as_tensor(weight, dtype=torch.float),
+        bias=torch.as_tensor(bias, dtype=torch.float) if bias is not None else None,
+        stride=stride,
+        padding=pad,
+        groups=groups,
+        dilation=dilation,
+    ).int().numpy()
+
+    output = compute.conv2d(
+        data,
+        weight,
+        bias,
+        data.shape[1:],
+        t.shape[1:],
+        kernel_size=weight.shape[2:],
+        stride=stride,
+        pad=pad,
+        dilation=dilation,
+        fractional_stride=[1, 1],
+        output_pad=[0, 0],
+        groups=groups,
+    )
+
+    print("PYTORCH OK" if np.array_equal(output, t) else "*** FAILURE ***")
+    assert np.array_equal(output, t)
+
+    for i, sample in enumerate(data):
+        single = compute.conv2d(
+            sample,
+            weight,
+            bias,
+            sample.shape,
+            t.shape[1:],
+            kernel_size=weight.shape[2:],
+            stride=stride,
+            pad=pad,
+            dilation=dilation,
+            fractional_stride=[1, 1],
+            output_pad=[0, 0],
+            groups=groups,
+        )
+        assert np.array_equal(single, output[i])
+
+
+def convolve1d_batch(data, weight, bias, pad, stride, dilation, groups=1):
+    """Convolve a batch of 1D data and compare to PyTorch and to single samples"""
+    t = torch.nn.functional.conv1d(
+        torch.as_tensor(data, dtype=torch.float),
+        torch.as_tensor(weight, dtype=torch.float),
+        bias=torch.as_tensor(bias, dtype=torch.float) if bias is not None else None,
+        stride=stride,
+        padding=pad,
+        groups=groups,
+        dilation=dilation,
+    ).int().numpy()
+
+    output = compute.conv1d(
+        data,
+        weight,
+        bias,
+        data.shape[1:],
+        t.shape[1:],
+        kernel_size=weight.shape[2],
+        stride=stride,
+        pad=pad,
+        dilation=dilation,
+        groups=groups,
+    )
+
+    print("PYTORCH OK" if np.array_equal(output, t) else "*** FAILURE ***")
+    assert np.array_equal(output, t)
+
+    for i, sample in enumerate(data):
+        single = compute.conv1d(
+            sample,
+            weight,
+            bias,
+            sample.shape,
+            t.shape[1:],
+            kernel_size=weight.shape[2],
+            stride=stride,
+            pad=pad,
+            dilation=dilation,
+            groups=groups,
+        )
+        assert np.array_equal(single, output[i])
+
+
+def test_conv2d_batch():
+    """Main program to test batched compute.conv2d."""
+    state.debug = True
+    rng = np.random.default_rng(seed=1)
+
+    data = rng.integers(-128, 128, size=(5, 6, 11, 9), dtype=np.int64)
+    weight = rng.integers(-128, 128, size=(4, 6, 3, 3), dtype=np.int64)
+    bias = rng.integers(-128, 128, size=(4, ), dtype=np.int64)
+    convolve2d_batch(data, weight, bias, pad=[1, 1], stride=[1, 1], dilation=[1, 1])
+    convolve2d_batch(data, weight, None, pad=[0, 2], stride=[2, 1], dilation=[2, 1])
+
+    weight = rng.integers(-128, 128, size=(6, 1, 3, 3), dtype=np.int64)
+    convolve2d_batch(data, weight, None, pad=[1, 1], stride=[1, 1], dilation=[1, 1], groups=6)
+
+    weight = rng.integers(-128, 128, size=(4, 3, 3, 3), dtype=np.int64)
+    convolve2d_batch(data, weight, bias, pad=[1, 1], stride=[1, 1], dilation=[1, 1], groups=2)
+
+    weight = rng.integers(-128, 128, size=(4, 6, 3, 1), dtype=np.int64)
+    convolve2d_batch(data, weight, bias, pad=[1, 0], stride=[1, 1], dilation=[1, 1])
+
+
+def test_conv1d_batch():
+    """Main program to test batched compute.conv1d."""
+    state.debug = True
+    rng = np.random.default_rng(seed=2)
+
+    data = rng.integers(-128, 128, size=(5, 3, 17), dtype=np.int64)
+    weight = rng.integers(-128, 128, size=(4, 3, 9), dtype=np.int64)
+    bias = rng.integers(-128, 128, size=(4, ), dtype=np.int64)
+    convolve1d_batch(data, weight, bias, pad=4, stride=1, dilation=1)
+    convolve1d_batch(data, weight, None, pad=0, stride=1, dilation=2)
+
+    weight = rng.integers(-128, 128, size=(3, 1, 9), dtype=np.int64)
+    convolve1d_batch(data, weight, None, pad=1, stride=1, dilation=1, groups=3)
+
+    data = rng.integers(-128, 128, size=(2, 4, 17), dtype=np.int64)
+    weight = rng.integers(-128, 128, size=(6, 2, 3), dtype=np.int64)
+    convolve1d_batch(data, weight, bias[:1].repeat(6), pad=1, stride=2, dilation=1, groups=2)
+
+
+def synthesize(args, test_dir):
+    """Run the network generator on MNIST and return its output folder."""
+    subprocess.run(
+        [sys.executable, 'ai8xize.py', '--device', 'MAX78000', '--prefix', 'mnist',
+         '--checkpoint-file', os.path.join('trained', 'ai85-mnist-qat8-q.pth.tar'),
+         '--config-file', os.path.join('networks', 'mnist-chw-ai85.yaml'),
+         '--test-dir', test_dir, '--no-version-check', '--yamllint', 'none', '--overwrite',
+         '--sample-numpy-filename', 'kat.npy'] + args,
+        cwd=REPO, capture_output=True, text=True, check=True,
+    )
+    return os.path.join(test_dir, 'mnist')
+
+
+def test_sample_batch():
+    """Run `--sample-batch` on MNIST and compare each sample to a known-answer test."""
+    sample = np.load(os.path.join(REPO, 'tests', 'sample_mnist.npy'))
+    rng = np.random.default_rng(seed=3)
+    batch = np.stack((sample, rng.integers(-128, 128, size=sample.shape, dtype=sample.dtype)))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        batch_file = os.path.join(tmp, 'batch.npy')
+        np.save(batch_file, batch)
+        out = synthesize(['--sample-batch', batch_file], os.path.join(tmp, 'batch'))
+        result = np.load(os.path.join(out, 'sampleoutput_batch.npy'))
+        assert result.shape[0] == len(batch)
+
+        # Sample 0 is the default sample input
+        kat = np.load(os.path.join(out, 'kat.npy'))
+        assert np.array_equal(result[0].reshape(-1), kat.reshape(-1))
+
+        # Sample 1 must match a known-answer test generated from it as the sample input
+        sample_file = os.path.join(tmp, 'sample1.npy')
+        np.save(sample_file, batch[1])
+        out = synthesize(['--sample-input', sample_file], os.path.join(tmp, 'single'))
+        kat = np.load(os.path.join(out, 'kat.npy'))
+        assert np.array_equal(result[1].reshape(-1), kat.reshape(-1))
+
+
+if __name__ == '__main__':
+    test_conv2d_batch()
+    test_conv1d_batch()
+    test_sample_batch()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+###################################################################################################
+# Copyright (C) 2024 Maxim Integrated Products, Inc. All Rights Reserved.
+#
+# Maxim Integrated Products, Inc. Default Copyright Notice:
+# https://www.maximintegrated.com/en/aboutus/legal/copyrights.html
+###################################################################################################
+"""
+Test the simulated camera data.
+"""
+import io
+import os
+import sys
+
+import numpy as np
+
+# Allow test to run outside of pytest
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from izer import camera  # noqa: E402 pylint: disable=wrong-import-position
+
+
+def write_image(pixels, retrace):
+    """Write the image one pixel at a time, the same way as before the stream was added."""
+    f = io.StringIO()
+    camera.header(f)
+    for row in pixels.tolist():
+        for val in row:
+            camera.pixel(f, val)
+        camera.finish_row(f, retrace=retrace)
+    camera.finish_image(f)
+    return f.getvalue()
+
+
+def test_save(tmp_path):
+    """Compare the CSV and binary streams to writing one pixel at a time."""
+    rng = np.random.default_rng(seed=21)
+    for rows, cols, retrace in [(1, 1, 0), (4, 12, camera.RETRACE), (7, 30, 3)]:
+        pixels = rng.integers(0, 256, (rows, cols))
+        stream = camera.image(pixels, retrace=retrace)
+        expected = write_image(pixels, retrace)
+
+        camera.save(tmp_path / 'input.csv', stream)
+        with open(tmp_path / 'input.csv', mode='r', encoding='utf-8') as f:
+            assert f.read() == expected
+
+        camera.save(tmp_path / 'input.bin', stream, binary=True)
+        words = np.fromfile(tmp_path / 'input.bin', dtype='>u2').tolist()
+        assert [f'{w >> 10},{w >> 9 & 1},{w >> 8 & 1},{w & 0xff:02x}' for w in words] \
+            == expected.splitlines()[1:]
+
+
+if __name__ == '__main__':
+    import pathlib
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmp:
+        test_save(pathlib.Path(tmp))
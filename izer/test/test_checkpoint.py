@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+###################################################################################################
+# Copyright (C) 2024 Maxim Integrated Products, Inc. All Rights Reserved.
+#
+# Maxim Integrated Products, Inc. Default Copyright Notice:
+# https://www.maximintegrated.com/en/aboutus/legal/copyrights.html
+###################################################################################################
+"""
+Test the checkpoint cache.
+"""
+import os
+import sys
+import tempfile
+
+import numpy as np
+import torch
+
+# Allow test to run outside of pytest
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from izer import checkpoint, op, state  # noqa: E402 pylint: disable=wrong-import-position
+from izer import tornadocnn as tc  # noqa: E402 pylint: disable=wrong-import-position
+
+
+def load(filename, output_shift):
+    """Load the test checkpoint, returning the results and the modified parameters"""
+    quantization = [None, 4, None]
+    output_shift = list(output_shift)
+    results = checkpoint.load(
+        filename,
+        'testnet',
+        quantization,
+        [8, 8, 8],
+        output_shift,
+        [[3, 3], [1, 1], [1, 1]],
+        [op.CONV2D, op.CONV2D, op.LINEAR],
+        verbose=True,
+        conv_groups=[1, 1, 1],
+        bypass=[False, False, False],
+        weight_source=[None, None, None],
+    )
+    return results, quantization, output_shift
+
+
+def test_checkpoint_cache():
+    """Compare cached and uncached checkpoint data."""
+    tc.dev = tc.get_device(85)
+    rng = np.random.default_rng(seed=9)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, 'checkpoint.pth.tar')
+        torch.save({
+            'arch': 'testnet',
+            'epoch': 3,
+            'state_dict': {
+                'conv1.op.weight': torch.tensor(rng.integers(-128, 128, (4, 3, 3, 3))),
+                'conv1.op.bias': torch.tensor(rng.integers(-128, 128, (4, )) * 128.),
+                'conv1.output_shift': torch.tensor([-1.]),
+                'conv1.weight_bits': torch.tensor([8.]),
+                'conv2.op.weight': torch.tensor(rng.integers(-8, 8, (5, 4, 1, 1))),
+                'fc.op.weight': torch.zeros((10, 5)),
+                'fc.final_scale': torch.tensor(2),
+            },
+        }, filename)
+
+        state.checkpoint_cache = None
+        expected = load(filename, [None, None, 2])
+
+        state.checkpoint_cache = os.path.join(tmp, 'cache')
+        try:
+            for _ in range(2):  # Cache miss, then cache hit
+                result = load(filename, [None, None, 2])
+                (layers, weights, bias, output_shift, input_channels, output_channels,
+                 final_scale), quantization, shift_param = result
+                assert layers == expected[0][0] == 3
+                for i in range(layers):
+                    assert np.array_equal(weights[i], expected[0][1][i])
+                    assert weights[i].dtype == expected[0][1][i].dtype
+                    if expected[0][2][i] is None:
+                        assert bias[i] is None
+                    else:
+                        assert np.array_equal(bias[i], expected[0][2][i])
+                assert output_shift == expected[0][3] == shift_param == expected[2]
+                assert input_channels == expected[0][4] == [3, 4, 5]
+                assert output_channels == expected[0][5] == [4, 5, 10]
+                assert final_scale == expected[0][6] == {0: 0, 1: 0, 2: 2}
+                assert quantization == expected[1] == [8, 4, 1]
+
+            assert len(os.listdir(state.checkpoint_cache)) == 1
+
+            # Changing a parameter must not use the cached data
+            result = load(filename, [None, 1, 2])
+            assert result[2] == [-1, 5, 9]
+            assert len(os.listdir(state.checkpoint_cache)) == 2
+        finally:
+            state.checkpoint_cache = None
+
+
+if __name__ == '__main__':
+    test_checkpoint_cache()
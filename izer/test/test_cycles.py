@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 ###################################################################################################
-# Copyright (C) 2019-2022 Maxim Integrated Products, Inc. All Rights Reserved.
+# Copyright (C) 2019-2024 Maxim Integrated Products, Inc. All Rights Reserved.
 #
 # Maxim Integrated Products, Inc. Default Copyright Notice:
 # https://www.maximintegrated.com/en/aboutus/legal/copyrights.html
@@ -12,6 +12,8 @@ import os
 import sys
 from typing import List, Tuple
 
+import numpy as np
+
 # Allow test to run outside of pytest
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
 
@@ -505,5 +507,75 @@ def test_cycles() -> None:
     print('*** PASS ***')
 
 
+def test_vectorized() -> None:
+    """
+    Compare the latency of many layers at once to calculating one layer at a time
+    """
+    tc.dev = tc.get_device(85)
+    rng = np.random.default_rng(seed=25)
+    n = 200
+    args = {
+        'pool': rng.integers(1, 4, (n, 2)),
+        'pooled_dim': rng.integers(1, 64, (n, 2)),
+        'multipass': rng.integers(1, 5, n),
+        'output_chan': rng.integers(1, 65, n),
+        'output_dim': rng.integers(1, 64, (n, 2)),
+        'kernel_size': rng.choice([1, 3], (n, 1)).repeat(2, axis=1),
+        'padding': rng.integers(0, 3, (n, 2)),
+        'num_elements': rng.integers(1, 4, n),
+        'pool_first': rng.integers(0, 2, n).astype(bool),
+        'passthrough': rng.integers(0, 2, n).astype(bool),
+        'pass_out_chan': rng.integers(1, 5, n),
+        'flatten': rng.integers(0, 2, n).astype(bool),
+        'streaming': rng.integers(0, 2, n).astype(bool),
+        'kern_offs': rng.integers(0, 100, n),
+    }
+    result = latency.cycles(**args)
+
+    for ll in range(n):
+        layer = {k: v[ll].tolist() for k, v in args.items()}
+        lat, comment = latency.calculate(input_chan=16, input_dim=(64, 64),
+                                         pool_stride=(1, 1), **layer)
+        assert result[ll] == lat
+        assert comment.endswith('\n')
+        assert latency.calculate(input_chan=16, input_dim=(64, 64), pool_stride=(1, 1),
+                                 detail=False, **layer) == (lat, '')
+
+
+def test_network() -> None:
+    """
+    Check the latency of a network given as a parsed configuration
+    """
+    tc.dev = tc.get_device(85)
+    estimate = latency.network(
+        input_chan=[64, 16, 128],
+        pooled_dim=[(10, 10), (28, 28), (8, 8)],
+        output_chan=[16, 8, 16],
+        output_dim=[(12, 12), (28, 28), (8, 8)],
+        kernel_size=[(3, 3), (3, 3), (3, 3)],
+        padding=[(2, 2), (1, 1), (1, 1)],
+        pool=[(2, 2), (1, 1), (1, 1)],
+        stride=[(1, 1), (1, 1), (1, 1)],
+        operator=[op.CONV2D, op.CONV2D, op.CONV2D],
+        operands=[1, 1, 1],
+        pool_first=[True, True, True],
+        flatten=[False, False, False],
+        streaming=[False, False, True],
+        processor_map=[2**64 - 1, 0xffff, 2**64 - 1],
+        output_processor_map=[0xffff, 0xff, 0xffff],
+        output_width=[8, 8, 8],
+        layers=[0, 2],
+    )
+    # Same as 'ai85-kmax_bmax_dmax-64x20x20l_max2x2s2p2m16' and
+    # 'ai85-widein-128x8x8l_0x0s1p1m16' in test_cycles(), plus 50% for streaming
+    assert estimate.layers == [0, 2]
+    assert estimate.cycles.tolist() == [3048, (15 * 2484 + 9) // 10]
+    assert estimate.streaming.tolist() == [False, True]
+    assert estimate.total == 1 + 3048 + (15 * 2484 + 9) // 10
+    assert latency.report(estimate).splitlines()[-1].endswith(' cycles (est)')
+
+
 if __name__ == '__main__':
     test_cycles()
+    test_vectorized()
+    test_network()
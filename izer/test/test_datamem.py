@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+###################################################################################################
+# Copyright (C) 2024 Maxim Integrated Products, Inc. All Rights Reserved.
+#
+# Maxim Integrated Products, Inc. Default Copyright Notice:
+# https://www.maximintegrated.com/en/aboutus/legal/copyrights.html
+###################################################################################################
+"""
+Test the data memory maps.
+"""
+import os
+import sys
+
+import numpy as np
+
+# Allow test to run outside of pytest
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from izer import datamem  # noqa: E402 pylint: disable=wrong-import-position
+from izer import tornadocnn as tc  # noqa: E402 pylint: disable=wrong-import-position
+
+
+def random_offsets(rng, n):
+    """Return `n` random word offsets in the first two groups, with some repeats."""
+    offs = tc.dev.C_SRAM_BASE + rng.integers(0, 2) * tc.dev.C_GROUP_OFFS \
+        + rng.integers(0, 512, n) * 4
+    return offs.astype(np.int64)
+
+
+def test_store_many():
+    """Compare the batch functions to storing and checking one word at a time."""
+    tc.dev = tc.get_device(85)
+    rng = np.random.default_rng(seed=3)
+    arr = datamem.allocate()
+    arr2 = datamem.allocate()
+    for ll in range(10):
+        n = int(rng.integers(1, 300))
+        offs = random_offsets(rng, n)
+        c, row, col = rng.integers(0, 1024, (3, n))
+
+        expected = []
+        for i, o in enumerate(offs.tolist()):
+            if datamem.used(arr, o):
+                expected.append((i, datamem.unpack(arr, o)))
+            datamem.store(arr, o, (ll, int(c[i]), int(row[i]), int(col[i])))
+
+        pos, prev = datamem.conflicts(arr2, offs, datamem.pack(ll, c, row, col))
+        assert pos.tolist() == [i for i, _ in expected]
+        assert [(int(e >> 48), int(e >> 32 & 0xffff), int(e >> 16 & 0xffff), int(e & 0xffff))
+                for e in prev] == [v for _, v in expected]
+        datamem.store_many(arr2, offs, ll, c, row, col)
+        assert np.array_equal(arr, arr2)
+
+    used, ll, c, row, col = datamem.unpack_many(arr, offs)
+    assert used.all()
+    assert [(int(ll[i]), int(c[i]), int(row[i]), int(col[i])) for i in range(len(offs))] \
+        == [datamem.unpack(arr, o) for o in offs.tolist()]
+
+
+def test_layered_map():
+    """Check that a layered map reads like combined copies and does not change its maps."""
+    tc.dev = tc.get_device(85)
+    rng = np.random.default_rng(seed=4)
+    maps = []
+    for ll in range(3):
+        arr = datamem.allocate()
+        datamem.store_many(arr, np.unique(random_offsets(rng, 200)), ll, 1, 2, 3)
+        maps.append(arr)
+    originals = [np.array(m, copy=True) for m in maps]
+
+    expected = np.array(maps[0], copy=True)
+    datamem.combine(expected, maps[1])
+    layered = datamem.layered(maps[0], maps[1])
+    offs = random_offsets(rng, 1000)
+    assert np.array_equal(layered[datamem.idx(offs)], expected[datamem.idx(offs)])
+
+    datamem.combine(expected, maps[2])
+    datamem.combine(layered, maps[2])
+    assert np.array_equal(datamem.unpack_many(layered, offs)[1],
+                          datamem.unpack_many(expected, offs)[1])
+    assert [datamem.unpack(layered, o) for o in offs[:50].tolist()] \
+        == [datamem.unpack(expected, o) for o in offs[:50].tolist()]
+
+    datamem.store(layered, offs[0], (5, 0, 0, 0))
+    datamem.store(expected, offs[0], (5, 0, 0, 0))
+    assert np.array_equal(layered.array(), expected)
+    for m, o in zip(maps, originals):
+        assert np.array_equal(m, o)
+
+
+if __name__ == '__main__':
+    test_store_many()
+    test_layered_map()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+###################################################################################################
+# Copyright (C) 2024 Maxim Integrated Products, Inc. All Rights Reserved.
+#
+# Maxim Integrated Products, Inc. Default Copyright Notice:
+# https://www.maximintegrated.com/en/aboutus/legal/copyrights.html
+###################################################################################################
+"""
+Test the buffered code emitter and array defines.
+"""
+import io
+import os
+import sys
+
+import numpy as np
+
+# Allow test to run outside of pytest
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from izer import emitter, toplevel  # noqa: E402 pylint: disable=wrong-import-position
+
+
+def test_emitter():
+    """Check that output is passed on in chunks and flushed when closing."""
+    f = io.StringIO()
+    memfile = emitter.Emitter(f, chunk_size=10)
+    memfile.write('12345')
+    assert f.getvalue() == ''
+    memfile.writelines(['678', '90ab'])
+    assert f.getvalue() == '1234567890ab'
+    memfile.write('cd')
+    assert f.getvalue() == '1234567890ab'
+    memfile.flush()
+    assert f.getvalue() == '1234567890abcd'
+
+    with open(os.devnull, mode='w', encoding='utf-8') as devnull:
+        with emitter.Emitter(devnull) as memfile2:
+            memfile2.write('test')
+        assert devnull.closed
+
+    memfile.close()
+    assert memfile.closed and f.closed
+
+
+def c_define(array, define_name, fmt, columns=8, size=32):
+    """Element-by-element reference for `toplevel.c_define()`"""
+    prefix, formatting = fmt.split('%')
+    rv = f'#define {define_name} {{ \\\n  '
+    for i, e in enumerate(array):
+        if size == 8:
+            rv += f'{prefix}{e:{formatting}}'
+        else:
+            rv += f'{prefix}{e & 0xffffffff:{formatting}}'
+        if i + 1 < len(array):
+            rv += ', '
+            if (i + 1) % columns == 0:
+                rv += '\\\n  '
+    return rv + ' \\\n}\n'
+
+
+def test_c_define():
+    """Compare the output of `c_define()` to the reference for lists and arrays."""
+    rng = np.random.default_rng(seed=3)
+    tests = [
+        ([], '0x%08x', 8, 32),
+        ([1, -2, 3], '0x%08x', 8, 32),
+        (list(range(-20, 20)), '%d', 8, 8),
+        (rng.integers(-128, 128, 37).astype(np.int8), '0x%08x', 8, 32),
+        (rng.integers(0, 2**32, 64, dtype=np.uint32), '0x%08x', 8, 32),
+        (rng.integers(0, 2**32, 19, dtype=np.uint32).view(dtype='>u4'), '0x%08x', 4, 32),
+        ([np.int64(e) for e in rng.integers(-2**31, 2**31, 11)], '%d', 3, 8),
+    ]
+    for array, fmt, columns, size in tests:
+        f = io.StringIO()
+        toplevel.c_define(f, array, 'TEST', fmt, columns, size)
+        assert f.getvalue() == c_define(array, 'TEST', fmt, columns, size)
+
+
+if __name__ == '__main__':
+    test_emitter()
+    test_c_define()
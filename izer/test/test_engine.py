@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+###################################################################################################
+# Copyright (C) 2024 Maxim Integrated Products, Inc. All Rights Reserved.
+#
+# Maxim Integrated Products, Inc. Default Copyright Notice:
+# https://www.maximintegrated.com/en/aboutus/legal/copyrights.html
+###################################################################################################
+"""
+Test that all convolution engines are bit-exact with the reference engine.
+"""
+import os
+import sys
+
+import numpy as np
+import torch
+
+# Allow test to run outside of pytest
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from izer import compute, state  # noqa: E402 pylint: disable=wrong-import-position
+
+
+def run_engines(func, *args, **kwargs):
+    """Run `func` with every engine and check that all results are identical"""
+    results = {}
+    for engine in compute.ENGINES:
+        state.sim_engine = engine
+        results[engine] = func(*args, **kwargs)
+    state.sim_engine = 'reference'
+
+    expected = results['reference']
+    for engine, output in results.items():
+        print(f"{engine} OK" if np.array_equal(output, expected) else f"*** {engine} FAILURE ***")
+        assert output.dtype == expected.dtype
+        assert np.array_equal(output, expected)
+
+    return expected
+
+
+def convolve2d(data, weight, bias, pad, stride, dilation, groups=1):
+    """Convolve 2D data with all engines and compare to PyTorch"""
+    t = torch.nn.functional.conv2d(
+        torch.as_tensor(data, dtype=torch.float64),
+        torch.as_tensor(weight, dtype=torch.float64),
+        bias=torch.as_tensor(bias, dtype=torch.float64) if bias is not None else None,
+        stride=stride,
+        padding=pad,
+        groups=groups,
+        dilation=dilation,
+    ).long().numpy()
+
+    output = run_engines(
+        compute.conv2d,
+        data,
+        weight,
+        bias,
+        data.shape[-3:],
+        t.shape[-3:],
+        kernel_size=weight.shape[2:],
+        stride=stride,
+        pad=pad,
+        dilation=dilation,
+        fractional_stride=[1, 1],
+        output_pad=[0, 0],
+        groups=groups,
+    )
+
+    assert np.array_equal(output, t)
+
+
+def convolve1d(data, weight, bias, pad, stride, dilation, groups=1):
+    """Convolve 1D data with all engines and compare to PyTorch"""
+    t = torch.nn.functional.conv1d(
+        torch.as_tensor(data, dtype=torch.float64),
+        torch.as_tensor(weight, dtype=torch.float64),
+        bias=torch.as_tensor(bias, dtype=torch.float64) if bias is not None else None,
+        stride=stride,
+        padding=pad,
+        groups=groups,
+        dilation=dilation,
+    ).long().numpy()
+
+    output = run_engines(
+        compute.conv1d,
+        data,
+        weight,
+        bias,
+        data.shape[-2:],
+        t.shape[-2:],
+        kernel_size=weight.shape[2],
+        stride=stride,
+        pad=pad,
+        dilation=dilation,
+        groups=groups,
+    )
+
+    assert np.array_equal(output, t)
+
+
+def test_engine_conv2d():
+    """Main program to test the compute.conv2d engines."""
+    rng = np.random.default_rng(seed=6)
+
+    data = rng.integers(-128, 128, size=(8, 12, 10), dtype=np.int64)
+    weight = rng.integers(-128, 128, size=(5, 8, 3, 3), dtype=np.int64)
+    bias = rng.integers(-128, 128, size=(5, ), dtype=np.int64)
+    convolve2d(data, weight, bias, pad=[1, 1], stride=[1, 1], dilation=[1, 1])
+    convolve2d(data, weight, None, pad=[0, 1], stride=[2, 1], dilation=[1, 2])
+    convolve2d(data[np.newaxis].repeat(3, axis=0), weight, bias,
+               pad=[1, 1], stride=[1, 1], dilation=[1, 1])
+
+    weight = rng.integers(-128, 128, size=(8, 2, 3, 3), dtype=np.int64)
+    convolve2d(data, weight, None, pad=[1, 1], stride=[1, 1], dilation=[1, 1], groups=4)
+    weight = rng.integers(-128, 128, size=(8, 1, 3, 3), dtype=np.int64)
+    convolve2d(data, weight, None, pad=[1, 1], stride=[1, 1], dilation=[1, 1], groups=8)
+
+    weight = rng.integers(-128, 128, size=(5, 8, 1, 1), dtype=np.int64)
+    convolve2d(data, weight, bias, pad=[0, 0], stride=[1, 1], dilation=[1, 1])
+
+    # Products too large for exact float64 accumulation must fall back to the reference
+    data = rng.integers(-2**31, 2**31, size=(8, 6, 5), dtype=np.int64)
+    weight = rng.integers(-2**15, 2**15, size=(5, 8, 3, 3), dtype=np.int64)
+    convolve2d(data, weight, None, pad=[1, 1], stride=[1, 1], dilation=[1, 1])
+
+
+def test_engine_conv1d():
+    """Main program to test the compute.conv1d engines."""
+    rng = np.random.default_rng(seed=7)
+
+    data = rng.integers(-128, 128, size=(6, 40), dtype=np.int64)
+    weight = rng.integers(-128, 128, size=(7, 6, 9), dtype=np.int64)
+    bias = rng.integers(-128, 128, size=(7, ), dtype=np.int64)
+    convolve1d(data, weight, bias, pad=4, stride=1, dilation=1)
+    convolve1d(data, weight, None, pad=0, stride=3, dilation=2)
+
+    weight = rng.integers(-128, 128, size=(6, 3, 5), dtype=np.int64)
+    convolve1d(data, weight, None, pad=2, stride=1, dilation=1, groups=2)
+
+
+def test_engine_convtranspose2d():
+    """Main program to test the compute.convtranspose2d engines."""
+    rng = np.random.default_rng(seed=8)
+
+    data = rng.integers(-128, 128, size=(4, 5, 6), dtype=np.int64)
+    weight = rng.integers(-128, 128, size=(3, 4, 3, 3), dtype=np.int64)
+    output = run_engines(
+        compute.convtranspose2d,
+        data,
+        weight,
+        None,
+        data.shape,
+        (3, 10, 12),
+        kernel_size=[3, 3],
+        stride=[1, 1],
+        pad=[1, 1],
+        dilation=[1, 1],
+        fractional_stride=[2, 2],
+        output_pad=[1, 1],
+    )
+    assert output.shape == (3, 10, 12)
+
+
+if __name__ == '__main__':
+    test_engine_conv2d()
+    test_engine_conv1d()
+    test_engine_convtranspose2d()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+###################################################################################################
+# Copyright (C) 2024 Maxim Integrated Products, Inc. All Rights Reserved.
+#
+# Maxim Integrated Products, Inc. Default Copyright Notice:
+# https://www.maximintegrated.com/en/aboutus/legal/copyrights.html
+###################################################################################################
+"""
+Test batch mode (job file loading and running jobs in worker processes).
+"""
+import filecmp
+import os
+import sys
+import tempfile
+
+# Allow test to run outside of pytest
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from izer import jobs  # noqa: E402 pylint: disable=wrong-import-position
+
+REPO = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+
+def test_load():
+    """Test job file parsing."""
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, 'jobs.yaml')
+        with open(filename, mode='w', encoding='utf-8') as f:
+            f.write("common: --device MAX78000 --verbose\n"
+                    "jobs:\n"
+                    "  - --prefix first --config-file 'a b.yaml'\n"
+                    "  - name: second\n"
+                    "    args: [--prefix, x]\n")
+
+        result = jobs.load(filename, ['--rtl'])
+        assert result == [
+            jobs.Job('first', ['--prefix', 'first', '--config-file', 'a b.yaml',
+                               '--device', 'MAX78000', '--verbose', '--rtl']),
+            jobs.Job('second', ['--prefix', 'x', '--device', 'MAX78000', '--verbose', '--rtl']),
+        ]
+
+
+def test_run():
+    """Run the same network twice in one worker, and check the state does not leak."""
+    cwd = os.getcwd()
+    os.chdir(REPO)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            args = ['--device', 'MAX78000', '--rtl', '--config-file',
+                    'tests/test-conv1d-pool-9-q4.yaml', '--no-version-check',
+                    '--yamllint', 'none', '--no-progress']
+            results = jobs.run([
+                jobs.Job('first', ['--test-dir', os.path.join(tmp, 'a'), '--prefix', 'x']
+                         + args),
+                jobs.Job('bad', ['--test-dir', os.path.join(tmp, 'c'), '--prefix', 'x',
+                                 '--device', 'MAX78000', '--config-file', 'nonexistent.yaml',
+                                 '--no-version-check']),
+                jobs.Job('second', ['--test-dir', os.path.join(tmp, 'b'), '--prefix', 'x']
+                         + args),
+            ], workers=1)
+
+            assert [r.returncode for r in results] == [0, 1, 0]
+            assert [r.name for r in results] == ['first', 'bad', 'second']
+            assert 'nonexistent.yaml' in results[1].stderr
+
+            dirs = [os.path.join(tmp, e, 'x-3x18l_0s1p2m5') for e in ['a', 'b']]
+            comparison = filecmp.dircmp(*dirs)
+            assert comparison.left_list == comparison.right_list
+            _, mismatch, errors = filecmp.cmpfiles(*dirs, comparison.common_files,
+                                                   shallow=False)
+            # Only the log file may refer to the test directory
+            assert set(mismatch) <= {'log.txt'} and not errors
+
+            print(jobs.summary(results, 1.0))
+    finally:
+        os.chdir(cwd)
+
+
+if __name__ == '__main__':
+    test_load()
+    test_run()
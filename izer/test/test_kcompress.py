@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+###################################################################################################
+# Copyright (C) 2024 Maxim Integrated Products, Inc. All Rights Reserved.
+#
+# Maxim Integrated Products, Inc. Default Copyright Notice:
+# https://www.maximintegrated.com/en/aboutus/legal/copyrights.html
+###################################################################################################
+"""
+Test the compressed kernel stream.
+"""
+import os
+import sys
+
+import numpy as np
+
+# Allow test to run outside of pytest
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from izer import kcompress  # noqa: E402 pylint: disable=wrong-import-position
+
+
+def decompress(stream, dictionary):
+    """Same as the generated `cnn_load_weights()`, returns a list of (address, kernels)"""
+    stream = stream.tolist()
+    rv = []
+    pos = 0
+    while True:
+        addr = int.from_bytes(bytes(stream[pos:pos + 4]), byteorder='big')
+        pos += 4
+        if addr == 0:
+            return rv
+        kernels = []
+        while (n := stream[pos]) != kcompress.END:
+            pos += 1
+            if n < kcompress.ZERO:
+                for _ in range(n):
+                    kernels.append(stream[pos:pos + 9])
+                    pos += 9
+            elif n < kcompress.DICTIONARY:
+                kernels += [[0] * 9] * (n - kcompress.ZERO + 1)
+            else:
+                idx = (n & ~kcompress.DICTIONARY) << 8 | stream[pos]
+                pos += 1
+                kernels.append(dictionary[idx * 9:idx * 9 + 9].tolist())
+        pos += 1
+        rv.append((addr, kernels))
+
+
+def test_compress():
+    """Check that the stream decompresses to the original kernels."""
+    rng = np.random.default_rng(seed=7)
+    repeated = rng.integers(0, 256, (5, 9), dtype=np.uint8)
+    addresses = []
+    chunks = []
+    for i in range(20):
+        length = int(rng.integers(1, 400))
+        chunk = rng.integers(0, 256, (length, 9), dtype=np.uint8)
+        kind = rng.integers(0, 4, length)
+        chunk[kind == 0] = 0
+        chunk[kind == 1] = repeated[rng.integers(0, len(repeated), np.count_nonzero(kind == 1))]
+        if i == 0:
+            chunk[:200] = 0  # Longer than the maximum run
+        addresses.append(0x51400000 + i * 0x10000)
+        chunks.append(chunk)
+
+    stream, dictionary, stats = kcompress.compress(addresses, chunks)
+    result = decompress(stream, dictionary)
+    assert [addr for addr, _ in result] == addresses
+    for (_, kernels), chunk in zip(result, chunks):
+        assert kernels == chunk.tolist()
+    assert stats.kernels == stats.literal + stats.zero + stats.dictionary == sum(map(len, chunks))
+    assert stats.entries == len(repeated) and len(dictionary) == len(repeated) * 9
+    assert stats.size == len(stream) + len(dictionary)
+
+    stream, dictionary, stats = kcompress.compress([], [])
+    assert stream.tolist() == [0, 0, 0, 0] and len(dictionary) == 0 and stats.kernels == 0
+
+
+if __name__ == '__main__':
+    test_compress()
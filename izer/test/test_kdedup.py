@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+###################################################################################################
+# Copyright (C) 2024 Maxim Integrated Products, Inc. All Rights Reserved.
+#
+# Maxim Integrated Products, Inc. Default Copyright Notice:
+# https://www.maximintegrated.com/en/aboutus/legal/copyrights.html
+###################################################################################################
+"""
+Test the layer and kernel level deduplication.
+"""
+import os
+import sys
+
+import numpy as np
+
+# Allow test to run outside of pytest
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from izer import kdedup  # noqa: E402 pylint: disable=wrong-import-position
+
+
+def test_deduplicate():
+    """Check that only layers with the same weights, quantization and processors are shared."""
+    rng = np.random.default_rng(seed=1)
+    w = [rng.integers(-128, 128, (16, 3, 3), dtype=np.int64) for _ in range(3)]
+    weights = [w[0], w[1], w[0].copy(), None, w[0].copy(), w[1].copy(), w[2]]
+    quantization = [8, 8, 8, 8, 4, 8, 8]
+    processor_map = [1, 1, 1, 1, 1, 1, 1]
+
+    ptrs, out = kdedup.deduplicate(weights, len(weights), quantization, processor_map)
+    assert ptrs == [0, 1, 0, None, 4, 1, 6]
+    assert [e is None for e in out] == [False, False, True, True, False, True, False]
+
+
+def test_analyze_kernels():
+    """Check the kernel level duplicate counts."""
+    k = np.array([[1, 2, 3, 4, 5, 6, 7, 8, 9], [0] * 9, [1, 2, 3, 4, 5, 6, 7, 8, 9]])
+    weights = [
+        np.stack([k[0], k[1], k[2], k[1]]).reshape(4, 3, 3),  # 2 duplicates (1 zero)
+        np.stack([k[0], k[0]]).reshape(2, 3, 3),  # 2 duplicates, but 4-bit
+        np.arange(10).reshape(10, 1, 1),  # 1x1, not counted
+        k[0].reshape(1, 3, 3),  # Another duplicate of the first layer
+    ]
+    stats = kdedup.analyze_kernels(weights, len(weights), [8, 4, 8, 8],
+                                   [[3, 3], [3, 3], [1, 1], [3, 3]])
+    assert stats == kdedup.KernelStats(kernels=7, unique=3, zero=2,
+                                       duplicate_bytes=3 * 9 + 1 * 9 // 2, zero_bytes=2 * 9)
+
+
+if __name__ == '__main__':
+    test_deduplicate()
+    test_analyze_kernels()
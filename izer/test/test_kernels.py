@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+###################################################################################################
+# Copyright (C) 2024 Maxim Integrated Products, Inc. All Rights Reserved.
+#
+# Maxim Integrated Products, Inc. Default Copyright Notice:
+# https://www.maximintegrated.com/en/aboutus/legal/copyrights.html
+###################################################################################################
+"""
+Test the kernel memory search.
+"""
+import functools
+import os
+import sys
+
+import numpy as np
+
+# Allow test to run outside of pytest
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from izer import kernels  # noqa: E402 pylint: disable=wrong-import-position
+from izer import tornadocnn as tc  # noqa: E402 pylint: disable=wrong-import-position
+
+_INVALID_VALUE = kernels._INVALID_VALUE  # pylint: disable=protected-access
+
+
+def random_map(rng, runs):
+    """Return a MAX78002 kernel map with `runs` random runs of used columns per processor."""
+    kernel_map = np.full((tc.dev.MAX_PROC, tc.dev.MASK_WIDTH_LARGE), fill_value=_INVALID_VALUE,
+                         dtype=np.int64)
+    for p in range(tc.dev.MAX_PROC):
+        for _ in range(rng.integers(0, runs + 1)):
+            start = int(rng.integers(0, tc.dev.mask_width(p)))
+            kernel_map[p][start:start + int(rng.integers(1, 200))] = p
+    return kernel_map
+
+
+def check(p, offs, reverse=False, length=0):
+    """Same as `check_kernel_mem()` in `kernels.load()` without error messages"""
+    return offs >= 0 if reverse else offs + length <= tc.dev.mask_width(p)
+
+
+def test_first_used():
+    """Compare the vectorized window check to the column by column scan."""
+    tc.dev = tc.get_device(87)
+    rng = np.random.default_rng(seed=11)
+    kernel_map = random_map(rng, 8)
+    for _ in range(5000):
+        p = int(rng.integers(0, tc.dev.MAX_PROC))
+        offs = int(rng.integers(0, tc.dev.MASK_WIDTH_LARGE))
+        length = int(rng.integers(0, 300))
+        reverse = bool(rng.integers(0, 2))
+        if not reverse:
+            length = min(length, tc.dev.MASK_WIDTH_LARGE - offs)
+        assert kernels.first_used(kernel_map, p, offs, length, reverse) \
+            == kernels.scan_kernel_mem(kernel_map, p, offs, length, reverse)
+
+
+def test_search_kernel_mem():
+    """Compare the vectorized search to the column by column search."""
+    tc.dev = tc.get_device(87)
+    rng = np.random.default_rng(seed=5)
+    for trial in range(300):
+        kernel_map = random_map(rng, trial % 12)
+        proc_map = 0
+        while proc_map == 0:
+            proc_map = int(rng.integers(0, 2**64, dtype=np.uint64)) \
+                & int(rng.choice([0xffffffffffffffff, 0xffff, 0xffff0000, 0x0f0f0f0f0f0f0f0f]))
+        reverse = bool(rng.integers(0, 2))
+        weight_mask = bool(rng.integers(0, 2))
+        if reverse:
+            length = int(rng.integers(1, tc.dev.MASK_INSTANCE_SMALL + 1))
+            offs = tc.dev.MASK_WIDTH_LARGE - 1
+        else:
+            length = int(rng.integers(1, 600))
+            offs = int(rng.integers(0, 64)) * tc.dev.P_SHARED
+
+        results = [
+            kernels.search_kernel_mem(kernel_map, length, offs, proc_map,
+                                      functools.partial(check, length=length),
+                                      weight_mask=weight_mask, reverse=reverse,
+                                      vectorized=vectorized)
+            for vectorized in (False, True)
+        ]
+        assert results[0] == results[1]
+
+
+def test_plan_kernel_order():
+    """Check that the planned order fits layers that do not fit in the given order."""
+    tc.dev = tc.get_device(85)
+    # Processor maps and kernel lengths. In this order, layer 1 is placed after layer 0 on
+    # processor 0, which splits the free space on processor 1 so that layer 2 does not fit.
+    footprints = [(0x1, 400), (0x3, 300), (0x2, 450)]
+
+    def place(ll, kmap):
+        proc_map, length = footprints[ll]
+        offs = kernels.search_kernel_mem(kmap, length, 0, proc_map,
+                                         functools.partial(check, length=length))
+        return offs if offs >= 0 and offs + length <= tc.dev.MASK_WIDTH_LARGE else -1
+
+    order, unplaced, tried = kernels.plan_kernel_order([0, 1, 2], place,
+                                                       footprints.__getitem__, 1.0)
+    assert unplaced == 0 and order[0] == 1 and tried > 1
+
+    # An order that fits is kept
+    order, unplaced, tried = kernels.plan_kernel_order([1, 0, 2], place,
+                                                       footprints.__getitem__, 1.0)
+    assert unplaced == 0 and order == [1, 0, 2] and tried == 1
+
+    # When nothing fits, the time limit ends the search
+    footprints.append((0x3, tc.dev.MASK_WIDTH_LARGE))
+    _, unplaced, _ = kernels.plan_kernel_order([0, 1, 2, 3], place, footprints.__getitem__, 0.2)
+    assert unplaced > 0
+
+
+def test_utilization():
+    """Check the kernel memory statistics."""
+    tc.dev = tc.get_device(85)
+    kernel_map = np.full((tc.dev.MAX_PROC, tc.dev.MASK_WIDTH_LARGE), fill_value=_INVALID_VALUE,
+                         dtype=np.int64)
+    kernel_map[0][10:20] = 0
+    kernel_map[0][100:200] = 1
+    kernel_map[1][0:tc.dev.MASK_WIDTH_LARGE] = 1
+    stats = kernels.utilization(kernel_map)
+    assert stats[0] == (110, tc.dev.MASK_WIDTH_LARGE, 3, tc.dev.MASK_WIDTH_LARGE - 200)
+    assert stats[1] == (tc.dev.MASK_WIDTH_LARGE, tc.dev.MASK_WIDTH_LARGE, 0, 0)
+    assert stats[2] == (0, tc.dev.MASK_WIDTH_LARGE, 1, tc.dev.MASK_WIDTH_LARGE)
+
+
+if __name__ == '__main__':
+    test_first_used()
+    test_search_kernel_mem()
+    test_plan_kernel_order()
+    test_utilization()
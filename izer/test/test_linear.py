@@ -8,6 +8,7 @@
 """
 Test the linear operator.
 """
+import io
 import os
 import sys
 from pathlib import Path
@@ -18,7 +19,7 @@ import torch
 # Allow test to run outside of pytest
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
 
-from izer import compute, state  # noqa: E402 pylint: disable=wrong-import-position
+from izer import compute, state, stats  # noqa: E402 pylint: disable=wrong-import-position
 
 
 def linear(data, weight, bias, expected):
@@ -340,5 +341,39 @@ def test_linear():
     linear(d3, w3, None, e3)
 
 
+def test_linear_debug():
+    """Test compute.linear accounting and per-MAC debug logging."""
+    rng = np.random.default_rng(seed=3)
+    data = rng.integers(-128, 128, size=(17, ), dtype=np.int64)
+    weight = rng.integers(-128, 128, size=(5, 17), dtype=np.int64)
+    bias = rng.integers(-128, 128, size=(5, ), dtype=np.int64)
+
+    t = torch.nn.functional.linear(
+        torch.as_tensor(data, dtype=torch.float).unsqueeze(0),  # Add batch dimension
+        torch.as_tensor(weight, dtype=torch.float),
+        torch.as_tensor(bias, dtype=torch.float),
+    ).int().squeeze().numpy()
+
+    macc = stats.get(1, 'true_sw_macc')
+    state.debug_computation = True
+    state.debug_log = io.StringIO()
+    try:
+        output = compute.linear(1, data, weight, bias, in_features=17, out_features=5)
+        log = state.debug_log.getvalue().splitlines()
+    finally:
+        state.debug_computation = False
+        state.debug_log = None
+
+    assert np.array_equal(output, t)
+    assert stats.get(1, 'true_sw_macc') - macc == 17 * 5
+
+    # One line per MAC plus one line per bias
+    assert len(log) == 5 * (17 + 1)
+    assert log[16] == f'w=0, n=16, weight={weight[0][16]}, data={data[16]} ' \
+        f'-> accumulator = {np.dot(weight[0], data)} '
+    assert log[17] == f'+bias {bias[0]} --> output[0] = {t[0]}'
+
+
 if __name__ == '__main__':
     test_linear()
+    test_linear_debug()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+###################################################################################################
+# Copyright (C) 2024 Maxim Integrated Products, Inc. All Rights Reserved.
+#
+# Maxim Integrated Products, Inc. Default Copyright Notice:
+# https://www.maximintegrated.com/en/aboutus/legal/copyrights.html
+###################################################################################################
+"""
+Test the input data packing.
+"""
+import os
+import sys
+
+import numpy as np
+
+# Allow test to run outside of pytest
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from izer import load  # noqa: E402 pylint: disable=wrong-import-position
+from izer.utils import s2u  # noqa: E402 pylint: disable=wrong-import-position
+
+
+def test_pack_bytes():
+    """Compare CHW words to shifting in one byte at a time."""
+    rng = np.random.default_rng(seed=11)
+    for length in (1, 3, 4, 29 * 31):
+        data = rng.integers(-128, 128, length)
+        expected = []
+        val = 0
+        for i, e in enumerate(data.tolist()):
+            val |= (s2u(e) & 0xff) << (i % 4) * 8
+            if i % 4 == 3 or i == length - 1:
+                expected.append(val)
+                val = 0
+        assert load.pack_bytes(data).tolist() == expected
+
+
+def test_hwc_words():
+    """Compare HWC words to packing the channels of one pixel and operand at a time."""
+    rng = np.random.default_rng(seed=12)
+    for chan, operands, c, instance_map in [(3, 1, 0, 0x7), (31, 5, 28, 0xf), (6, 2, 4, 0xa),
+                                            (8, 1, 4, 0x5)]:
+        data = rng.integers(-128, 128, (chan * operands, 5, 7))
+        words = load.hwc_words(data, chan, c, instance_map, operands)
+        assert words.shape == (5 * 7, operands)
+        for row in range(5):
+            for col in range(7):
+                for op in range(operands):
+                    val = 0
+                    this_c = c
+                    for i in range(4):
+                        if instance_map & 2**i:
+                            if this_c < len(data) // operands:
+                                val |= (s2u(data[this_c + op*chan][row][col]) & 0xff) << (i * 8)
+                            this_c += 1
+                    assert words[row * 7 + col][op] == val
+
+
+def test_fifo_routing():
+    """Compare the FIFO routing to walking the processor map for each channel."""
+    for processor_map, chan in [(0x0000000000000001, 1), (0x0000000100010001, 3),
+                                (0x0001000000010001, 5), (0x000f000f000f000f, 16),
+                                (0x00070000000f000f, 12), (0x0000000500000003, 8)]:
+        pmap = 0
+        expected = []
+        for _ in range(chan):
+            if pmap == 0:
+                pmap = processor_map
+                fifo = 0
+            while pmap & 1 == 0:
+                pmap >>= 16
+                fifo += 1
+            expected.append(fifo)
+            pmap >>= 16
+            fifo += 1
+        assert [fifo for fifo, _ in load.fifo_routing(processor_map, chan, True)] == expected
+
+        pmap = 0
+        expected = []
+        for _ in range(0, chan, 4):
+            if pmap == 0:
+                pmap = processor_map
+                fifo = 0
+            while pmap & 0x0f == 0:
+                pmap >>= 16
+                fifo += 1
+            expected.append((fifo, pmap & 0x0f))
+            pmap >>= 16
+            fifo += 1
+        assert load.fifo_routing(processor_map, (chan + 3) // 4, False) == expected
+
+
+if __name__ == '__main__':
+    test_pack_bytes()
+    test_hwc_words()
+    test_fifo_routing()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+###################################################################################################
+# Copyright (C) 2024 Maxim Integrated Products, Inc. All Rights Reserved.
+#
+# Maxim Integrated Products, Inc. Default Copyright Notice:
+# https://www.maximintegrated.com/en/aboutus/legal/copyrights.html
+###################################################################################################
+"""
+Test the pool1d and pool2d operators.
+"""
+import os
+import sys
+
+import numpy as np
+import torch
+
+# Allow test to run outside of pytest
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from izer import compute, state  # noqa: E402 pylint: disable=wrong-import-position
+
+
+def pool2d(data, pool, stride, dilation, average, floor=True):
+    """Pool 2D data and compare to PyTorch"""
+    if average:
+        t = torch.nn.functional.avg_pool2d(
+            torch.as_tensor(data, dtype=torch.float),
+            kernel_size=pool,
+            stride=stride,
+        ).numpy()
+        t = np.trunc(t) if floor else np.where(t < 0., np.ceil(t - 0.5), np.floor(t + 0.5))
+        t = t.astype(np.int64)
+    else:
+        t = torch.nn.functional.max_pool2d(
+            torch.as_tensor(data, dtype=torch.float),
+            kernel_size=pool,
+            stride=stride,
+            dilation=dilation,
+        ).int().numpy()
+
+    output = compute.pool2d(
+        data,
+        data.shape,
+        t.shape,
+        pool,
+        stride,
+        average,
+        dilation=dilation,
+        floor=floor,
+    )
+
+    print("PYTORCH OK" if np.array_equal(output, t) else "*** FAILURE ***")
+    assert np.array_equal(output, t)
+
+
+def pool1d(data, pool, stride, dilation, average, floor=True):
+    """Pool 1D data and compare to PyTorch"""
+    if average:
+        t = torch.nn.functional.avg_pool1d(
+            torch.as_tensor(data, dtype=torch.float),
+            kernel_size=pool,
+            stride=stride,
+        ).numpy()
+        t = np.trunc(t) if floor else np.where(t < 0., np.ceil(t - 0.5), np.floor(t + 0.5))
+        t = t.astype(np.int64)
+    else:
+        t = torch.nn.functional.max_pool1d(
+            torch.as_tensor(data, dtype=torch.float),
+            kernel_size=pool,
+            stride=stride,
+            dilation=dilation,
+        ).int().numpy()
+
+    output = compute.pool1d(
+        data,
+        data.shape,
+        t.shape,
+        pool,
+        stride,
+        average,
+        dilation=dilation,
+        floor=floor,
+    )
+
+    print("PYTORCH OK" if np.array_equal(output, t) else "*** FAILURE ***")
+    assert np.array_equal(output, t)
+
+
+def test_pool2d():
+    """Main program to test compute.pool2d."""
+    state.debug = True
+    rng = np.random.default_rng(seed=4)
+    data = rng.integers(-128, 128, size=(5, 13, 11), dtype=np.int64)
+
+    pool2d(data, [2, 2], [2, 2], [1, 1], average=False)
+    pool2d(data, [3, 2], [1, 2], [2, 3], average=False)
+    pool2d(data, [2, 2], [2, 2], [1, 1], average=True)
+    pool2d(data, [3, 3], [2, 1], [1, 1], average=True)
+    pool2d(data, [3, 3], [2, 1], [1, 1], average=True, floor=False)
+
+
+def test_pool1d():
+    """Main program to test compute.pool1d."""
+    state.debug = True
+    rng = np.random.default_rng(seed=5)
+    data = rng.integers(-128, 128, size=(6, 37), dtype=np.int64)
+
+    pool1d(data, 2, 2, 1, average=False)
+    pool1d(data, 3, 1, 2, average=False)
+    pool1d(data, 4, 4, 1, average=True)
+    pool1d(data, 3, 2, 1, average=True)
+    pool1d(data, 3, 2, 1, average=True, floor=False)
+
+
+def test_pooling_partial():
+    """Test windows that extend beyond the data."""
+    state.debug = True
+    data = np.array([[-7, 3, 5, -2, 9, -4]], dtype=np.int64)
+
+    # Output size as computed by simulate.pooling_layer for pool 3, stride 2, dilation 2
+    # is (6 + 2 - 3 - 2 + 1) // 2 = 2; the second window only has two valid elements.
+    output = compute.pool1d(data, data.shape, [1, 2], 3, 2, True, dilation=2)
+    assert np.array_equal(output, [[(-7 + 5 + 9) // 3, (5 + 9) // 2]])
+    output = compute.pool1d(data, data.shape, [1, 2], 3, 2, True, dilation=2, floor=False)
+    assert np.array_equal(output, [[2, 7]])
+    output = compute.pool1d(-data, data.shape, [1, 2], 3, 2, True, dilation=2)
+    assert np.array_equal(output, [[-2, -7]])
+    output = compute.pool1d(data, data.shape, [1, 2], 3, 2, False, dilation=2)
+    assert np.array_equal(output, [[9, 9]])
+
+
+if __name__ == '__main__':
+    test_pool2d()
+    test_pool1d()
+    test_pooling_partial()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+###################################################################################################
+# Copyright (C) 2024 Maxim Integrated Products, Inc. All Rights Reserved.
+#
+# Maxim Integrated Products, Inc. Default Copyright Notice:
+# https://www.maximintegrated.com/en/aboutus/legal/copyrights.html
+###################################################################################################
+"""
+Test the sample input data.
+"""
+import os
+import sys
+
+import numpy as np
+
+# Allow test to run outside of pytest
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from izer import sampledata  # noqa: E402 pylint: disable=wrong-import-position
+from izer.utils import s2u, u2s  # noqa: E402 pylint: disable=wrong-import-position
+
+
+def test_synthesize(tmp_path):
+    """Compare the synthesized input to adding to one 32-bit word at a time."""
+    rng = np.random.default_rng(seed=24)
+    for chan, dim, words, add in [(1, (4, 6), 8, 0x11), (3, (8, 16), 8, 0x112233),
+                                  (4, (2, 32), 16, 0xfedcba98), (2, (64,), 4, -3)]:
+        data = rng.integers(-128, 128, (chan, *dim))
+        np.save(tmp_path / 'sample.npy', data, allow_pickle=False, fix_imports=False)
+        assert np.array_equal(sampledata.get(tmp_path / 'sample.npy'), data)
+
+        expected = data.reshape(chan, -1).copy()
+        mask = (1 << chan * 8) - 1
+        for i in range(words, expected.shape[1], words):
+            for j in range(words):
+                val = 0
+                for c in range(chan - 1, -1, -1):
+                    val = val << 8 | s2u(expected[c, i + j - words])
+                val = (val + add) & mask
+                for c in range(chan - 1, -1, -1):
+                    expected[c, i + j] = u2s((val >> c * 8) & 0xff)
+
+        result = sampledata.get(tmp_path / 'sample.npy', synthesize_input=add,
+                                synthesize_words=words)
+        assert result.shape == data.shape
+        assert np.array_equal(result.reshape(chan, -1), expected)
+
+
+if __name__ == '__main__':
+    import pathlib
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmp:
+        test_synthesize(pathlib.Path(tmp))
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+###################################################################################################
+# Copyright (C) 2024 Maxim Integrated Products, Inc. All Rights Reserved.
+#
+# Maxim Integrated Products, Inc. Default Copyright Notice:
+# https://www.maximintegrated.com/en/aboutus/legal/copyrights.html
+###################################################################################################
+"""
+Test the layer simulation scheduler.
+"""
+import os
+import sys
+import threading
+import time
+
+# Allow test to run outside of pytest
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from izer.scheduler import Scheduler  # noqa: E402 pylint: disable=wrong-import-position
+
+
+def test_scheduler(capsys=None):
+    """Run a branching graph and check results, concurrency and output order."""
+    started = threading.Barrier(2, timeout=10)
+
+    def branch(name, value):
+        def run(results):
+            # Both branches must be running at the same time to pass the barrier
+            started.wait()
+            print(f'branch {name}')
+            return results[0] + value
+        return run
+
+    def first(_):
+        print('first')
+        return 1
+
+    def merge(results):
+        print('merge')
+        return results[1] * results[2]
+
+    with Scheduler(4) as scheduler:
+        scheduler.submit(0, first)
+        scheduler.submit(1, branch('b', 10), [0])
+        scheduler.submit(2, branch('a', 20), [0])
+        scheduler.submit(3, merge, [1, 2])
+
+        # Let the branches finish in any order, output must follow the order of result()
+        time.sleep(0.1)
+        for key, expected in ((0, 1), (1, 11), (2, 21), (3, 231)):
+            assert scheduler.result(key) == expected
+
+    if capsys is not None:
+        assert capsys.readouterr().out == 'first\nbranch b\nbranch a\nmerge\n'
+
+
+def test_scheduler_error(capsys=None):
+    """Check that a task's exception is raised by result() after its output."""
+    def fail(_):
+        print('failing')
+        sys.exit(1)
+
+    with Scheduler(2) as scheduler:
+        scheduler.submit(0, fail)
+        scheduler.submit(1, lambda results: results[0], [0])
+        try:
+            scheduler.result(0)
+        except SystemExit:
+            pass
+        else:
+            assert False, 'SystemExit not raised'
+
+    if capsys is not None:
+        assert capsys.readouterr().out == 'failing\n'
+
+
+if __name__ == '__main__':
+    test_scheduler()
+    test_scheduler_error()
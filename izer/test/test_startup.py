@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+###################################################################################################
+# Copyright (C) 2024 Maxim Integrated Products, Inc. All Rights Reserved.
+#
+# Maxim Integrated Products, Inc. Default Copyright Notice:
+# https://www.maximintegrated.com/en/aboutus/legal/copyrights.html
+###################################################################################################
+"""
+Test that slow dependencies are not imported at startup.
+"""
+import os
+import subprocess
+import sys
+
+REPO = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+
+def test_deferred_imports():
+    """Import the generator in a new interpreter and check for slow modules."""
+    result = subprocess.run(
+        [sys.executable, '-c',
+         'import sys; from izer import izer; '
+         'print(" ".join(m for m in ("torch", "onnx", "git", "github") if m in sys.modules))'],
+        cwd=REPO, capture_output=True, text=True, check=True,
+    )
+    assert result.stdout.strip() == ''
+
+
+if __name__ == '__main__':
+    test_deferred_imports()
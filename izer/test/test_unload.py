@@ -1,12 +1,12 @@
 #!/usr/bin/env python3
 ###################################################################################################
-# Copyright (C) 2019-2021 Maxim Integrated Products, Inc. All Rights Reserved.
+# Copyright (C) 2019-2024 Maxim Integrated Products, Inc. All Rights Reserved.
 #
 # Maxim Integrated Products, Inc. Default Copyright Notice:
 # https://www.maximintegrated.com/en/aboutus/legal/copyrights.html
 ###################################################################################################
 """
-Test unload() / flatten() software operator
+Test unload() / flatten() software operator, and the output verification
 """
 import os
 import sys
@@ -17,6 +17,8 @@ import numpy as np
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
 
 import izer.tornadocnn as tc  # noqa: E402 pylint: disable=wrong-import-position
+from izer import datamem, state  # noqa: E402 pylint: disable=wrong-import-position
+from izer import unload as unload_ops  # noqa: E402 pylint: disable=wrong-import-position
 from izer.utils import ffs, popcount  # noqa: E402 pylint: disable=wrong-import-position
 
 MEM_INVALID = -(2**63)  # When encountering this value, we know the array value was not initialized
@@ -246,5 +248,130 @@ def test_unload():
     assert np.array_equal(expected, computed)
 
 
+def verify_words(processor_map, input_shape, out_buf, out_offset, out_expand,
+                 out_expand_thresh, output_width, write_gap):
+    """
+    Return the expected address, data, mask and comment passed to `verify_many_fn` by
+    `unload.verify()` and the memory map entry for each HWC word, one word at a time.
+    """
+    rv = []
+    coffs_start = ffs(processor_map) & ~(tc.dev.P_SHARED-1)
+    next_layer_map = processor_map >> coffs_start
+    out_size = output_width // 8
+    width = out_expand * out_size
+
+    for doffs in range(input_shape[1] * input_shape[2]):
+        row, col = divmod(doffs, input_shape[2])
+        this_map = next_layer_map
+        poffs = coffs_start
+        c = 0
+        while c < input_shape[0]:
+            if c % out_expand_thresh == 0:
+                poffs = coffs_start
+                this_map = next_layer_map
+            this_c = c
+            expand = c // out_expand_thresh
+            proc = poffs & ~(tc.dev.P_SHARED-1)
+
+            val = [0] * 4
+            for i in range(4):
+                if this_map & 1:
+                    if c < input_shape[0]:
+                        val[i] = int(out_buf[c][row][col])
+                    c += 1
+                this_map >>= 1
+
+            offs = tc.dev.C_SRAM_BASE + out_offset + \
+                (((proc % tc.dev.P_NUMPRO) * tc.dev.INSTANCE_SIZE |
+                  (proc // tc.dev.P_NUMPRO) * tc.dev.C_GROUP_OFFS // 4) +
+                 (doffs * width + expand * out_size) * (write_gap + 1)) * 4
+
+            if c != this_c:
+                num_bytes = min(c - this_c, input_shape[0] - this_c)
+                if out_size == 1:
+                    rv.append((offs, sum((v & 0xff) << i * 8 for i, v in enumerate(val)),
+                               ((1 << num_bytes * 8) - 1) << (ffs(processor_map >> proc) % 4) * 8,
+                               f' // {this_c}-{this_c+num_bytes-1},{row},{col}',
+                               (this_c, row, col)))
+                else:
+                    for i in range(min(num_bytes, out_size)):
+                        rv.append((offs + i * out_size, val[i] & 0xffffffff, 0xffffffff,
+                                   f' // {this_c+i},{row},{col}', (this_c, row, col)))
+            poffs += 4
+    return rv
+
+
+def test_verify():
+    """
+    Compare the HWC words and the memory map of unload.verify() to one word at a time
+    """
+    tc.dev = tc.get_device(85)
+    state.layer_name = [None] * 4
+    rng = np.random.default_rng(seed=5)
+    calls = []
+
+    def verify_many_fn(addrs, vals, masks, comments=None, rv=False, data=False):
+        assert not rv and data
+        calls.extend(zip(addrs.tolist(), vals.tolist(), masks.tolist(), comments))
+
+    for processor_map, shape, out_expand, output_width, write_gap in [
+            (0x0000000000000fff, (12, 4, 4), 1, 8, 0),
+            (0x0000000000000fff, (12, 4, 4), 1, 32, 0),
+            (0xffffffffffffffff, (100, 3, 5), 2, 8, 1),
+            (0x00000000ff00f0f5, (17, 2, 7), 1, 8, 0),
+            (0x00000000ff00f0ff, (24, 2, 7), 2, 32, 0),
+    ]:
+        out_buf = rng.integers(-2**31, 2**31, shape, dtype=np.int64)
+        out_expand_thresh = (shape[0] + out_expand - 1) // out_expand
+        out_expand_thresh = (out_expand_thresh + 3) & ~3
+        calls.clear()
+        in_map = datamem.allocate()
+        out_map = datamem.allocate()
+        unload_ops.verify(None, verify_many_fn, 3, in_map, out_map, out_buf, processor_map, shape,
+                          0x100, out_expand, out_expand_thresh, output_width,
+                          body=[], write_gap=write_gap, unload_layer=True)
+
+        expected = verify_words(processor_map, shape, out_buf, 0x100, out_expand,
+                                out_expand_thresh, output_width, write_gap)
+        assert calls == [e[:4] for e in expected]
+        for e in expected:
+            assert datamem.unpack(out_map, e[0]) == (3, *e[4])
+        assert np.count_nonzero(out_map >= 0) == len({e[0] for e in expected})
+
+
+def test_verify_overwrite(capsys):
+    """
+    Check that overwriting the input and earlier output is reported in the order of the writes
+    """
+    tc.dev = tc.get_device(85)
+    state.layer_name = [None] * 4
+    no_error_stop = state.no_error_stop
+    state.no_error_stop = True
+    try:
+        in_map = datamem.allocate()
+        out_map = datamem.allocate()
+        datamem.store(in_map, tc.dev.C_SRAM_BASE + 4, (-1, 0, 0, 0))
+        datamem.store(out_map, tc.dev.C_SRAM_BASE, (1, 2, 3, 4))
+        # Without output expansion, channels 4-7 of pixel 0 use the same word as channels 0-3
+        # of pixel 1
+        unload_ops.verify(None, lambda *args, **kwargs: None, 2, in_map, out_map,
+                          np.zeros((8, 1, 2), dtype=np.int64), 0x0f, (8, 1, 2), 0, 1, 4, 8,
+                          body=[])
+    finally:
+        state.no_error_stop = no_error_stop
+    err = capsys.readouterr().err.splitlines()
+    assert err == [
+        'WARNING: Processor 0: Layer 2 output for CHW=0,0,0 is overwriting offset 0x00400000. '
+        'Previous write by layer 1, CHW=2,3,4.',
+        'WARNING: Processor 0: Layer 2 output for CHW=4,0,0 is overwriting input at offset '
+        '0x00400004 that was created by the input loader.',
+        'WARNING: Processor 0: Layer 2 output for CHW=0,0,1 is overwriting input at offset '
+        '0x00400004 that was created by the input loader.',
+        'WARNING: Processor 0: Layer 2 output for CHW=0,0,1 is overwriting offset 0x00400004. '
+        'Previous write by layer 2, CHW=4,0,0.',
+    ]
+
+
 if __name__ == '__main__':
     test_unload()
+    test_verify()
@@ -9,6 +9,8 @@ Toplevel C file structure generation
 """
 from typing import List, Optional, TextIO
 
+import numpy as np
+
 from . import devices, rv, state
 from . import tornadocnn as tc
 
@@ -942,18 +944,14 @@ def c_define(
     `fmt` can have two parts, separated by '%'. The part before the '%' sign is an optional
     prefix and can be empty, the part after the '%' is a formatting directive, e.g. '%08x'.
     """
-    prefix, formatting = fmt.split('%')
-    memfile.write(f'#define {define_name} {{ \\\n  ')
-    for i, e in enumerate(array):
-        if size == 8:
-            memfile.write(f'{prefix}{e:{formatting}}')
-        else:
-            memfile.write(f'{prefix}{e & 0xffffffff:{formatting}}')
-        if i + 1 < len(array):
-            memfile.write(', ')
-            if (i + 1) % columns == 0:
-                memfile.write('\\\n  ')
-    memfile.write(' \\\n}\n')
+    if isinstance(array, np.ndarray):
+        array = array.tolist()  # Formatting Python ints is much faster than NumPy scalars
+    if size == 8:
+        values = [fmt % e for e in array]
+    else:
+        values = [fmt % (e & 0xffffffff) for e in array]
+    lines = [', '.join(values[i:i + columns]) for i in range(0, len(values), columns)]
+    memfile.write(f'#define {define_name} {{ \\\n  ' + ', \\\n  '.join(lines) + ' \\\n}\n')
 
 
 def select_clock(
@@ -581,6 +581,7 @@ def unload(
 
 def verify(
         verify_fn,
+        verify_many_fn,
         ll,
         in_map,
         out_map,
@@ -601,7 +602,8 @@ def verify(
         streaming: bool = False,
 ):
     """
-    Verify HWC memory from AI8X, writing C or mem code using the `verify_fn` function.
+    Verify HWC memory from AI8X, writing C or mem code using the `verify_many_fn` function
+    (or `verify_fn` for single words when using `mlator`).
     The generated code is specific to the network configuration passed in in `processor_map`,
     and `input_shape`. Additionally, the generated addresses are offset by
     `out_offset`. The function takes a pointer to a memory array, and the depth of
@@ -631,39 +633,6 @@ def verify(
         wprint(f'{layer_pfx(ll)}Ignoring --mlator for 32-bit output.')
         mlator = False
 
-    count = 0
-
-    def check_overwrite(
-            p,
-            target_offs,
-            in_map,
-            out_map,
-            c,
-            row,
-            col,
-    ):
-        if not overwrite_ok:
-            # If using single layer, make sure we're not overwriting the input
-            old_ll, old_c, old_row, old_col = datamem.unpack(in_map, target_offs)
-            if old_ll is not None:
-                old_layer = \
-                    f'layer {layer_str(old_ll)}, CHW={old_c},{old_row},{old_col}' if old_ll >= 0 \
-                    else 'the input loader'
-                eprint(f'Processor {p}: '
-                       f'Layer {layer_str(ll)} output for CHW={c},{row},{col} is overwriting '
-                       f'input at offset 0x{target_offs:08x} that was created by '
-                       f'{old_layer}.',
-                       error=not no_error_stop)
-            # Check we're not overflowing the data memory
-            if out_map is not None:
-                old_ll, old_c, old_row, old_col = datamem.unpack(out_map, target_offs)
-                if old_ll is not None:
-                    eprint(f'Processor {p}: '
-                           f'Layer {layer_str(ll)} output for CHW={c},{row},{col} is overwriting '
-                           f'offset 0x{target_offs:08x}. Previous write by '
-                           f'layer {layer_str(old_ll)}, CHW={old_c},{old_row},{old_col}.',
-                           error=not no_error_stop)
-
     # Start at the instance of the first active output processor/channel
     coffs_start = ffs(processor_map) & ~(tc.dev.P_SHARED-1)
     next_layer_map = processor_map >> coffs_start
@@ -674,104 +643,144 @@ def verify(
     if unload_layer and not embedded:
         body.append(f'  // Layer {layer_str(ll)}\n')
 
-    for doffs in range(input_shape[1] * input_shape[2]):
-        row, col = divmod(doffs, input_shape[2])
-        this_map = next_layer_map
-        coffs = coffs_start
-        poffs = coffs_start
-        c = 0
-        while c < input_shape[0]:
-            if c % out_expand_thresh == 0:
-                poffs = coffs_start
-                this_map = next_layer_map  # Wrap around for AI85 channel expansion
-
-            this_c = c
-            expand = c // out_expand_thresh  # Channels 64+ handled by processors 0+
-            # Physical offset into instance and group
-            proc = poffs & ~(tc.dev.P_SHARED-1)
-
-            # Get four bytes or words either from output or zeros and construct HWC word
-            no_data = True
-            if out_size == 1:
-                val = 0
-                for _ in range(4):
-                    val >>= 8
-                    if this_map & 1:
-                        no_data = False
-                        if c < input_shape[0]:
-                            val |= (out_buf[c][row][col] & 0xff) << 24
-                        c += 1
-                    this_map >>= 1
-            else:
-                val = [0] * 4
-                for i in range(4):
-                    if this_map & 1:
-                        no_data = False
-                        if c < input_shape[0]:
-                            val[i] = out_buf[c][row][col] & 0xffffffff
-                        c += 1
-                    this_map >>= 1
+    # The assignment of channels to the bytes or words of each HWC word is the same for all
+    # pixels. Collect the 32-bit words of the first pixel: the byte offset, the channel of each
+    # byte (or of the word for 32-bit output, -1 for none), the memory map channel, the mask,
+    # the comment, whether the word ends a group of four channels
+    # (counted for --max-checklines), and the processor.
+    word_offs = []
+    word_chans = []
+    word_c = []
+    word_mask = []
+    word_comment = []
+    word_last = []
+    word_proc = []
+    c = 0
+    poffs = coffs_start
+    this_map = next_layer_map
+    while c < input_shape[0]:
+        if c % out_expand_thresh == 0:
+            poffs = coffs_start
+            this_map = next_layer_map  # Wrap around for AI85 channel expansion
+
+        this_c = c
+        expand = c // out_expand_thresh  # Channels 64+ handled by processors 0+
+        # Physical offset into instance and group
+        proc = poffs & ~(tc.dev.P_SHARED-1)
+
+        chans = [-1] * 4
+        for i in range(4):
+            if this_map & 1:
+                if c < input_shape[0]:
+                    chans[i] = c
+                c += 1
+            this_map >>= 1
 
-            # Get the offset of the first output byte/word of 4
+        if c != this_c:
+            # Offset of the first output byte/word of 4 for the first pixel
             offs = tc.dev.C_SRAM_BASE + out_offset + \
                 (((proc % tc.dev.P_NUMPRO) * tc.dev.INSTANCE_SIZE |
                   (proc // tc.dev.P_NUMPRO) * tc.dev.C_GROUP_OFFS // 4) +
-                 (doffs * width + expand * out_size) * (write_gap + 1)) * 4
-
-            if not no_data:
-                num_bytes = min(c - this_c, input_shape[0] - this_c)
-                if out_size == 1:
-                    if not streaming:
-                        check_overwrite(
-                            proc,
-                            offs,
-                            in_map,
-                            out_map,
-                            this_c,
-                            row,
-                            col,
-                        )
-                        if out_map is not None:
-                            datamem.store(out_map, offs, (ll, this_c, row, col))
-                    if not mlator:
-                        verify_fn(
-                            offs,
-                            val,
-                            rv=False,
-                            comment=f' // {this_c}-{this_c+num_bytes-1},{row},{col}',
-                            num_bytes=num_bytes,
-                            first_proc=ffs(processor_map >> proc) % 4,
-                            data=unload_layer,
-                        )
-                else:
-                    for i in range(min(num_bytes, out_size)):
-                        if not streaming:
-                            check_overwrite(
-                                proc,
-                                offs,
-                                in_map,
-                                out_map,
-                                this_c,
-                                row,
-                                col,
-                            )
-                            if out_map is not None:
-                                datamem.store(out_map, offs, (ll, this_c, row, col))
-                        if not mlator:
-                            verify_fn(
-                                offs,
-                                val[i],
-                                rv=False,
-                                comment=f' // {this_c+i},{row},{col}',
-                                data=unload_layer,
-                            )
-                        offs += out_size
-                count += 1
-                if count == max_count:
-                    body.append('  // Truncated further checks...\n')
-
-            coffs += 4
-            poffs += 4
+                 expand * out_size * (write_gap + 1)) * 4
+            num_bytes = min(c - this_c, input_shape[0] - this_c)
+            if out_size == 1:
+                word_offs.append(offs)
+                word_chans.append(chans)
+                word_c.append(this_c)
+                first_proc = ffs(processor_map >> proc) % 4
+                word_mask.append(((1 << num_bytes * 8) - 1) << first_proc * 8)
+                word_comment.append(f' // {this_c}-{this_c+num_bytes-1},')
+                word_last.append(True)
+                word_proc.append(proc)
+            else:
+                n = min(num_bytes, out_size)
+                for i in range(n):
+                    word_offs.append(offs + i * out_size)
+                    word_chans.append([chans[i]] + [-1] * 3)
+                    word_c.append(this_c)
+                    word_mask.append(0xffffffff)
+                    word_comment.append(f' // {this_c+i},')
+                    word_last.append(i == n - 1)
+                    word_proc.append(proc)
+
+        poffs += 4
+
+    # Expand to all pixels, in pixel order
+    pixels = input_shape[1] * input_shape[2]
+    num_words = len(word_offs)
+    doffs = np.arange(pixels, dtype=np.int64)
+    offs = (np.array(word_offs, dtype=np.int64)[None, :]
+            + (doffs * width * (write_gap + 1) * 4)[:, None]).ravel()
+    row, col = np.divmod(np.repeat(doffs, num_words), input_shape[2])
+    this_c = np.tile(np.array(word_c, dtype=np.int64), pixels)
+
+    # Output data with an extra all-zero channel for the unused bytes (channel -1)
+    buf = np.zeros((input_shape[0] + 1, pixels), dtype=np.int64)
+    buf[:-1] = np.asarray(out_buf)[:input_shape[0], :input_shape[1], :input_shape[2]] \
+        .reshape(input_shape[0], pixels)
+    chans = np.array(word_chans, dtype=np.int64).reshape(num_words, 4)
+    if out_size == 1:
+        vals = np.zeros((num_words, pixels), dtype=np.int64)
+        for i in range(4):
+            vals |= (buf[chans[:, i]] & 0xff) << (i * 8)
+    else:
+        vals = buf[chans[:, 0]] & 0xffffffff
+    vals = vals.T.ravel()
+
+    if not streaming:
+        if not overwrite_ok:
+            # If using single layer, make sure we're not overwriting the input. Check we're not
+            # overflowing the data memory. Report in order of the writes.
+            messages = []
+            used, old_ll, old_c, old_row, old_col = datamem.unpack_many(in_map, offs)
+            for k in np.flatnonzero(used).tolist():
+                old_layer = f'layer {layer_str(int(old_ll[k]))}, CHW={old_c[k]},' \
+                    f'{old_row[k]},{old_col[k]}' if old_ll[k] >= 0 else 'the input loader'
+                messages.append((k, 0, f'Processor {word_proc[k % num_words]}: '
+                                 f'Layer {layer_str(ll)} output for CHW={this_c[k]},{row[k]},'
+                                 f'{col[k]} is overwriting input at offset 0x{offs[k]:08x} '
+                                 f'that was created by {old_layer}.'))
+            if out_map is not None:
+                pos, prev = datamem.conflicts(out_map, offs,
+                                              datamem.pack(ll, this_c, row, col))
+                for k, old in zip(pos.tolist(), prev.tolist()):
+                    messages.append((k, 1, f'Processor {word_proc[k % num_words]}: '
+                                     f'Layer {layer_str(ll)} output for CHW={this_c[k]},'
+                                     f'{row[k]},{col[k]} is overwriting offset '
+                                     f'0x{offs[k]:08x}. Previous write by layer '
+                                     f'{layer_str(old >> 48)}, CHW={old >> 32 & 0xffff},'
+                                     f'{old >> 16 & 0xffff},{old & 0xffff}.'))
+            for _, _, s in sorted(messages):
+                eprint(s, error=not no_error_stop)
+        if out_map is not None:
+            datamem.store_many(out_map, offs, ll, this_c, row, col)
+
+    # Position of the comment after the first `max_count` HWC words
+    words_per_pixel = sum(word_last)
+    truncate = -1
+    if max_count is not None and 0 < max_count <= pixels * words_per_pixel:
+        p, w = divmod(max_count - 1, words_per_pixel)
+        truncate = p * num_words + [i for i, e in enumerate(word_last) if e][w]
+
+    if not mlator:
+        masks = np.tile(np.array(word_mask, dtype=np.int64), pixels)
+        comments = [comment + f'{row},{col}'
+                    for row in range(input_shape[1]) for col in range(input_shape[2])
+                    for comment in word_comment]
+        parts = [0, len(offs)] if truncate < 0 else [0, truncate + 1, len(offs)]
+        for start, end in zip(parts[:-1], parts[1:]):
+            if start > 0:
+                body.append('  // Truncated further checks...\n')
+            verify_many_fn(
+                offs[start:end],
+                vals[start:end],
+                masks[start:end],
+                comments=comments[start:end],
+                rv=False,
+                data=unload_layer,
+            )
+    elif truncate >= 0:
+        body.append('  // Truncated further checks...\n')
 
     if mlator:
         # This path is used for RTL sims to emit the verification code.
@@ -1,5 +1,5 @@
 ###################################################################################################
-# Copyright (C) 2019-2022 Maxim Integrated Products, Inc. All Rights Reserved.
+# Copyright (C) 2019-2024 Maxim Integrated Products, Inc. All Rights Reserved.
 #
 # Maxim Integrated Products, Inc. Default Copyright Notice:
 # https://www.maximintegrated.com/en/aboutus/legal/copyrights.html
@@ -7,6 +7,13 @@
 """
 Various small utility functions
 """
+import importlib
+import sys
+import time
+from typing import Dict
+
+# Time spent on deferred imports of slow modules, see `timed_import()`
+import_times: Dict[str, float] = {}
 
 
 def ffs(x):
@@ -94,3 +101,17 @@ def plural(x, name, multiple='s', singular=''):
     if x != 1:  # Works for negative, 0, 2, 3, 4...
         return name + multiple
     return name + singular
+
+
+def timed_import(name):
+    """
+    Import and return the module `name`. Slow dependencies that are only needed by some runs
+    (PyTorch, ONNX, PyGithub) are imported this way, and the time the import takes is recorded
+    in `import_times`.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    import_times[name] = time.perf_counter() - start
+    return module
@@ -1,5 +1,5 @@
 ###################################################################################################
-# Copyright (C) 2021-2022 Maxim Integrated Products, Inc. All Rights Reserved.
+# Copyright (C) 2021-2024 Maxim Integrated Products, Inc. All Rights Reserved.
 #
 # Maxim Integrated Products, Inc. Default Copyright Notice:
 # https://www.maximintegrated.com/en/aboutus/legal/copyrights.html
@@ -12,10 +12,9 @@ import os
 import pathlib
 
 import __main__
-import git
-import github
 
 from .eprint import nprint, wprint
+from .utils import timed_import
 
 VERSION_CHECK_FILE = ".version-check"
 
@@ -29,6 +28,10 @@ def check_repo(
     local repository's active branch.
     Returns True if the version check succeeded, False otherwise.
     """
+    # GitPython and PyGithub are slow to load and not needed unless checking
+    git = timed_import('git')
+    github = timed_import('github')
+
     folder = pathlib.Path(__main__.__file__).parent
     if verbose:
         print('Checking for .git in folder', folder)
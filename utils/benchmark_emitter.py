@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+###################################################################################################
+# Copyright (C) 2024 Maxim Integrated Products, Inc. All Rights Reserved.
+#
+# Maxim Integrated Products, Inc. Default Copyright Notice:
+# https://www.maximintegrated.com/en/aboutus/legal/copyrights.html
+###################################################################################################
+"""
+Benchmark the C code emission throughput (register writes to cnn.c and the weights.h arrays)
+with per-call file writes and with the buffered `izer.emitter.Emitter`.
+
+The default sizes correspond to a large MAX78002 network such as ai87-imagenet-effnet2.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from izer import apbaccess, emitter, toplevel  # noqa: E402 pylint: disable=wrong-import-position
+from izer import tornadocnn as tc  # noqa: E402 pylint: disable=wrong-import-position
+
+
+def c_define_per_element(memfile, array, define_name, fmt, columns=8):
+    """
+    The previous implementation of `toplevel.c_define()` (one write per array element).
+    """
+    prefix, formatting = fmt.split('%')
+    memfile.write(f'#define {define_name} {{ \\\n  ')
+    for i, e in enumerate(array):
+        memfile.write(f'{prefix}{e & 0xffffffff:{formatting}}')
+        if i + 1 < len(array):
+            memfile.write(', ')
+            if (i + 1) % columns == 0:
+                memfile.write('\\\n  ')
+    memfile.write(' \\\n}\n')
+
+
+def registers(memfile, count):
+    """
+    Emit `count` register writes (four per kernel, as when loading kernels one by one).
+    """
+    apb = apbaccess.APBTopLevel(memfile, embedded_code=True)
+    addr = tc.dev.C_MRAM_BASE
+    for i in range(count):
+        apb.write(addr + 4 * i, i, no_verify=True)
+
+
+def measure(filename, func, buffered):
+    """
+    Run `func(memfile)` and return (megabytes written, seconds).
+    """
+    start = time.perf_counter()
+    with open(filename, mode='w', encoding='utf-8') as f:
+        if buffered:
+            with emitter.Emitter(f) as memfile:
+                func(memfile)
+        else:
+            func(f)
+    seconds = time.perf_counter() - start
+    return os.path.getsize(filename) / 1e6, seconds
+
+
+def main():
+    """
+    Command line wrapper
+    """
+    parser = argparse.ArgumentParser(description="C code emission benchmark")
+    parser.add_argument('--words', type=int, default=2_000_000, metavar='N',
+                        help="number of 32-bit words in the KERNELS array (default: 2M)")
+    parser.add_argument('--registers', type=int, default=500_000, metavar='N',
+                        help="number of register writes (default: 500k)")
+    parser.add_argument('--device', type=int, default=87, metavar='N',
+                        help="device (default: 87)")
+    args = parser.parse_args()
+
+    tc.dev = tc.get_device(args.device)
+    rng = np.random.default_rng(seed=0)
+    kernels = rng.integers(0, 2**32, args.words, dtype=np.uint32)
+
+    cases = [
+        ('weights.h, per-element writes', False,
+         lambda f: c_define_per_element(f, kernels, 'KERNELS', '0x%08x', 8)),
+        ('weights.h, c_define()', True,
+         lambda f: toplevel.c_define(f, kernels, 'KERNELS', '0x%08x', 8)),
+        ('cnn.c register writes, file', False,
+         lambda f: registers(f, args.registers)),
+        ('cnn.c register writes, Emitter', True,
+         lambda f: registers(f, args.registers)),
+    ]
+
+    print(f'{"Case":<34}{"MB":>8}{"Seconds":>10}{"MB/s":>10}')
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, buffered, func in cases:
+            size, seconds = measure(os.path.join(tmp, 'out.c'), func, buffered)
+            print(f'{name:<34}{size:8.1f}{seconds:10.2f}{size / seconds:10.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+###################################################################################################
+# Copyright (C) 2024 Maxim Integrated Products, Inc. All Rights Reserved.
+#
+# Maxim Integrated Products, Inc. Default Copyright Notice:
+# https://www.maximintegrated.com/en/aboutus/legal/copyrights.html
+###################################################################################################
+"""
+Benchmark the kernel memory search with vectorized window checks and with a column by column
+scan.
+
+The kernel lengths are estimated from the processor maps, kernel sizes and quantization in the
+network YAML files (assuming no input or output expansion), so no checkpoint files are needed.
+Each network is placed `--repeat` times into the same kernel map, with the layers of every
+pass placed in a different order, to create the fragmented maps seen for large networks.
+"""
+import argparse
+import functools
+import glob
+import io
+import os
+import sys
+import time
+from contextlib import redirect_stdout
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from izer import yamlcfg  # noqa: E402 pylint: disable=wrong-import-position
+from izer import kernels, op  # noqa: E402 pylint: disable=wrong-import-position
+from izer import tornadocnn as tc  # noqa: E402 pylint: disable=wrong-import-position
+from izer.utils import ffs, fls  # noqa: E402 pylint: disable=wrong-import-position
+
+
+def workload(filename):
+    """
+    Return a list of (processor map, kernel length, weight mask) for the network `filename`.
+    """
+    with redirect_stdout(io.StringIO()):
+        _, _, params = yamlcfg.parse(filename)
+
+    layers = []
+    processor_map = params['processor_map']
+    for ll, proc_map in enumerate(processor_map):
+        if params['operator'][ll] == op.NONE or params['bypass'][ll]:
+            continue
+        next_map = params['output_processor_map'][ll] \
+            or (processor_map[ll + 1] if ll + 1 < len(processor_map) else proc_map)
+        bits = abs(params['quantization'][ll] or 8)
+        ksize = params['kernel_size'][ll][0] * params['kernel_size'][ll][1]
+        kc = 1 + fls(next_map) - ffs(next_map) if params['conv_groups'][ll] == 1 else 1
+        layers.append((proc_map, (kc * ksize * bits + 71) // 72,
+                       tc.dev.REQUIRE_WEIGHT_MASK and params['conv_groups'][ll] > 1))
+    return layers
+
+
+def place(layers, repeat, vectorized):
+    """
+    Place `layers` `repeat` times, return (kernel map, layers placed, seconds spent searching).
+    """
+    kernel_map = np.full((tc.dev.MAX_PROC, tc.dev.MASK_WIDTH_LARGE),
+                         fill_value=kernels._INVALID_VALUE,  # pylint: disable=protected-access
+                         dtype=np.int64)
+
+    def check(p, offs, reverse=False, length=0):
+        return offs >= 0 if reverse else offs + length <= tc.dev.mask_width(p)
+
+    placed = 0
+    seconds = 0.0
+    rng = np.random.default_rng(seed=0)
+    for _ in range(repeat):
+        for ll in rng.permutation(len(layers)):
+            proc_map, length, weight_mask = layers[ll]
+            start = time.perf_counter()
+            offs = kernels.search_kernel_mem(kernel_map, length, 0, proc_map,
+                                             functools.partial(check, length=length),
+                                             weight_mask=weight_mask, vectorized=vectorized)
+            seconds += time.perf_counter() - start
+            if offs < 0 or not all(check(p, offs, length=length)
+                                   for p in range(ffs(proc_map), fls(proc_map) + 1)):
+                return kernel_map, placed, seconds
+            for p in range(tc.dev.MAX_PROC):
+                if (proc_map >> p) & 1:
+                    kernel_map[p][offs:offs + length] = ll
+            placed += 1
+    return kernel_map, placed, seconds
+
+
+def main():
+    """
+    Command line wrapper
+    """
+    parser = argparse.ArgumentParser(description="Kernel memory search benchmark")
+    parser.add_argument('networks', nargs='*', metavar='YAML',
+                        help="network YAML files (default: networks/ai87-*.yaml)")
+    parser.add_argument('--repeat', type=int, default=4, metavar='N',
+                        help="number of times each network is placed (default: 4)")
+    parser.add_argument('--device', type=int, default=87, metavar='N',
+                        help="device (default: 87)")
+    args = parser.parse_args()
+
+    tc.dev = tc.get_device(args.device)
+    networks = args.networks or sorted(glob.glob(os.path.join(
+        os.path.dirname(__file__), '..', 'networks', f'ai{args.device}-*.yaml')))
+
+    print(f'{"Network":<44}{"Layers":>8}{"Scan":>10}{"Vector":>10}{"Speedup":>9}')
+    total_scan = total_vector = 0.0
+    for filename in networks:
+        layers = workload(filename)
+        kernel_map, placed, scan = place(layers, args.repeat, vectorized=False)
+        kernel_map_vector, _, vector = place(layers, args.repeat, vectorized=True)
+        assert np.array_equal(kernel_map, kernel_map_vector)
+        total_scan += scan
+        total_vector += vector
+        print(f'{os.path.basename(filename):<44}{placed:8}{scan:9.3f}s{vector:9.3f}s'
+              f'{scan / vector:8.1f}x')
+    print(f'{"Total":<44}{"":8}{total_scan:9.3f}s{total_vector:9.3f}s'
+          f'{total_scan / total_vector:8.1f}x')
+
+
+if __name__ == '__main__':
+    main()